@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Flash Hizi Benchmark'i
+ISP host yollarini bootloader simulatorune (isp_simulator.py) karsi calistirir
+ve adim bazinda sure, byte/s, frame/s ve frame tur suresi dagilimini olcer.
+
+Olculen yollar:
+    nuvoton  - uart_receiver_nuvoton.py: send_connect + send_update_aprom
+    improved - uart_receiver_nuvoton_improved.py: send_connect_fast + send_update_aprom_improved
+    isptool  - isptool.py: wait_bootloader + program_flash + run_app
+    session  - isp_session.py: flash_port
+
+Zamanlar simulator tarafinda olculur (paketin ilk byte'inin gelis ani), host
+kodu degistirilmeden calisir. Bir paketin tur suresi = bir sonraki paketin
+gelisine kadar gecen sure; her paketin suresi komutuna gore bir adima yazilir
+(connect, sync, erase, program, run).
+
+Kullanim:
+    python3 bench_flash_throughput.py [--size=16384] [--image=fw.bin] [--baud=115200]
+                                      [--paths=nuvoton,isptool] [--runs=1] [--no-pace]
+                                      [--json=sonuc.json | --json]
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from isp_simulator import (CMD_CONNECT, CMD_ERASE_ALL, CMD_GET_DEVICEID, CMD_GET_FWVER,
+                           CMD_RESEND_PACKET, CMD_RUN_APROM, CMD_SYNC_PACKNO, CMD_UPDATE_APROM,
+                           CMD_UPDATE_DATAFLASH, MAX_PKT_SIZE, BootloaderSimulator)
+
+PHASES = ("connect", "sync", "erase", "program", "run")
+
+COMMAND_PHASES = {
+    CMD_CONNECT: "connect",
+    CMD_SYNC_PACKNO: "sync",
+    CMD_GET_DEVICEID: "sync",
+    CMD_GET_FWVER: "sync",
+    CMD_ERASE_ALL: "erase",
+    CMD_UPDATE_APROM: "program",
+    CMD_UPDATE_DATAFLASH: "program",
+    CMD_RESEND_PACKET: "program",
+    0: "program",
+    CMD_RUN_APROM: "run",
+}
+
+# Tur suresi histogrami sinirlari (ms)
+RTT_BUCKETS_MS = (5, 10, 12, 15, 20, 30, 50, 100, 200, 500)
+
+# Programlama paketi basina veri (ilk paket 48, devam paketleri 56 byte)
+DATA_PER_FRAME = 56
+
+
+# --- olculen yollar ---
+
+def run_nuvoton(port, bin_data):
+    import uart_receiver_nuvoton as U
+    ser = U.open_serial_port(port)
+    try:
+        return U.send_connect(ser) and U.send_update_aprom(ser, bin_data)
+    finally:
+        ser.close()
+
+
+def run_improved(port, bin_data):
+    import uart_receiver_nuvoton_improved as I
+    import serial
+    ser = serial.Serial(port, I.BAUD_RATE, timeout=I.TIMEOUT, write_timeout=I.WRITE_TIMEOUT,
+                        rtscts=False, dsrdtr=False, xonxoff=False)
+    try:
+        # main() sirasi (input() haric)
+        catch = I.send_connect_fast(ser)
+        if catch is None:
+            return False
+        if I.send_packet_fast(ser, I.create_packet(I.CMD_GET_DEVICEID)):
+            time.sleep(0.1)
+            I.receive_response(ser, timeout=0.5)
+        if not I.send_update_aprom_improved(ser, bin_data, aprom_size=catch.aprom_size):
+            return False
+        if I.send_packet_fast(ser, I.create_packet(I.CMD_RUN_APROM)):
+            time.sleep(1.0)
+        return True
+    finally:
+        ser.close()
+
+
+def run_isptool(port, bin_data):
+    import isptool
+    import serial
+    ser = serial.Serial(port, isptool.BAUD, timeout=0.1, rtscts=False, dsrdtr=False)
+    try:
+        catch = isptool.wait_bootloader(ser)
+        isptool.get_device_id(ser)
+        ok = isptool.program_flash(ser, bin_data, aprom_size=catch.aprom_size)
+        isptool.run_app(ser)
+        return ok
+    finally:
+        ser.close()
+
+
+def run_session(port, bin_data):
+    import isp_session
+    result = isp_session.flash_port(port, bin_data, connect_timeout=5.0)
+    if result["error"]:
+        raise RuntimeError(result["error"])
+    return result["ok"]
+
+
+PATHS = {
+    "nuvoton": run_nuvoton,
+    "improved": run_improved,
+    "isptool": run_isptool,
+    "session": run_session,
+}
+
+
+# --- analiz ---
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def histogram(values_ms):
+    counts = [0] * (len(RTT_BUCKETS_MS) + 1)
+    for value in values_ms:
+        for i, edge in enumerate(RTT_BUCKETS_MS):
+            if value < edge:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    return {"edges_ms": list(RTT_BUCKETS_MS), "counts": counts}
+
+
+def analyze(trace, t0, t_end, bin_data, baud):
+    """Simulator izinden adim sureleri, hiz ve tur suresi istatistiklerini cikarir"""
+    phases = dict.fromkeys(PHASES, 0.0)
+    frames = dict.fromkeys(PHASES, 0)
+    program_rtts = []
+
+    if trace:
+        # Ilk pakete kadar gecen sure (reset -> ilk CMD_CONNECT) connect'e yazilir
+        phases["connect"] += trace[0][0] - t0
+    for i, (arrival, _, cmd) in enumerate(trace):
+        phase = COMMAND_PHASES.get(cmd, "sync")
+        end = trace[i + 1][0] if i + 1 < len(trace) else t_end
+        phases[phase] += end - arrival
+        frames[phase] += 1
+        if phase == "program":
+            program_rtts.append((end - arrival) * 1000.0)
+
+    total = t_end - t0
+    frame_wire_time = 2 * MAX_PKT_SIZE * 10.0 / baud  # istek + yanit, 8N1
+    wire_time = frames["program"] * frame_wire_time
+    result = {
+        "total_s": total,
+        "phases_s": phases,
+        "frames": frames,
+        "bytes": len(bin_data),
+        "bytes_per_s": len(bin_data) / total if total else 0.0,
+        "program_bytes_per_s": len(bin_data) / phases["program"] if phases["program"] else 0.0,
+        "program_frames_per_s": frames["program"] / phases["program"] if phases["program"] else 0.0,
+        "wire": {
+            "limit_bytes_per_s": DATA_PER_FRAME / frame_wire_time,
+            "limit_frames_per_s": 1.0 / frame_wire_time,
+            "program_wire_time_s": wire_time,
+            "program_efficiency": wire_time / phases["program"] if phases["program"] else 0.0,
+        },
+    }
+    if program_rtts:
+        result["rtt_ms"] = {
+            "mean": statistics.mean(program_rtts),
+            "p50": percentile(program_rtts, 0.50),
+            "p90": percentile(program_rtts, 0.90),
+            "p99": percentile(program_rtts, 0.99),
+            "max": max(program_rtts),
+            "histogram": histogram(program_rtts),
+        }
+    return result
+
+
+def bench_path(name, bin_data, baud, pace):
+    """Tek yolu yeni bir simulatore karsi calistirir"""
+    sim = BootloaderSimulator(baudrate=baud, pace=pace, trace=True)
+    port = sim.start()
+    t0 = time.monotonic()
+    ok = False
+    error = None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = bool(PATHS[name](port, bin_data))
+    except Exception as e:
+        error = str(e)
+    t_end = time.monotonic()
+    sim.stop()
+
+    result = {"path": name, "ok": ok and sim.aprom[:len(bin_data)] == bin_data, "error": error}
+    if ok and not result["ok"]:
+        result["error"] = "Flash icerigi imajla uyusmuyor"
+    elif not ok and error is None:
+        result["error"] = "Basarisiz dondu"
+    result.update(analyze(list(sim.trace), t0, t_end, bin_data, baud))
+    result["sim"] = {"frames": sim.frames, "rx_timeouts": sim.dropped_partial,
+                     "erase_ops": sim.erase_ops}
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def print_report(report):
+    meta = report["meta"]
+    print("=" * 60)
+    print("Flash Hizi Benchmark'i")
+    print("=" * 60)
+    print(f"Imaj: {meta['image_size']} byte, Baud: {meta['baud']}, "
+          f"hat zamanlamasi: {'acik' if meta['pace'] else 'kapali'}")
+    wire = report["results"][0]["wire"] if report["results"] else None
+    if wire:
+        print(f"Hat limiti (programlama): {wire['limit_bytes_per_s']:.0f} byte/s, "
+              f"{wire['limit_frames_per_s']:.1f} frame/s")
+    print()
+
+    header = f"{'Yol':<10} {'Sonuc':<6} {'Toplam':>8}"
+    for phase in PHASES:
+        header += f" {phase:>8}"
+    header += f" {'byte/s':>8} {'frame/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'verim':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in report["results"]:
+        line = f"{r['path']:<10} {'OK' if r['ok'] else 'HATA':<6} {r['total_s']:>7.2f}s"
+        for phase in PHASES:
+            line += f" {r['phases_s'][phase]:>7.2f}s"
+        rtt = r.get("rtt_ms", {})
+        line += (f" {r['bytes_per_s']:>8.0f} {r['program_frames_per_s']:>8.1f}"
+                 f" {rtt.get('p50', 0):>7.2f} {rtt.get('p99', 0):>7.2f}"
+                 f" {r['wire']['program_efficiency']*100:>5.0f}%")
+        print(line)
+        if r["error"]:
+            print(f"{'':<10} → {r['error']}")
+
+    for r in report["results"]:
+        if "rtt_ms" not in r:
+            continue
+        hist = r["rtt_ms"]["histogram"]
+        labels = [f"<{e}" for e in hist["edges_ms"]] + [f">={hist['edges_ms'][-1]}"]
+        cells = [f"{label}:{count}" for label, count in zip(labels, hist["counts"]) if count]
+        print(f"  {r['path']:<10} tur suresi (ms) {' '.join(cells)}")
+
+
+def main():
+    size = 16384
+    image = None
+    baud = 115200
+    runs = 1
+    paths = list(PATHS)
+    json_path = None
+    json_only = False
+    for arg in sys.argv[1:]:
+        if arg.startswith('--size='):
+            size = int(arg.split('=', 1)[1])
+        elif arg.startswith('--image='):
+            image = arg.split('=', 1)[1]
+        elif arg.startswith('--baud='):
+            baud = int(arg.split('=', 1)[1])
+        elif arg.startswith('--runs='):
+            runs = int(arg.split('=', 1)[1])
+        elif arg.startswith('--paths='):
+            paths = arg.split('=', 1)[1].split(',')
+        elif arg.startswith('--json='):
+            json_path = arg.split('=', 1)[1]
+        elif arg == '--json':
+            json_only = True
+    pace = '--no-pace' not in sys.argv
+
+    unknown = [p for p in paths if p not in PATHS]
+    if unknown:
+        print(f"[X] Bilinmeyen yol: {', '.join(unknown)} (secenekler: {', '.join(PATHS)})")
+        sys.exit(1)
+
+    if image:
+        with open(image, 'rb') as f:
+            bin_data = f.read()
+    else:
+        # Tekrarlanabilir sentetik imaj (kelime hizali)
+        rng = random.Random(0)
+        bin_data = bytes(rng.randrange(256) for _ in range(size - size % 4))
+
+    results = []
+    for run in range(runs):
+        for name in paths:
+            result = bench_path(name, bin_data, baud, pace)
+            result["run"] = run
+            results.append(result)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "baud": baud,
+            "pace": pace,
+            "image": image,
+            "image_size": len(bin_data),
+            "runs": runs,
+        },
+        "results": results,
+    }
+
+    if json_only:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        if not json_only:
+            print(f"\nJSON: {json_path}")
+
+
+if __name__ == "__main__":
+    main()
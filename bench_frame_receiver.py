@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Yanit Alici Benchmark'i
+Eski sleep-polling receive_response ile read_frame() gecikmesini karsilastirir
+
+Kart gerekmez: pty cifti uzerinde sahte bir bootloader her 64 byte istege
+64 byte yanit gonderir (UART FIFO'su gibi 16 byte'lik parcalar, baud hizinda).
+
+Kullanim:
+    python3 bench_frame_receiver.py [frame_sayisi] [baud]
+"""
+
+import os
+import select
+import statistics
+import sys
+import threading
+import time
+import tty
+
+import serial
+
+from isp_transport import MAX_PKT_SIZE, TermiosSerial, read_frame
+
+FIFO_CHUNK = 16  # Bootloader PutString() TX FIFO'yu 16 byte'lik parcalarla bosaltir
+
+
+def fake_bootloader(master_fd, baud, stop):
+    """Her 64 byte istege baud hizinda 64 byte yanit gonderir"""
+    chunk_time = FIFO_CHUNK * 10.0 / baud  # 8N1: byte basina 10 bit
+    request = bytearray()
+    while not stop.is_set():
+        readable, _, _ = select.select([master_fd], [], [], 0.1)
+        if not readable:
+            continue
+        try:
+            request.extend(os.read(master_fd, MAX_PKT_SIZE - len(request)))
+        except OSError:
+            return
+        if len(request) < MAX_PKT_SIZE:
+            continue
+        response = bytes(request)
+        request.clear()
+        for i in range(0, MAX_PKT_SIZE, FIFO_CHUNK):
+            time.sleep(chunk_time)
+            os.write(master_fd, response[i:i+FIFO_CHUNK])
+
+
+def receive_polling(ser, timeout=1.0, poll_interval=0.01):
+    """Eski receive_response (uart_receiver_nuvoton.py / verify_aprom.py)"""
+    start_time = time.time()
+    response = bytearray()
+    while len(response) < MAX_PKT_SIZE:
+        if time.time() - start_time > timeout:
+            return None
+        if ser.in_waiting > 0:
+            data = ser.read(min(ser.in_waiting, MAX_PKT_SIZE - len(response)))
+            response.extend(data)
+        time.sleep(poll_interval)
+    return bytes(response)
+
+
+def measure(ser, receiver, frames):
+    """Her frame icin istek gonderip yanit gelene kadar gecen sureyi olcer"""
+    request = bytes(range(MAX_PKT_SIZE))
+    latencies = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        ser.write(request)
+        response = receiver(ser)
+        if response is None:
+            raise RuntimeError("Yanit alinamadi")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(name, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    mean = statistics.mean(latencies)
+    print(f"  {name:<22} ort: {mean*1000:7.2f} ms  p50: {statistics.median(latencies)*1000:7.2f} ms"
+          f"  p99: {p99*1000:7.2f} ms")
+    return mean
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    baud = int(sys.argv[2]) if len(sys.argv) > 2 else 115200
+
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(master_fd)
+    slave_name = os.ttyname(slave_fd)
+
+    stop = threading.Event()
+    thread = threading.Thread(target=fake_bootloader, args=(master_fd, baud, stop), daemon=True)
+    thread.start()
+
+    ser = serial.Serial(slave_name, baud, timeout=1)
+    wire_time = MAX_PKT_SIZE * 10.0 / baud  # pty'de istek aninda iletilir, sadece yanit baud hizinda gelir
+
+    print("=" * 60)
+    print("Yanit Alici Benchmark'i")
+    print("=" * 60)
+    print(f"Frame sayisi: {frames}, Baud: {baud}")
+    print(f"Yanit hat suresi: {wire_time*1000:.2f} ms\n")
+
+    raw = None
+    try:
+        try:
+            results = {
+                "polling 10 ms": measure(ser, lambda s: receive_polling(s, poll_interval=0.01),
+                                         frames),
+                "polling 1 ms": measure(ser, lambda s: receive_polling(s, poll_interval=0.001),
+                                        frames),
+                "read_frame (select)": measure(ser, read_frame, frames),
+            }
+        finally:
+            # Ayni tty'nin termios ayarlari paylasildigi icin termios portu
+            # pyserial kapatildiktan sonra acilir
+            ser.close()
+        raw = TermiosSerial(slave_name, baud, timeout=1)
+        try:
+            results["read_frame (termios)"] = measure(raw, read_frame, frames)
+        finally:
+            raw.close()
+    finally:
+        stop.set()
+        os.close(slave_fd)
+
+    means = {name: summarize(name, lat) for name, lat in results.items()}
+    event_mean = means["read_frame (select)"]
+
+    print()
+    if raw is not None:
+        print(f"  (termios: VMIN={raw.vmin}, her yanit tek os.read() ile)")
+    for name in ("polling 10 ms", "polling 1 ms"):
+        saving = means[name] - event_mean
+        print(f"  {name} -> read_frame: frame basina {saving*1000:.2f} ms kazanc "
+              f"({saving*frames:.2f} s / {frames} frame)")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,13 @@ import serial.tools.list_ports
 import time
 import sys
 
+from isp_transport import read_frame
+
 # Nuvoton ISP Komutlari
 CMD_CONNECT = 0x000000AE
 CMD_GET_DEVICEID = 0x000000B1
 MAX_PKT_SIZE = 64
+RESPONSE_TIMEOUT = 1.0  # saniye
 
 def uint32_to_bytes(value):
     """uint32_t degerini little-endian byte array'e cevirir"""
@@ -48,18 +51,9 @@ def send_packet(ser, packet):
         print(f"  Hata: Paket gonderilemedi - {e}")
         return False
 
-def receive_response(ser):
-    """64 byte yanit paketi alir (timeout yok - yanit gelene kadar bekliyor)"""
-    response = bytearray()
-    
-    while len(response) < MAX_PKT_SIZE:
-        if ser.in_waiting > 0:
-            data = ser.read(min(ser.in_waiting, MAX_PKT_SIZE - len(response)))
-            response.extend(data)
-        else:
-            time.sleep(0.01)
-    
-    return bytes(response)
+def receive_response(ser, timeout=RESPONSE_TIMEOUT):
+    """64 byte yanit paketi alir, sure dolarsa None (isp_transport.read_frame)"""
+    return read_frame(ser, timeout)
 
 def open_serial_port(port_name=None):
     """Serial port acar"""
@@ -160,7 +154,7 @@ def get_device_id(ser):
                         if not is_ascii:
                             # Bootloader yaniti!
                             checksum = (connect_response[1] << 8) | connect_response[0]
-                            packet_no = connect_response[4] | (connect_response[5] << 8)
+                            packet_no = bytes_to_uint32(connect_response, 4)  # 32 bit (u32PackNo)
                             
                             print(f"\n[OK][OK][OK] BOOTLOADER YAKALANDI! [OK][OK][OK]")
                             print(f"  Checksum: 0x{checksum:04X}")
@@ -186,7 +180,6 @@ def get_device_id(ser):
         print("[X] CMD_GET_DEVICEID gonderilemedi")
         return None
     
-    time.sleep(0.1)
     device_response = receive_response(ser)
     
     if not device_response or len(device_response) < 64:
@@ -211,9 +204,26 @@ def main():
     print("Nuvoton Cihaz ID'si Alma Scripti")
     print("="*60)
     
+    # Secenekler (--record=oturum.ispcap: port trafigini zamaniyla kaydet - isp_record,
+    #             --replay=oturum.ispcap: kart yerine kayittan oynat (port acilmaz),
+    #             --replay-scale=1.0: oynatma zamanlama carpani, 0 = beklemesiz)
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    record_path = None
+    replay_path = None
+    replay_scale = 1.0
+    for a in sys.argv[1:]:
+        if a.startswith('--record='):
+            record_path = a.split('=', 1)[1]
+        elif a.startswith('--replay='):
+            replay_path = a.split('=', 1)[1]
+        elif a.startswith('--replay-scale='):
+            replay_scale = float(a.split('=', 1)[1])
+
     # Port secimi
-    if len(sys.argv) > 1:
-        port_name = sys.argv[1]
+    if len(args) > 0:
+        port_name = args[0]
+    elif replay_path:
+        port_name = None
     else:
         port_name = None
         print("\nMevcut Serial Portlar:")
@@ -222,14 +232,26 @@ def main():
             print(f"  - {p.device}: {p.description}")
         print("\nPort belirtilmedi, otomatik tespit edilecek...")
     
-    # Port ac
-    ser, port = open_serial_port(port_name)
+    # Port ac (tekrar oynatmada kayittan)
+    replay = None
+    if replay_path:
+        from isp_record import ReplaySerial
+        ser = replay = ReplaySerial(replay_path, replay_scale, timeout=1.0, write_timeout=2.0)
+        port = replay_path
+        print(f"Tekrar oynatma: {replay_path} (zamanlama x{replay_scale:g})")
+    else:
+        ser, port = open_serial_port(port_name)
     if not ser:
         print("[X] Port acilamadi!")
         print("\nKullanim:")
-        print(f"  python3 {sys.argv[0]} <port>")
+        print(f"  python3 {sys.argv[0]} <port> [--record=oturum.ispcap]")
         print(f"  python3 {sys.argv[0]} /dev/ttyACM0")
+        print(f"  python3 {sys.argv[0]} --replay=oturum.ispcap [--replay-scale=0]")
         return
+    if record_path:
+        from isp_record import RecordingSerial
+        ser = RecordingSerial(ser, record_path)
+        print(f"Kayit: {record_path}")
     
     try:
         # Buffer temizle
@@ -260,6 +282,10 @@ def main():
         if ser and ser.is_open:
             ser.close()
             print("\nPort kapatildi.")
+        if replay is not None:
+            print(replay.summary())
+            if not replay.ok():
+                sys.exit(1)
 
 if __name__ == "__main__":
     main()
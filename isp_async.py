@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - asyncio istemcisi
+Tek event loop ile cok sayida karti thread acmadan yonetmek icin
+AsyncIspClient: connect, sync_packno, get_device_id, get_fw_version,
+erase_all, update_aprom, update_dataflash, run_aprom.
+
+Port ham termios ile non-blocking acilir, okuma loop.add_reader() ile
+yapilir (Linux/POSIX).
+
+Kullanim (ornek, ayni imaji birden fazla porta):
+    python3 isp_async.py <bin_file> <port1> [port2 ...]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from isp_capture import DIR_RX, DIR_TX
+from isp_catcher import (CONNECT_PACKET, CONNECT_SIGNATURE, connect_interval,
+                         find_connect_response, frame_time)
+from isp_deadline import DEADLINE_CONNECT, DEADLINE_ERASE_ALL, DeadlineEstimator
+from isp_erase import plan_erase
+from isp_frames import FrameStream
+from isp_image import split_segments
+from isp_packno import PACKNO_OK, PACKNO_STALE, PacketTracker, response_packno
+from isp_protocol import (BAUD_RATE, CMD_ERASE_ALL, CMD_GET_DEVICEID, CMD_GET_FWVER,
+                          CMD_RUN_APROM, CMD_SYNC_PACKNO, CMD_UPDATE_APROM,
+                          CMD_UPDATE_DATAFLASH, bytes_to_uint32, create_packet)
+from isp_recovery import STEP_READ, STEP_WRITE, RecoveryError, SegmentProgrammer
+from isp_session import COMMAND_TIMEOUT, ERASE_TIMEOUT, SESSION_TIMEOUTS, IspError
+from isp_transport import MAX_PKT_SIZE, TermiosSerial
+
+
+class AsyncSerialTransport:
+    """Non-blocking seri port: 64 byte paket okuma/yazma (asyncio)"""
+
+    def __init__(self, port, baudrate=BAUD_RATE, capture=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.capture = capture
+        self.serial = None
+        self._loop = None
+        self._buffer = bytearray()
+        self._waiter = None
+        self._want = MAX_PKT_SIZE
+        self._error = None
+
+    async def open(self):
+        self._loop = asyncio.get_running_loop()
+        # VMIN/VTIME=0: non-blocking fd'de read() eldeki byte'lari hemen dondurur
+        self.serial = TermiosSerial(self.port, self.baudrate, vmin=0, vtime=0)
+        os.set_blocking(self.serial.fileno(), False)
+        self._loop.add_reader(self.serial.fileno(), self._on_readable)
+
+    def close(self):
+        if self.serial is not None and self.serial.is_open:
+            self._loop.remove_reader(self.serial.fileno())
+            self.serial.close()
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.serial.fileno(), 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data = b""
+            self._error = e
+        if not data:
+            # Port kapandi (USB cikarildi vb.)
+            self._loop.remove_reader(self.serial.fileno())
+            self._error = self._error or IspError("Port baglantisi koptu")
+        else:
+            self._buffer.extend(data)
+            if self.capture is not None:
+                self.capture.record(data, DIR_RX, time.monotonic_ns())
+        if self._waiter is not None and not self._waiter.done():
+            if self._error is not None or len(self._buffer) >= self._want:
+                self._waiter.set_result(None)
+
+    def discard_input(self):
+        """Bekleyen (eski/yarim) yanit byte'larini atar"""
+        self.serial.reset_input_buffer()
+        self._buffer.clear()
+
+    async def _wait_for(self, want, timeout):
+        """Buffer'da want byte olana kadar bekler, sure dolarsa False dondurur"""
+        if len(self._buffer) >= want or self._error is not None:
+            return True
+        self._want = want
+        self._waiter = self._loop.create_future()
+        try:
+            await asyncio.wait_for(self._waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiter = None
+
+    async def wait_data(self, timeout):
+        """Yeni byte gelene kadar bekler"""
+        return await self._wait_for(len(self._buffer) + 1, timeout)
+
+    async def drain(self, quiet):
+        """Hat `quiet` saniye sessiz kalana dek gelen byte'lari atar (yarim yanitlar)"""
+        self._buffer.clear()
+        while self._error is None and await self.wait_data(quiet):
+            self._buffer.clear()
+        if self._error is not None:
+            raise IspError(f"Okuma hatasi: {self._error}")
+        self.discard_input()
+
+    def take_connect_response(self):
+        """Buffer'da hizali CMD_CONNECT yaniti varsa cikarir (isp_catcher imzasi)"""
+        index = find_connect_response(self._buffer)
+        if index < 0:
+            keep = len(CONNECT_SIGNATURE) - 1
+            del self._buffer[:-keep]
+            return None
+        if len(self._buffer) - index < MAX_PKT_SIZE:
+            return None
+        frame = bytes(self._buffer[index:index + MAX_PKT_SIZE])
+        self._buffer.clear()
+        return frame
+
+    async def read_frame(self, timeout=COMMAND_TIMEOUT):
+        """64 byte yaniti bekler, sure dolarsa None dondurur"""
+        if not await self._wait_for(MAX_PKT_SIZE, timeout):
+            return None
+        if len(self._buffer) < MAX_PKT_SIZE:
+            raise IspError(f"Okuma hatasi: {self._error}")
+        frame = bytes(self._buffer[:MAX_PKT_SIZE])
+        del self._buffer[:MAX_PKT_SIZE]
+        return frame
+
+    async def write(self, frame):
+        """Paketi yazar; tx buffer doluysa fd yazilabilir olana kadar bekler"""
+        fd = self.serial.fileno()
+        data = memoryview(frame).cast("B")
+        if self.capture is not None:
+            self.capture.record(bytes(data), DIR_TX, time.monotonic_ns())
+        written = 0
+        while written < len(data):
+            try:
+                written += os.write(fd, data[written:])
+            except BlockingIOError:
+                ready = self._loop.create_future()
+                self._loop.add_writer(fd, lambda: ready.done() or ready.set_result(None))
+                try:
+                    await ready
+                finally:
+                    self._loop.remove_writer(fd)
+
+
+class AsyncIspClient:
+    """asyncio ISP istemcisi
+
+    Ornek:
+        async with AsyncIspClient("/dev/ttyACM0") as isp:
+            await isp.connect(timeout=30)
+            await isp.sync_packno()
+            device_id = await isp.get_device_id()
+            await isp.update_aprom(bin_data)
+            await isp.run_aprom()
+
+    update_aprom() sadece imajin sayfalarini siler (isp_erase); tum APROM
+    icin once erase_all() cagrilir. Segmentler isp_recovery.SegmentProgrammer
+    ile yazilir (kayip paket/yanit RESEND ile kurtarilir), bloklayan
+    yollarla ayni durum makinesi.
+
+    capture: Port trafigini kaydeden record(data, direction, time_ns)
+             arayuzlu kayitci (isp_capture.CaptureWriter, isp_pcap.PcapngSink)
+    """
+
+    def __init__(self, port, baudrate=BAUD_RATE, deadlines=None, capture=None):
+        self.port = port
+        self.transport = AsyncSerialTransport(port, baudrate, capture)
+        self.aprom_size = None
+        self.dataflash_addr = None
+        self.tracker = PacketTracker()
+        self.deadlines = deadlines or DeadlineEstimator(defaults=SESSION_TIMEOUTS)
+        self.frames = 0
+
+    async def open(self):
+        await self.transport.open()
+
+    def close(self):
+        self.transport.close()
+        self.deadlines.save()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    async def send(self, packet):
+        """Paketi yanit beklemeden gonderir, beklenen yanit paket numarasini dondurur"""
+        await self.transport.write(packet)
+        self.frames += 1
+        return self.tracker.sent(packet)
+
+    async def transact(self, packet, command_class=DEADLINE_CONNECT, units=1):
+        """Paketi gonderir ve 64 byte yaniti dondurur
+
+        Zaman asimi komut sinifinin olculen gecikmelerinden gelir
+        (isp_deadline); sure dolarsa gecikme kaydedilir ve varsayilan sureye
+        kadar beklenir. Gec gelen eski yanitlar atlanir; paket numarasi
+        kaymasi hatadir.
+        """
+        # Protokol istek/yanit: onceki komuttan kalan gec byte'lar hizayi bozmasin
+        self.transport.discard_input()
+        expected = await self.send(packet)
+        sent_at = time.monotonic()
+        deadline = sent_at + self.deadlines.timeout(command_class, units)
+        hard_deadline = sent_at + self.deadlines.hard_timeout(command_class, units)
+        while True:
+            response = await self.transport.read_frame(max(0.0, deadline - time.monotonic()))
+            if response is None:
+                if deadline < hard_deadline:
+                    self.deadlines.expired(command_class)
+                    deadline = hard_deadline
+                    continue
+                raise IspError(f"Yanit yok (komut 0x{bytes_to_uint32(packet, 0):02X}, "
+                               f"{deadline - sent_at:.3f} s)")
+            state, frames = self.tracker.check(packet, response, expected)
+            if state == PACKNO_STALE:
+                continue
+            self.deadlines.observe(command_class, time.monotonic() - sent_at, units)
+            if state != PACKNO_OK:
+                raise IspError(f"Paket numarasi kaymasi (komut 0x{bytes_to_uint32(packet, 0):02X}): "
+                               f"{response_packno(response)}, beklenen {expected} "
+                               f"({frames} paket {state})")
+            return response
+
+    async def run_steps(self, steps):
+        """isp_recovery adim ureteci bu transport'ta calistirir (SegmentProgrammer.run karsiligi)"""
+        result = None
+        try:
+            while True:
+                kind, arg = steps.send(result)
+                if kind == STEP_WRITE:
+                    await self.transport.write(arg)
+                    self.frames += 1
+                    result = None
+                elif kind == STEP_READ:
+                    result = await self.transport.read_frame(arg)
+                else:
+                    await self.transport.drain(arg)
+                    result = None
+        except StopIteration as stop:
+            return stop.value
+
+    # --- komutlar ---
+
+    async def connect(self, timeout=30.0, interval=None):
+        """Bootloader yanit verene kadar hat hizinda CMD_CONNECT gonderir
+
+        Reset sonrasi 300 ms penceresi icin; aralik ve yanit tespiti
+        isp_catcher ile ayni (paket hizasi, ASCII tahmini yok).
+
+        Returns:
+            int: APROM boyutu
+        """
+        baudrate = self.transport.baudrate
+        interval = connect_interval(baudrate) if interval is None else interval
+        deadline = time.monotonic() + timeout
+        next_send = time.monotonic()
+        self.transport.discard_input()
+        while time.monotonic() < deadline:
+            now = time.monotonic()
+            if now >= next_send:
+                await self.send(CONNECT_PACKET)
+                next_send = max(next_send + interval, now)
+            await self.transport.wait_data(max(0.0, next_send - time.monotonic()))
+            response = self.transport.take_connect_response()
+            if response is not None:
+                # Yoldaki diger CMD_CONNECT yanitlari
+                await asyncio.sleep(2 * frame_time(baudrate) + interval)
+                self.transport.discard_input()
+                self.tracker.connected()
+                self.aprom_size = bytes_to_uint32(response, 8)
+                self.dataflash_addr = bytes_to_uint32(response, 12)
+                return self.aprom_size
+        raise IspError(f"Bootloader yakalanamadi ({timeout:g} s)")
+
+    async def sync_packno(self, packno=1):
+        await self.transact(create_packet(CMD_SYNC_PACKNO, packno))
+
+    async def get_device_id(self):
+        response = await self.transact(create_packet(CMD_GET_DEVICEID))
+        device_id = bytes_to_uint32(response, 8)
+        self.deadlines.attach(device_id)  # Bu cihaz tipinin olculen sureleri
+        return device_id
+
+    async def get_fw_version(self):
+        response = await self.transact(create_packet(CMD_GET_FWVER))
+        return response[8]
+
+    async def erase_all(self):
+        await self.transact(create_packet(CMD_ERASE_ALL), DEADLINE_ERASE_ALL)
+
+    async def run_aprom(self):
+        """CMD_RUN_APROM gonderir (yanit yok, bootloader hemen reset atar)"""
+        await self.send(create_packet(CMD_RUN_APROM))
+
+    async def update_aprom(self, data, address=0x00000000, sparse=False, verify=False,
+                           progress=None):
+        """APROM'a imaj yazar
+
+        Ilk paketlerdeki boyut sayfa katina yuvarlanir (isp_erase); sparse
+        modda atlanan bos sayfalar onceki segmentin ilk paketinde silinir.
+
+        Args:
+            sparse: Bos (0xFF) sayfalari atla
+            verify: Her paketi yanit checksum'i ile dogrula
+            progress: progress(done, total) - her pakette cagrilir
+
+        Returns:
+            int: Yazilan byte sayisi
+        """
+        segments = split_segments(data, address) if sparse else [(address, data)]
+        plan = plan_erase(segments, self.aprom_size, fill_gaps=sparse)
+        total = sum(len(seg) for _, seg in segments)
+        done = 0
+        for seg_address, seg_data, erase_size in plan.segments:
+            stream = FrameStream(seg_address, seg_data, erase_size)
+            await self._write_segment(seg_address, seg_data, verify, erase_size, stream,
+                                      progress and (lambda offset, base=done:
+                                                    progress(base + offset, total)))
+            done += len(seg_data)
+        return done
+
+    async def update_dataflash(self, data, verify=False, progress=None):
+        """Data flash'a yazar
+
+        Bootloader adresi kendisi secer (g_u32DataFlashAddr) ve ilk pakette
+        tum data flash alanini siler. Data flash tanimli degilse (boyut 0)
+        bootloader veriyi yazmadan onaylar; bu durumda ve veri alana
+        sigmiyorsa paket gondermeden hata verilir.
+
+        Args:
+            progress: progress(done, total) - her pakette cagrilir
+
+        Returns:
+            int: Yazilan byte sayisi
+
+        Raises:
+            IspError: Data flash yok veya veri sigmiyor
+        """
+        address = self.dataflash_addr or 0
+        size = self.aprom_size - address if self.aprom_size and address < self.aprom_size else 0
+        if size == 0:
+            raise IspError("Data flash tanimli degil (boyut 0)")
+        if len(data) > size:
+            raise IspError(f"Veri data flash'a sigmiyor: {len(data)} > {size} byte")
+        stream = FrameStream(address, data, command=CMD_UPDATE_DATAFLASH)
+        await self._write_segment(address, data, verify, None, stream,
+                                  progress and (lambda offset: progress(offset, len(data))),
+                                  CMD_UPDATE_DATAFLASH)
+        return len(data)
+
+    async def _write_segment(self, address, data, verify, erase_size, stream, progress,
+                             command=CMD_UPDATE_APROM):
+        """Segmenti isp_recovery.SegmentProgrammer adimlariyla yazar
+
+        Kayip paket/yanit ve dogrulama hatalari bloklayan yoldaki gibi
+        CMD_RESEND_PACKET ve yeni ilk paketle kurtarilir.
+        """
+        programmer = SegmentProgrammer(None, timeout=COMMAND_TIMEOUT,
+                                       first_timeout=ERASE_TIMEOUT, verify=verify,
+                                       tracker=self.tracker, deadlines=self.deadlines)
+        # Transport'ta onceki komuttan kalan gec byte'lar hizayi bozmasin
+        self.transport.discard_input()
+        try:
+            await self.run_steps(programmer.program_steps(address, data, progress,
+                                                          erase_size=erase_size,
+                                                          frames=stream, command=command))
+        except RecoveryError as e:
+            raise IspError(str(e))
+
+
+async def flash(port, bin_data, connect_timeout=30.0):
+    """Tek portta connect, sync, program, run - sonucu dict olarak dondurur
+
+    Silme ilk paketlerin EraseAP'i ile yapilir (isp_erase), CMD_ERASE_ALL yok.
+    """
+    start = time.monotonic()
+    result = {"port": port, "ok": False, "error": None, "device_id": None}
+    try:
+        async with AsyncIspClient(port) as isp:
+            await isp.connect(connect_timeout)
+            await isp.sync_packno()
+            result["device_id"] = await isp.get_device_id()
+            await isp.update_aprom(bin_data)
+            await isp.run_aprom()
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    result["total"] = time.monotonic() - start
+    return result
+
+
+async def flash_all(ports, bin_data, connect_timeout=30.0):
+    return await asyncio.gather(*(flash(port, bin_data, connect_timeout) for port in ports))
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Kullanim: python3 isp_async.py <bin_file> <port1> [port2 ...]")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'rb') as f:
+        bin_data = f.read()
+    ports = sys.argv[2:]
+
+    print(f"Kartlari RESET yapin ({len(ports)} port)...")
+    results = asyncio.run(flash_all(ports, bin_data))
+    for r in results:
+        device_id = f"0x{r['device_id']:08X}" if r['device_id'] is not None else "-"
+        status = "[OK]" if r['ok'] else f"[X] {r['error']}"
+        print(f"  {r['port']:<16} {device_id:<12} {r['total']:6.2f} s  {status}")
+    sys.exit(0 if all(r['ok'] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Cihaz bazli imaj onbellegi (delta programlama icin)
+Her cihaza en son basariyla yazilan imaji diskte saklar
+"""
+
+import os
+
+# Varsayilan onbellek dizini
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "oto-update")
+
+
+def device_cache_key(pdid, port_name):
+    """Cihaz anahtari olusturur: PDID + USB seri numarasi
+
+    USB seri numarasi bulunamazsa port adi kullanilir.
+    """
+    serial_number = None
+    try:
+        import serial.tools.list_ports
+        for p in serial.tools.list_ports.comports():
+            if p.device == port_name:
+                serial_number = p.serial_number
+                break
+    except Exception:
+        pass
+
+    if not serial_number:
+        serial_number = os.path.basename(port_name or "unknown")
+
+    safe_serial = "".join(c if c.isalnum() else "_" for c in serial_number)
+    return f"{pdid:08X}_{safe_serial}"
+
+
+class ImageCache:
+    """Cihaza yazilan son imajin disk onbellegi
+
+    Yazma basladiginda kayit silinir (invalidate), sadece basarili yazma
+    sonrasi yeniden kaydedilir. Boylece yarida kalan bir yazma sonrasi
+    flash icerigi yanlis kabul edilmez.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def load(self, key):
+        """Onbellekteki imaji dondurur (yoksa None)"""
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, key, data):
+        """Imaji atomik olarak kaydeder"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def invalidate(self, key):
+        """Kaydi siler (yazma basliyor, flash icerigi artik bilinmiyor)"""
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Kayipsiz UART yakalama (ikili kayit dosyasi)
+Seri porttan okunan ham byte'lar monotonik nanosaniye zaman damgasiyla
+kompakt, sadece sona eklenen bir ikili dosyaya yazilir. Okuyan thread
+veriyi onceden ayrilmis bir halka buffer'a kopyalar; dosyaya yazma ayri bir
+thread'de yapilir, boylece terminal/disk gecikmesi okumayi durdurmaz.
+
+Dosya bicimi (little-endian):
+    baslik   8s magic "ISPCAP1\\0", H surum, H bayrak (0), I baud,
+             Q baslangic (time.time_ns, Unix epoch ns)
+    kayit    Q zaman (ns, yakalama basindan beri, time.monotonic_ns),
+             B yon (DIR_RX / DIR_TX), x, H uzunluk, ardindan veri
+
+Okuma: read_capture(path) -> (CaptureHeader, [CaptureRecord, ...])
+       iter_capture(path) -> (CaptureHeader, kayit ureteci) - sabit bellek
+"""
+
+import collections
+import struct
+import threading
+import time
+
+CAPTURE_MAGIC = b"ISPCAP1\0"
+CAPTURE_VERSION = 1
+
+DIR_RX = 0  # Karttan hosta
+DIR_TX = 1  # Hosttan karta
+
+RING_SIZE = 1 << 20  # Halka buffer (1 MiB ~ 90 s @ 115200)
+MAX_RECORD_DATA = 0xFFFF
+READ_CHUNK = 1 << 20  # iter_capture okuma blogu
+
+_HEADER = struct.Struct('<8sHHIQ')
+_RECORD = struct.Struct('<QBxH')
+
+CaptureHeader = collections.namedtuple("CaptureHeader", "version flags baudrate start_ns")
+CaptureRecord = collections.namedtuple("CaptureRecord", "time_ns direction data")
+
+
+class CaptureError(Exception):
+    """Yakalama dosyasi okunamadi / bicim hatali"""
+
+
+class CaptureRing:
+    """Onceden ayrilmis halka buffer (tek bosaltan yazici thread)
+
+    put() kaydi kilit altinda buffer'a kopyalar (birden fazla thread
+    kaydedebilir); yer yoksa yazici bosaltana kadar bekler (kayipsiz,
+    bekleme sayisi `stalls`). Bekleme sirasinda byte'lar cekirdegin seri
+    port buffer'inda kalir. Dosyaya yazma kilit disinda yapilir.
+    """
+
+    def __init__(self, size=RING_SIZE):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.size = size
+        self.head = 0  # Toplam yazilan byte
+        self.tail = 0  # Toplam bosaltilan byte
+        self.stalls = 0
+        self.peak = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def _copy_in(self, position, data):
+        start = position % self.size
+        first = min(len(data), self.size - start)
+        self.view[start:start + first] = data[:first]
+        if first < len(data):
+            self.view[0:len(data) - first] = data[first:]
+
+    def put(self, time_ns, direction, data):
+        """Kaydi ekler (veri MAX_RECORD_DATA'dan uzunsa bolunur)"""
+        for offset in range(0, len(data), MAX_RECORD_DATA):
+            chunk = data[offset:offset + MAX_RECORD_DATA]
+            length = _RECORD.size + len(chunk)
+            if length > self.size:
+                raise ValueError("Kayit halka buffer'dan buyuk")
+            with self._cond:
+                if self.head - self.tail + length > self.size:
+                    self.stalls += 1
+                    while self.head - self.tail + length > self.size:
+                        self._cond.wait()
+                # Yazici sadece [tail, head) araligini okur; bos alana yazilir
+                self._copy_in(self.head, _RECORD.pack(time_ns, direction, len(chunk)))
+                self._copy_in(self.head + _RECORD.size, chunk)
+                self.head += length
+                self.peak = max(self.peak, self.head - self.tail)
+                self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def drain_into(self, f):
+        """Yazici thread: buffer bosaldikca dosyaya yazar, close() sonrasi doner"""
+        while True:
+            with self._cond:
+                while self.head == self.tail and not self.closed:
+                    self._cond.wait()
+                if self.head == self.tail:
+                    return
+                start = self.tail % self.size
+                end = start + min(self.head - self.tail, self.size - start)
+            f.write(self.view[start:end])
+            with self._cond:
+                self.tail += end - start
+                self._cond.notify_all()
+
+    @property
+    def fill(self):
+        """Doluluk orani (0-1)"""
+        return (self.head - self.tail) / self.size
+
+
+class CaptureWriter:
+    """Ikili kayit dosyasina halka buffer + yazici thread ile yazar
+
+    Ornek:
+        with CaptureWriter("boot.ispcap", baudrate=115200) as capture:
+            data = ser.read(ser.in_waiting or 1)
+            capture.record(data)                 # DIR_RX, zaman simdi
+    """
+
+    def __init__(self, path, baudrate=0, ring_size=RING_SIZE):
+        self.path = path
+        self.start_ns = time.monotonic_ns()
+        self.ring = CaptureRing(ring_size)
+        self.records = 0
+        self.bytes = 0
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, 0, baudrate,
+                                      time.time_ns()))
+        self._thread = threading.Thread(target=self._run, name="isp-capture", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        self.ring.drain_into(self._file)
+
+    def record(self, data, direction=DIR_RX, time_ns=None):
+        """Okunan/yazilan byte'lari kaydeder (time_ns: time.monotonic_ns() degeri)"""
+        if not data:
+            return
+        if time_ns is None:
+            time_ns = time.monotonic_ns()
+        self.ring.put(time_ns - self.start_ns, direction, data)
+        self.records += 1
+        self.bytes += len(data)
+
+    def close(self):
+        """Kalan veriyi yazar ve dosyayi kapatir"""
+        if self._file.closed:
+            return
+        self.ring.close()
+        self._thread.join()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _read_header(f, path):
+    blob = f.read(_HEADER.size)
+    if len(blob) < _HEADER.size:
+        raise CaptureError(f"Yakalama dosyasi cok kisa: {path}")
+    magic, version, flags, baudrate, start_ns = _HEADER.unpack(blob)
+    if magic != CAPTURE_MAGIC:
+        raise CaptureError(f"Yakalama dosyasi degil: {path}")
+    if version != CAPTURE_VERSION:
+        raise CaptureError(f"Desteklenmeyen surum: {version}")
+    return CaptureHeader(version, flags, baudrate, start_ns)
+
+
+def _iter_records(f, chunk_size):
+    pending = b""
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            return  # Yarida kalan son kayit (yakalama kesildi) atlanir
+        blob = pending + block
+        view = memoryview(blob)
+        offset = 0
+        while offset + _RECORD.size <= len(blob):
+            time_ns, direction, length = _RECORD.unpack_from(blob, offset)
+            end = offset + _RECORD.size + length
+            if end > len(blob):
+                break
+            yield CaptureRecord(time_ns, direction, bytes(view[offset + _RECORD.size:end]))
+            offset = end
+        pending = blob[offset:]
+
+
+def iter_capture(path, chunk_size=READ_CHUNK):
+    """Ikili kayit dosyasini bloklar halinde okur (dosya boyutundan bagimsiz bellek)
+
+    Returns:
+        (CaptureHeader, CaptureRecord ureteci) - dosya uretec bitince kapanir
+
+    Raises:
+        CaptureError: Dosya bu bicimde degil
+    """
+    f = open(path, "rb")
+    try:
+        header = _read_header(f, path)
+    except Exception:
+        f.close()
+        raise
+
+    def records():
+        with f:
+            yield from _iter_records(f, chunk_size)
+
+    return header, records()
+
+
+def read_capture(path):
+    """Ikili kayit dosyasini okur
+
+    Returns:
+        (CaptureHeader, [CaptureRecord, ...])
+
+    Raises:
+        CaptureError: Dosya bu bicimde degil
+    """
+    header, records = iter_capture(path)
+    return header, list(records)
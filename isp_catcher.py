@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Hat hizinda CMD_CONNECT yakalayici
+Reset sonrasi 300 ms penceresini ilk denemede yakalamak icin CMD_CONNECT
+paketlerini hat hizinda, sabit zaman cizelgesiyle gonderir.
+
+Paket araligi = 64 byte hat suresi + 2 x RX timeout (115200'de ~6.7 ms).
+Paketler arasindaki bu kisa bosluk bootloader'in RX timeout'unu tetikler
+(g_u8bufhead = 0); reset paketin ortasina denk gelse bile bir sonraki
+paket buffer'in basina hizalanir. Bosluksuz gonderimde main.c'nin
+14 byte'lik FIFO okumalari paket basina hic denk gelmeyebilir.
+
+Yanit tespiti ASCII tahmini ile degil paket hizasi ile yapilir: CMD_CONNECT
+yaniti her zaman checksum = 0x00AE (gonderilen paketin toplami), byte 2-3 = 0
+ve paket no = 2 (CMD_CONNECT u32PackNo'yu 1 yapar, ++) ile baslar. Gelen byte
+akisinda bu imza aranir; oncesindeki uygulama ciktisi atlanir.
+"""
+
+import os
+import select
+import struct
+import time
+
+from isp_protocol import CMD_CONNECT, MAX_PKT_SIZE
+from isp_transport import _port_fileno, rx_timeout, write_frame
+
+CONNECT_PACKET = struct.pack('<I', CMD_CONNECT) + bytes(MAX_PKT_SIZE - 4)
+# Yanit byte 0-7: checksum (16 bit), 0, paket no (32 bit)
+CONNECT_SIGNATURE = struct.pack('<HHI', sum(CONNECT_PACKET) & 0xFFFF, 0, 2)
+
+
+def frame_time(baudrate):
+    """64 byte paketin hat suresi (8N1)"""
+    return MAX_PKT_SIZE * 10.0 / baudrate
+
+
+def connect_interval(baudrate):
+    """CMD_CONNECT paket araligi: hat suresi + RX timeout'u tetikleyecek bosluk"""
+    return frame_time(baudrate) + 2 * rx_timeout(baudrate)
+
+
+def find_connect_response(buffer):
+    """Byte akisinda hizali CMD_CONNECT yanitinin baslangicini dondurur (yoksa -1)"""
+    return bytes(buffer).find(CONNECT_SIGNATURE)
+
+
+class CatchResult:
+    """Yakalama sonucu
+
+    response: 64 byte CMD_CONNECT yaniti
+    attempts: Gonderilen CMD_CONNECT sayisi
+    elapsed: Yakalayici baslangicindan yanita kadar gecen sure
+    latency: Resetten yanita kadar gecen sure (reset ani bilinmiyorsa ust
+             sinir: yanitsiz kalan son paketin gonderiminden itibaren)
+    frame_latency: Yanitlanan paketin gonderiminden yanita kadar gecen sure
+    skipped: Yanittan once atlanan (uygulama ciktisi vb.) byte sayisi
+    """
+
+    def __init__(self, response, attempts, elapsed, latency, frame_latency, skipped):
+        self.response = response
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.latency = latency
+        self.frame_latency = frame_latency
+        self.skipped = skipped
+
+    @property
+    def aprom_size(self):
+        return struct.unpack_from('<I', self.response, 8)[0]
+
+    @property
+    def dataflash_addr(self):
+        return struct.unpack_from('<I', self.response, 12)[0]
+
+    def __str__(self):
+        return (f"{self.attempts} deneme, gecikme {self.latency * 1000:.1f} ms "
+                f"(paket {self.frame_latency * 1000:.1f} ms)")
+
+
+class ConnectCatcher:
+    """CMD_CONNECT paketlerini hat hizinda gonderip yanit bekleyen yakalayici"""
+
+    def __init__(self, ser, interval=None):
+        self.ser = ser
+        baudrate = getattr(ser, "baudrate", None) or 115200
+        self.frame_time = frame_time(baudrate)
+        self.interval = interval if interval is not None else connect_interval(baudrate)
+
+    def _read_available(self, fd, timeout):
+        if fd is not None:
+            readable, _, _ = select.select([fd], [], [], timeout)
+            return os.read(fd, 4096) if readable else b""
+        old_timeout = self.ser.timeout
+        self.ser.timeout = timeout
+        try:
+            return self.ser.read(max(1, self.ser.in_waiting))
+        finally:
+            self.ser.timeout = old_timeout
+
+    def catch(self, timeout=None, start_at=None, deadline=None, reset_at=None):
+        """Bootloader yanit verene kadar CMD_CONNECT gonderir
+
+        Args:
+            timeout: Toplam sure (saniye), None ise suresiz
+            start_at: Ilk paketin gonderilecegi an (time.monotonic), None ise hemen
+            deadline: Son paketin gonderilebilecegi an (timeout yerine)
+            reset_at: Reset birakilma ani biliniyorsa (gecikme hesabi icin)
+
+        Returns:
+            CatchResult, sure dolarsa None
+        """
+        start = time.monotonic()
+        if deadline is None and timeout is not None:
+            deadline = start + timeout
+        next_send = start if start_at is None else start_at
+        fd = _port_fileno(self.ser)
+        sent = []
+        buffer = bytearray()
+        skipped = 0
+
+        self.ser.reset_input_buffer()
+        while True:
+            now = time.monotonic()
+            if now >= next_send:
+                if deadline is not None and now >= deadline:
+                    break
+                write_frame(self.ser, CONNECT_PACKET)
+                sent.append(now)
+                next_send += self.interval
+                if next_send < now:
+                    # Gecikme olduysa toplu gonderim yapma, cizelgeyi kaydir
+                    next_send = now + self.interval
+
+            buffer.extend(self._read_available(fd, max(0.0, next_send - time.monotonic())))
+            index = find_connect_response(buffer)
+            if index < 0:
+                # Imza parcasi sonraki okumada tamamlanabilir
+                keep = len(CONNECT_SIGNATURE) - 1
+                if len(buffer) > keep:
+                    skipped += len(buffer) - keep
+                    del buffer[:-keep]
+                continue
+            if len(buffer) - index < MAX_PKT_SIZE:
+                continue
+
+            received_at = time.monotonic()
+            response = bytes(buffer[index:index + MAX_PKT_SIZE])
+            skipped += index
+            self._drain(fd)
+            return self._result(response, sent, start, received_at, reset_at, skipped)
+
+        # Pencere sonunda son paketin yaniti hala yolda olabilir
+        if sent:
+            last_chance = time.monotonic() + 2 * self.frame_time + self.interval
+            while time.monotonic() < last_chance:
+                buffer.extend(self._read_available(fd, max(0.0, last_chance - time.monotonic())))
+                index = find_connect_response(buffer)
+                if index >= 0 and len(buffer) - index >= MAX_PKT_SIZE:
+                    received_at = time.monotonic()
+                    self._drain(fd)
+                    return self._result(bytes(buffer[index:index + MAX_PKT_SIZE]), sent, start,
+                                        received_at, reset_at, skipped + index)
+        return None
+
+    def _drain(self, fd):
+        """Yoldaki diger CMD_CONNECT paketlerinin yanitlarini atar"""
+        quiet = 2 * self.frame_time + self.interval
+        while self._read_available(fd, quiet):
+            pass
+        self.ser.reset_input_buffer()
+
+    def _result(self, response, sent, start, received_at, reset_at, skipped):
+        # Yanitlanan paket: yanit tamamlanmadan en az istek + yanit hat suresi once gonderilen son paket
+        answered = 0
+        for i, sent_at in enumerate(sent):
+            if sent_at <= received_at - 2 * self.frame_time:
+                answered = i
+        frame_latency = received_at - sent[answered]
+        if reset_at is not None:
+            latency = received_at - reset_at
+        elif answered > 0:
+            latency = received_at - sent[answered - 1]
+        else:
+            latency = frame_latency
+        return CatchResult(response, len(sent), received_at - start, latency, frame_latency,
+                           skipped)
+
+
+def catch_bootloader(ser, timeout=None, **kwargs):
+    """Kisayol: ConnectCatcher(ser).catch(timeout)"""
+    return ConnectCatcher(ser).catch(timeout, **kwargs)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Olculen yanit surelerinden komut bazli zaman asimi
+Her komut sinifi icin yanit gecikmesi olculur; EWMA (RFC 6298 tarzi
+srtt/rttvar) ve son WINDOW olcumun yuzdeligi tutulur. Zaman asimi secilen
+yuzdelik (varsayilan %99) x MARGIN ile srtt + 4 x rttvar'in buyugudur.
+Yeterli olcum yoksa sinifin varsayilan (ust sinir) suresi kullanilir.
+
+Komut siniflari:
+    connect    CMD_CONNECT / CMD_SYNC_PACKNO / CMD_GET_DEVICEID gibi basit komutlar
+    erase_all  CMD_ERASE_ALL (tum APROM)
+    first      Ilk CMD_UPDATE_APROM paketi: EraseAP tum uzunluk boyunca
+               calisir, gecikme silinen sayfa basina olculur
+    next       Devam paketi (56 byte yazma)
+    resend     CMD_RESEND_PACKET (sayfa silme + geri yazma)
+
+Olcumler cihaz tipine (PDID) gore CACHE_DIR/deadlines altinda saklanir;
+sonraki calistirmada ayni tip kartta ogrenilmis surelerle baslanir.
+Zaman asimindan sonra o sinifin suresi bir sonraki olcume kadar ikiye
+katlanir (en fazla varsayilan sureye kadar).
+
+Kurtarma yolu olan paketler (devam/ilk paket: CMD_RESEND_PACKET) ogrenilen
+sure dolunca hemen kurtarmaya gecer. Kurtarmasi olmayan komutlar
+(CMD_ERASE_ALL, CMD_SYNC_PACKNO, RESEND'in kendisi) ogrenilen sureyi
+"gec kaldi" olarak kaydeder ve hard_timeout()'a (varsayilan sure) kadar
+beklemeye devam eder.
+"""
+
+import json
+import os
+from collections import deque
+
+from isp_cache import CACHE_DIR
+from isp_image import FLASH_PAGE_SIZE
+
+DEADLINE_CONNECT = "connect"
+DEADLINE_ERASE_ALL = "erase_all"
+DEADLINE_FIRST = "first"
+DEADLINE_NEXT = "next"
+DEADLINE_RESEND = "resend"
+
+# Ogrenilmeden onceki (ve geri cekilmede ust sinir) sureler (saniye)
+DEFAULT_TIMEOUTS = {
+    DEADLINE_CONNECT: 1.0,
+    DEADLINE_ERASE_ALL: 10.0,
+    DEADLINE_FIRST: 10.0,
+    DEADLINE_NEXT: 1.0,
+    DEADLINE_RESEND: 1.0,
+}
+
+DEFAULT_QUANTILE = 0.99
+MARGIN = 1.5  # Yuzdelik ustune pay
+MIN_TIMEOUT = 0.02  # USB-UART gecikme zamanlayicisi + 64 byte yanit suresi
+MIN_SAMPLES = 5  # Bundan az olcumle varsayilan sure kullanilir
+WINDOW = 128  # Yuzdelik icin saklanan son olcum sayisi
+EWMA_ALPHA = 0.125  # srtt
+EWMA_BETA = 0.25  # rttvar
+
+# Varsayilan olcum dizini (anahtar: PDID)
+DEADLINE_DIR = os.path.join(CACHE_DIR, "deadlines")
+
+
+def erase_pages(address, size, page_size=FLASH_PAGE_SIZE):
+    """EraseAP(address, size) cagrisinin sildigi sayfa sayisi (en az 1)"""
+    first_page = address - address % page_size
+    end = address + max(size, 1)
+    return max(1, (end - first_page + page_size - 1) // page_size)
+
+
+def quantile(samples, q):
+    """Siralanmis olcumlerde en yakin sira yuzdeligi"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class _ClassStats:
+    """Tek komut sinifinin birim basina gecikme istatistigi"""
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = 0.0
+        self.samples = deque(maxlen=WINDOW)
+        self.misses = 0
+
+    def observe(self, latency):
+        if self.srtt is None:
+            self.srtt = latency
+            self.rttvar = latency / 2
+        else:
+            self.rttvar += EWMA_BETA * (abs(self.srtt - latency) - self.rttvar)
+            self.srtt += EWMA_ALPHA * (latency - self.srtt)
+        self.samples.append(latency)
+        self.misses = 0
+
+    def to_dict(self):
+        return {"srtt": self.srtt, "rttvar": self.rttvar, "samples": list(self.samples)}
+
+    def merge(self, record):
+        """Kayitli olcumleri bu oturumdakilerin onune ekler"""
+        samples = [float(s) for s in record.get("samples", [])]
+        self.samples = deque(samples + list(self.samples), maxlen=WINDOW)
+        if self.srtt is None and record.get("srtt") is not None:
+            self.srtt = float(record["srtt"])
+            self.rttvar = float(record.get("rttvar", 0.0))
+
+
+class DeadlineEstimator:
+    """Komut sinifi bazinda ogrenilen yanit zaman asimlari
+
+    Ornek:
+        deadlines = DeadlineEstimator()
+        timeout = deadlines.timeout(DEADLINE_FIRST, erase_pages(addr, size))
+        ... yanit geldiyse:  deadlines.observe(DEADLINE_FIRST, gecikme, sayfa)
+        ... zaman asimi:     deadlines.expired(DEADLINE_FIRST)
+        deadlines.attach(pdid)   # kayitli olcumleri yukle (cihaz tipi)
+        deadlines.save()
+
+    Args:
+        quantile: Zaman asimi icin kullanilan gecikme yuzdeligi (0-1)
+        defaults: {sinif: sure} - ogrenilmeden onceki sureler ve ust sinir
+        deadline_dir: Olcum dizini (None: saklanmaz)
+    """
+
+    def __init__(self, quantile=DEFAULT_QUANTILE, defaults=None, deadline_dir=DEADLINE_DIR):
+        if not 0 < quantile <= 1:
+            raise ValueError(f"Yuzdelik 0-1 araliginda olmali: {quantile}")
+        self.quantile = quantile
+        self.defaults = dict(DEFAULT_TIMEOUTS)
+        if defaults:
+            self.defaults.update(defaults)
+        self.deadline_dir = deadline_dir
+        self.path = None
+        self.pdid = None
+        self._stats = {name: _ClassStats() for name in self.defaults}
+
+    def _class(self, command_class):
+        if command_class not in self._stats:
+            raise ValueError(f"Bilinmeyen komut sinifi: {command_class}")
+        return self._stats[command_class]
+
+    def learned(self, command_class, units=1):
+        """Ogrenilmis zaman asimi (yeterli olcum yoksa None)"""
+        stats = self._class(command_class)
+        if len(stats.samples) < MIN_SAMPLES:
+            return None
+        per_unit = max(quantile(stats.samples, self.quantile) * MARGIN,
+                       stats.srtt + 4 * stats.rttvar)
+        return max(MIN_TIMEOUT, per_unit * units)
+
+    def timeout(self, command_class, units=1):
+        """Komut sinifi icin zaman asimi (saniye)
+
+        units: Olcumun birimi basina (first: silinen sayfa sayisi)
+        """
+        stats = self._class(command_class)
+        default = self.defaults[command_class]
+        value = self.learned(command_class, units)
+        if value is None:
+            return default
+        if stats.misses:
+            # Zaman asimindan sonra geri cekil: varsayilan sureye kadar katla
+            value = min(value * 2 ** stats.misses, max(default, value))
+        return value
+
+    def hard_timeout(self, command_class, units=1):
+        """Kurtarmasi olmayan komutlar icin son sinir: varsayilan sure (ogrenilen daha buyukse o)"""
+        return max(self.defaults[command_class], self.timeout(command_class, units))
+
+    def observe(self, command_class, latency, units=1):
+        """Yanit gecikmesini kaydeder (gonderim sonu -> 64. byte)"""
+        self._class(command_class).observe(latency / max(units, 1))
+
+    def expired(self, command_class):
+        """Yanit zaman asimina ugradi: sonraki sure geri cekilir"""
+        stats = self._class(command_class)
+        stats.misses = min(stats.misses + 1, 8)
+
+    def attach(self, pdid):
+        """Cihaz tipinin (PDID) kayitli olcumlerini yukler; save() buraya yazar"""
+        if self.deadline_dir is None or pdid is None:
+            return
+        self.pdid = pdid
+        self.path = os.path.join(self.deadline_dir, f"{pdid:08X}.json")
+        try:
+            with open(self.path, "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return
+        if record.get("pdid") != pdid:
+            return
+        for name, stats in self._stats.items():
+            if isinstance(record.get(name), dict):
+                stats.merge(record[name])
+
+    def save(self):
+        """Olcumleri diske yazar (attach() cagrilmadiysa bir sey yapmaz)"""
+        if self.path is None:
+            return
+        record = {name: stats.to_dict() for name, stats in self._stats.items()}
+        record["pdid"] = self.pdid
+        try:
+            os.makedirs(self.deadline_dir, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def summary(self):
+        """Sinif bazinda guncel zaman asimlari (ms)"""
+        parts = []
+        for name in self._stats:
+            value = self.learned(name)
+            if value is None:
+                parts.append(f"{name} {self.defaults[name] * 1000:.0f} ms (varsayilan)")
+            else:
+                unit = "/sayfa" if name == DEADLINE_FIRST else ""
+                parts.append(f"{name} {value * 1000:.0f} ms{unit}")
+        return ", ".join(parts)
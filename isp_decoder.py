@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Yakalanan oturumlarin cevrimdisi protokol cozucusu
+isp_capture kaydindaki iki yonlu ham byte akisini 64 byte'lik ISP
+paketlerine yeniden boler ve her paketi komut, adres, uzunluk, paket
+numarasi ve checksum gecerliligi ile etiketler. Kayit tek geciste,
+bloklar halinde okunur; bellek kullanimi dosya boyutundan bagimsizdir.
+
+Cerceveleme:
+    TX (host -> kart)  Bootloader'in kendi kurali: RX timeout'tan (0x40 bit
+                       sure, isp_transport.rx_timeout) uzun bosluk yarim
+                       paketi atar (uart_transfer.c). Atilan yarim paket
+                       "rx_timeout" olayi olarak bildirilir. Simulator
+                       kayitlarinda pty titremesi icin rx_timeout_floor
+                       (--rx-floor) verilebilir; gercek kart kayitlarinda 0
+    RX (kart -> host)  Yanit checksum'i (byte 0-1) bekleyen bir istegin
+                       toplamiyla veya paket numarasi (byte 4-7) beklenenle
+                       eslesen hizada kesilir. Eslesme yoksa kayan pencerede
+                       aranir; atlanan byte'lar "resync" olayi olur. Uzun
+                       sessizlikte kalan yarim yanit "rx_split" olur
+
+Isaretler (IspPacket.flags):
+    checksum    Yanit checksum'i istekle uyusmuyor (yazma/geri okuma hatasi)
+    packno      Paket numarasi beklenmedik (isp_packno: lost/ahead/stale)
+    unmatched   Yanit hicbir bekleyen istege ait degil
+    outlier     Gecikme komut sinifinin olagan suresinin cok ustunde
+    unknown     Bilinmeyen komut kelimesi
+
+Gecikme siniflari isp_deadline ile aynidir; ilk paket gecikmesi silinen
+sayfa basina degerlendirilir. Aykiri deger: srtt + OUTLIER_K x rttvar'i ve
+srtt + MIN_TIMEOUT'u (USB-UART zamanlayici titremesi) asan gecikme (en az
+MIN_SAMPLES olcumden sonra).
+
+Kullanim:
+    python3 isp_decoder.py <kayit.ispcap> [--errors] [--outlier=4] [--baud=115200]
+                           [--rx-floor=0.002]
+    (--errors: sadece isaretli paketler ve olaylar yazdirilir,
+     --rx-floor: RX timeout alt siniri, saniye - simulator kayitlari icin)
+"""
+
+import collections
+import struct
+import sys
+
+from isp_capture import DIR_RX, DIR_TX, iter_capture
+from isp_deadline import (DEADLINE_CONNECT, DEADLINE_ERASE_ALL, DEADLINE_FIRST, DEADLINE_NEXT,
+                          DEADLINE_RESEND, EWMA_ALPHA, EWMA_BETA, MIN_SAMPLES, MIN_TIMEOUT,
+                          erase_pages)
+from isp_frames import FIRST_DATA_LEN, NEXT_DATA_LEN
+from isp_packno import PACKNO_OK, PacketTracker, response_packno
+import isp_protocol
+from isp_protocol import (CMD_CONNECT, CMD_ERASE_ALL, CMD_RESEND_PACKET, CMD_RUN_APROM,
+                          CMD_SYNC_PACKNO, CMD_UPDATE_APROM, CMD_UPDATE_DATAFLASH, MAX_PKT_SIZE,
+                          calculate_checksum, response_checksum)
+from isp_transport import rx_timeout
+
+COMMAND_NAMES = {value: name[4:] for name, value in vars(isp_protocol).items()
+                 if name.startswith("CMD_") and isinstance(value, int)}
+
+OUTLIER_K = 4.0  # Aykiri gecikme esigi: srtt + OUTLIER_K x rttvar
+MAX_PENDING = 32  # Yaniti beklenen en fazla istek (eskisi yanitsiz sayilir)
+RX_SPLIT_GAP = 0.05  # Yarim yanittan sonra bu kadar sessizlik: yanit bolunmus (saniye)
+
+EVENT_RESYNC = "resync"
+EVENT_RX_TIMEOUT = "rx_timeout"
+EVENT_RX_SPLIT = "rx_split"
+EVENT_UNANSWERED = "unanswered"
+
+DecoderEvent = collections.namedtuple("DecoderEvent", "time_ns direction kind detail")
+
+_WORDS = struct.Struct('<IIII')
+
+
+class IspPacket:
+    """Cozulmus 64 byte paket
+
+    Attributes:
+        time_ns: Paketi tamamlayan kaydin zamani (yakalama basindan ns)
+        direction: DIR_TX (istek) / DIR_RX (yanit)
+        command: Komut kelimesi (yanitta ait oldugu istegin komutu, bilinmiyorsa None)
+        name: Komut adi (devam paketi: "UPDATE_APROM+")
+        address, length: Yazilan adres ve bu paketteki veri uzunlugu (yoksa None)
+        packno: Byte 4-7 (istekte host sira numarasi, yanitta u32PackNo)
+        checksum: Istekte paket toplami, yanitta byte 0-1
+        checksum_ok: Yanit checksum'i istekle eslesiyor mu (istekte ve sadece RX
+                     yakalamasinda None)
+        latency_ns: Yanitin istege gore gecikmesi (istekte None)
+        flags: Isaret listesi (checksum, packno, unmatched, outlier, unknown)
+        data: Ham paket (bytes)
+    """
+
+    __slots__ = ("time_ns", "direction", "command", "name", "address", "length", "packno",
+                 "checksum", "checksum_ok", "latency_ns", "flags", "data")
+
+    def __init__(self, time_ns, direction, data, command=None, name="?", address=None,
+                 length=None):
+        self.time_ns = time_ns
+        self.direction = direction
+        self.data = data
+        self.command = command
+        self.name = name
+        self.address = address
+        self.length = length
+        self.packno = struct.unpack_from('<I', data, 4)[0]
+        self.checksum = calculate_checksum(data) if direction == DIR_TX \
+            else response_checksum(data)
+        self.checksum_ok = None
+        self.latency_ns = None
+        self.flags = []
+
+    def describe(self):
+        """Tek satirlik aciklama"""
+        arrow = "->" if self.direction == DIR_TX else "<-"
+        text = f"{self.time_ns / 1e9:12.6f} {arrow} {self.name:<17} no={self.packno:<6}"
+        if self.address is not None:
+            text += f" adr=0x{self.address:08X} len={self.length}"
+        if self.direction == DIR_TX:
+            text += f" sum=0x{self.checksum:04X}"
+        else:
+            status = {True: "OK", False: "HATA", None: "?"}[self.checksum_ok]
+            text += f" ck=0x{self.checksum:04X} {status}"
+            if self.latency_ns is not None:
+                text += f" {self.latency_ns / 1e6:.2f} ms"
+        if self.flags:
+            text += "  [" + ", ".join(self.flags) + "]"
+        return text
+
+
+class _Request:
+    """Yaniti beklenen istek"""
+
+    __slots__ = ("packet", "expected", "latency_class", "units")
+
+    def __init__(self, packet, expected, latency_class, units):
+        self.packet = packet
+        self.expected = expected
+        self.latency_class = latency_class
+        self.units = units
+
+
+class _LatencyStats:
+    """Komut sinifi gecikmesi (isp_deadline ile ayni EWMA, pencere yok)"""
+
+    __slots__ = ("srtt", "rttvar", "count")
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = 0.0
+        self.count = 0
+
+    def observe(self, latency, k):
+        """Olcumu ekler, aykiri ise True dondurur"""
+        outlier = (self.count >= MIN_SAMPLES
+                   and latency > self.srtt + max(k * self.rttvar, MIN_TIMEOUT))
+        if self.srtt is None:
+            self.srtt = latency
+            self.rttvar = latency / 2
+        else:
+            self.rttvar += EWMA_BETA * (abs(self.srtt - latency) - self.rttvar)
+            self.srtt += EWMA_ALPHA * (latency - self.srtt)
+        self.count += 1
+        return outlier
+
+
+class IspDecoder:
+    """Iki yonlu bayt akisini ISP paketlerine cozen akis cozucu
+
+    Ornek:
+        decoder = IspDecoder(baudrate=115200)
+        for record in records:                   # isp_capture.CaptureRecord
+            for item in decoder.feed(record):    # IspPacket / DecoderEvent
+                print(item)
+        for item in decoder.finish():
+            print(item)
+
+    rx_timeout_floor: TX RX timeout'unun alt siniri (saniye). 0: bootloader ile
+                      birebir (0x40 bit); simulator kayitlarinda
+                      isp_simulator.RX_TIMEOUT_FLOOR
+
+    Istatistikler (stats): requests, responses, checksum, packno, unmatched,
+    outlier, unknown, resync, skipped (byte), rx_timeout, rx_split, unanswered
+    """
+
+    def __init__(self, baudrate=115200, outlier_k=OUTLIER_K, max_pending=MAX_PENDING,
+                 rx_timeout_floor=0):
+        baudrate = baudrate or 115200
+        self.byte_ns = int(10e9 / baudrate)
+        self.rx_timeout_ns = int(max(rx_timeout(baudrate), rx_timeout_floor) * 1e9)
+        self.outlier_k = outlier_k
+        self.max_pending = max_pending
+        self.tracker = PacketTracker()
+        self.stats = collections.Counter()
+        self.latency = collections.defaultdict(_LatencyStats)
+
+        self._tx = bytearray()
+        self._tx_line_until = 0
+        self._rx = bytearray()
+        self._rx_last = 0
+        self._pending = collections.deque()
+        self._last_packno = None
+
+        # Bootloader ParseCmd durumunun kopyasi (devam paketi adresleri icin)
+        self._gcmd = 0
+        self._address = None
+        self._remaining = 0
+        self._last_len = 0
+        self._dataflash = None
+
+    # --- giris ---
+
+    def feed(self, record):
+        """Bir kayit (time_ns, direction, data) isler; paket/olay listesi dondurur"""
+        out = []
+        if record.direction == DIR_TX:
+            self._feed_tx(record.time_ns, record.data, out)
+        else:
+            self._feed_rx(record.time_ns, record.data, out)
+        return out
+
+    def finish(self):
+        """Akis sonu: kalan yarim paketleri ve yanitsiz istekleri bildirir"""
+        out = []
+        if self._tx:
+            self.stats[EVENT_RX_TIMEOUT] += 1
+            out.append(DecoderEvent(self._tx_line_until, DIR_TX, EVENT_RX_TIMEOUT,
+                                    f"{len(self._tx)} byte yarim paket"))
+            self._tx.clear()
+        self._flush_rx(self._rx_last, out)
+        if self._pending:
+            self._unanswered(len(self._pending), self._rx_last, out)
+        return out
+
+    # --- TX ---
+
+    def _feed_tx(self, time_ns, data, out):
+        if self._tx and time_ns - self._tx_line_until > self.rx_timeout_ns:
+            # uart_transfer.c RXTOIF: bootloader yarim paketi atar
+            self.stats[EVENT_RX_TIMEOUT] += 1
+            out.append(DecoderEvent(time_ns, DIR_TX, EVENT_RX_TIMEOUT,
+                                    f"{len(self._tx)} byte yarim paket atildi"))
+            self._tx.clear()
+        self._tx_line_until = max(time_ns, self._tx_line_until) + len(data) * self.byte_ns
+        self._tx += data
+        while len(self._tx) >= MAX_PKT_SIZE:
+            frame = bytes(self._tx[:MAX_PKT_SIZE])
+            del self._tx[:MAX_PKT_SIZE]
+            out.append(self._request(time_ns, frame, out))
+
+    def _request(self, time_ns, frame, out):
+        """Istegi etiketler, ParseCmd kopyasini ilerletir, yanit beklenenlere ekler"""
+        command, _, param1, param2 = _WORDS.unpack_from(frame, 0)
+        address = length = None
+        latency_class, units = DEADLINE_CONNECT, 1
+        packet = IspPacket(time_ns, DIR_TX, frame, command, COMMAND_NAMES.get(command))
+
+        if command == CMD_UPDATE_APROM:
+            self._gcmd, self._address, self._remaining = command, param1, param2
+            address = param1
+            length = self._write(FIRST_DATA_LEN)
+            latency_class, units = DEADLINE_FIRST, erase_pages(param1, param2)
+        elif command == CMD_UPDATE_DATAFLASH:
+            self._gcmd, self._address, self._remaining = command, self._dataflash, param2
+            address = self._dataflash
+            length = self._write(FIRST_DATA_LEN)
+            latency_class = DEADLINE_FIRST
+        elif command == 0 and self._gcmd in (CMD_UPDATE_APROM, CMD_UPDATE_DATAFLASH):
+            packet.name = COMMAND_NAMES[self._gcmd] + "+"
+            address = self._address
+            length = self._write(NEXT_DATA_LEN)
+            latency_class = DEADLINE_NEXT
+        elif command == CMD_RESEND_PACKET:
+            if self._address is not None:
+                self._address -= self._last_len
+                self._remaining += self._last_len
+                address, length = self._address, self._last_len
+            latency_class = DEADLINE_RESEND
+        elif command == CMD_ERASE_ALL:
+            latency_class = DEADLINE_ERASE_ALL
+        elif command in COMMAND_NAMES:
+            if command != CMD_SYNC_PACKNO:
+                self._gcmd = command
+        else:
+            packet.name = f"0x{command:08X}"
+            packet.flags.append("unknown")
+            self.stats["unknown"] += 1
+        packet.address, packet.length = address, length
+        if packet.name is None:
+            packet.name = "DATA"
+
+        self.stats["requests"] += 1
+        expected = self.tracker.sent(frame)
+        if command != CMD_RUN_APROM:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self._unanswered(1, time_ns, out)
+            self._pending.append(_Request(packet, expected, latency_class, units))
+        return packet
+
+    def _write(self, size):
+        """ParseCmd: min(size, u32TotalLen) byte yazilir, adres ilerler"""
+        length = min(size, self._remaining)
+        if self._address is not None:
+            self._address += length
+        self._remaining -= length
+        self._last_len = length
+        return length
+
+    # --- RX ---
+
+    def _feed_rx(self, time_ns, data, out):
+        if self._rx and time_ns - self._rx_last > RX_SPLIT_GAP * 1e9:
+            self._flush_rx(self._rx_last, out)
+        self._rx_last = time_ns
+        self._rx += data
+        while len(self._rx) >= MAX_PKT_SIZE:
+            offset, request = self._align()
+            if offset is None:
+                if len(self._rx) < 2 * MAX_PKT_SIZE - 1:
+                    break  # Hizalama icin daha fazla veri gerekli
+                offset = 0
+            if offset >= MAX_PKT_SIZE:
+                # Basta tam bir yanit var ama hicbir istege ait degil (gec/eski yanit)
+                out.append(self._response(time_ns, bytes(self._rx[:MAX_PKT_SIZE]), None, out))
+                del self._rx[:MAX_PKT_SIZE]
+                continue
+            if offset:
+                self.stats[EVENT_RESYNC] += 1
+                self.stats["skipped"] += offset
+                out.append(DecoderEvent(time_ns, DIR_RX, EVENT_RESYNC,
+                                        f"{offset} byte atlandi"))
+            frame = bytes(self._rx[offset:offset + MAX_PKT_SIZE])
+            del self._rx[:offset + MAX_PKT_SIZE]
+            out.append(self._response(time_ns, frame, request, out))
+
+    def _matches(self, offset):
+        """offset'teki 64 byte'in ait oldugu istek: (indeks, checksum eslesti mi)"""
+        checksum = response_checksum(self._rx[offset:offset + 2])
+        for index, request in enumerate(self._pending):
+            if request.packet.checksum == checksum:
+                return index, True
+        packno = response_packno(self._rx[offset:offset + 8])
+        if self._pending:
+            if packno == self._pending[0].expected:
+                return 0, False
+        elif self._last_packno is None or packno == (self._last_packno + 2) & 0xFFFFFFFF:
+            return None, False  # Sadece RX yakalamasi: paket numarasi devam ediyor
+        return -1, False
+
+    def _align(self):
+        """Gecerli yanit hizasini arar: (offset, (istek indeksi, checksum eslesti)) / (None, None)"""
+        for offset in range(len(self._rx) - MAX_PKT_SIZE + 1):
+            index, matched = self._matches(offset)
+            if index != -1:
+                return offset, (index, matched)
+        return None, None
+
+    def _response(self, time_ns, frame, request, out):
+        index, matched = request if request is not None else (-1, False)
+        packet = IspPacket(time_ns, DIR_RX, frame)
+        self.stats["responses"] += 1
+        self._last_packno = packet.packno
+        if index is None or index < 0:
+            packet.name = "?"
+            if index is not None:
+                packet.checksum_ok = False
+                packet.flags.append("unmatched")
+                self.stats["unmatched"] += 1
+            return packet
+
+        if index:
+            self._unanswered(index, time_ns, out)
+            for _ in range(index):
+                self._pending.popleft()
+        pending = self._pending.popleft()
+        sent = pending.packet
+        packet.command, packet.name = sent.command, sent.name
+        packet.address, packet.length = sent.address, sent.length
+        packet.checksum_ok = matched
+        packet.latency_ns = time_ns - sent.time_ns
+        if not matched:
+            packet.flags.append("checksum")
+            self.stats["checksum"] += 1
+
+        result, frames = self.tracker.check(sent.data, frame, pending.expected)
+        if result != PACKNO_OK:
+            packet.flags.append(f"packno {result} {frames}")
+            self.stats["packno"] += 1
+        if sent.command == CMD_CONNECT:
+            self._dataflash = struct.unpack_from('<I', frame, 12)[0]
+
+        latency = packet.latency_ns / 1e9 / pending.units  # saniye / birim (isp_deadline)
+        if self.latency[pending.latency_class].observe(latency, self.outlier_k):
+            packet.flags.append("outlier")
+            self.stats["outlier"] += 1
+        return packet
+
+    def _flush_rx(self, time_ns, out):
+        while len(self._rx) >= MAX_PKT_SIZE:
+            offset, request = self._align()
+            if offset is None or offset >= MAX_PKT_SIZE:
+                offset, request = 0, None
+            frame = bytes(self._rx[offset:offset + MAX_PKT_SIZE])
+            del self._rx[:offset + MAX_PKT_SIZE]
+            out.append(self._response(time_ns, frame, request, out))
+        if self._rx:
+            self.stats[EVENT_RX_SPLIT] += 1
+            out.append(DecoderEvent(time_ns, DIR_RX, EVENT_RX_SPLIT,
+                                    f"{len(self._rx)} byte yarim yanit"))
+            self._rx.clear()
+
+    def _unanswered(self, count, time_ns, out):
+        self.stats[EVENT_UNANSWERED] += count
+        out.append(DecoderEvent(time_ns, DIR_TX, EVENT_UNANSWERED, f"{count} istek yanitsiz"))
+
+
+def decode_capture(path, **kwargs):
+    """Kayit dosyasini tek geciste cozer
+
+    Returns:
+        (CaptureHeader, IspDecoder, IspPacket/DecoderEvent ureteci) - istatistikler
+        uretec tukendikten sonra decoder.stats'tadir
+    """
+    header, records = iter_capture(path)
+    kwargs.setdefault("baudrate", header.baudrate)
+    decoder = IspDecoder(**kwargs)
+
+    def items():
+        for record in records:
+            yield from decoder.feed(record)
+        yield from decoder.finish()
+
+    return header, decoder, items()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Kullanim: python3 isp_decoder.py <kayit.ispcap> [--errors] [--outlier=4] "
+              "[--baud=115200] [--rx-floor=0.002]")
+        sys.exit(1)
+
+    path = None
+    errors_only = False
+    kwargs = {}
+    for arg in sys.argv[1:]:
+        if arg == '--errors':
+            errors_only = True
+        elif arg.startswith('--outlier='):
+            kwargs["outlier_k"] = float(arg.split('=', 1)[1])
+        elif arg.startswith('--baud='):
+            kwargs["baudrate"] = int(arg.split('=', 1)[1])
+        elif arg.startswith('--rx-floor='):
+            kwargs["rx_timeout_floor"] = float(arg.split('=', 1)[1])
+        elif not arg.startswith('--'):
+            path = arg
+
+    header, decoder, items = decode_capture(path, **kwargs)
+    print(f"Kayit: {path} (baud {header.baudrate})")
+    try:
+        for item in items:
+            if isinstance(item, DecoderEvent):
+                arrow = "->" if item.direction == DIR_TX else "<-"
+                print(f"{item.time_ns / 1e9:12.6f} {arrow} ** {item.kind}: {item.detail}")
+            elif item.flags or not errors_only:
+                print(item.describe())
+    except BrokenPipeError:  # | head
+        sys.exit(0)
+
+    stats = decoder.stats
+    print("-" * 60)
+    print(f"Istek: {stats['requests']}, yanit: {stats['responses']}, "
+          f"checksum hatasi: {stats['checksum']}, paket no: {stats['packno']}, "
+          f"eslesmeyen: {stats['unmatched']}, aykiri gecikme: {stats['outlier']}")
+    print(f"Yanitsiz: {stats[EVENT_UNANSWERED]}, RX timeout: {stats[EVENT_RX_TIMEOUT]}, "
+          f"yarim yanit: {stats[EVENT_RX_SPLIT]}, resync: {stats[EVENT_RESYNC]} "
+          f"({stats['skipped']} byte)")
+    for latency_class, latency in sorted(decoder.latency.items()):
+        print(f"  {latency_class:<10} {latency.count:>7} olcum, "
+              f"srtt {latency.srtt * 1000:.3f} ms/birim")
+
+
+if __name__ == "__main__":
+    main()
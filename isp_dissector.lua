@@ -0,0 +1,204 @@
+-- Nuvoton ISP_UART Wireshark dissector (isp_pcap.py pcapng ciktisi icin)
+--
+-- Kullanim:
+--   wireshark -X lua_script:isp_dissector.lua oturum.pcapng
+--   veya ~/.local/lib/wireshark/plugins/ dizinine kopyalayin
+--
+-- Link tipi LINKTYPE_USER0 (147), her paket bir 64 byte ISP frame'i.
+-- Yon pcapng epb_flags'ten okunur: outbound = host -> kart (istek),
+-- inbound = kart -> host (yanit).
+--
+-- Istek yerlesimi (isp_user.c ParseCmd):
+--   0-3   komut (CMD_*, devam paketinde 0)
+--   4-7   paket numarasi (bootloader okumaz, yanit checksum'ina girer)
+--   CMD_UPDATE_APROM       8-11 adres, 12-15 toplam boyut, 16-63 veri (48 byte)
+--   CMD_UPDATE_DATAFLASH   12-15 toplam boyut, 16-63 veri
+--   devam paketi (0)       8-63 veri (56 byte)
+--   CMD_SYNC_PACKNO        8-11 yeni paket numarasi
+--   CMD_UPDATE_CONFIG      8-23 Config0..3
+-- Yanit yerlesimi:
+--   0-1   checksum (alinan paketin 16 bit toplami, yazma sonrasi geri okunan)
+--   2-3   0
+--   4-7   u32PackNo (her pakette +2)
+--   8-63  CMD_CONNECT: 8-11 APROM boyutu, 12-15 data flash adresi
+--         CMD_GET_DEVICEID: 8-11 PDID, CMD_GET_FWVER: 8 surum
+--         digerleri: 8-23 Config0..3
+
+local isp = Proto("isp_uart", "Nuvoton ISP_UART")
+
+local commands = {
+    [0x00] = "DATA",
+    [0xA0] = "CMD_UPDATE_APROM",
+    [0xA1] = "CMD_UPDATE_CONFIG",
+    [0xA2] = "CMD_READ_CONFIG",
+    [0xA3] = "CMD_ERASE_ALL",
+    [0xA4] = "CMD_SYNC_PACKNO",
+    [0xA6] = "CMD_GET_FWVER",
+    [0xAB] = "CMD_RUN_APROM",
+    [0xAC] = "CMD_RUN_LDROM",
+    [0xAD] = "CMD_RESET",
+    [0xAE] = "CMD_CONNECT",
+    [0xAF] = "CMD_DISCONNECT",
+    [0xB1] = "CMD_GET_DEVICEID",
+    [0xC3] = "CMD_UPDATE_DATAFLASH",
+    [0xFF] = "CMD_RESEND_PACKET",
+}
+
+local CMD_UPDATE_APROM = 0xA0
+local CMD_UPDATE_CONFIG = 0xA1
+local CMD_SYNC_PACKNO = 0xA4
+local CMD_GET_FWVER = 0xA6
+local CMD_CONNECT = 0xAE
+local CMD_GET_DEVICEID = 0xB1
+local CMD_UPDATE_DATAFLASH = 0xC3
+
+local f = isp.fields
+f.direction = ProtoField.string("isp_uart.direction", "Yon")
+f.command = ProtoField.uint32("isp_uart.cmd", "Komut", base.HEX, commands)
+f.packno = ProtoField.uint32("isp_uart.packno", "Paket no", base.DEC)
+f.address = ProtoField.uint32("isp_uart.address", "Adres", base.HEX)
+f.size = ProtoField.uint32("isp_uart.size", "Toplam boyut", base.DEC)
+f.data = ProtoField.bytes("isp_uart.data", "Veri")
+f.new_packno = ProtoField.uint32("isp_uart.sync_packno", "Yeni paket no", base.DEC)
+f.config = ProtoField.bytes("isp_uart.config", "Config0..3")
+f.checksum = ProtoField.uint16("isp_uart.checksum", "Checksum", base.HEX)
+f.checksum_ok = ProtoField.bool("isp_uart.checksum_ok", "Checksum istekle eslesiyor")
+f.request = ProtoField.uint32("isp_uart.request", "Istek komutu", base.HEX, commands)
+f.request_frame = ProtoField.framenum("isp_uart.request_frame", "Istek paketi",
+                                      frametype and frametype.REQUEST or nil)
+f.aprom_size = ProtoField.uint32("isp_uart.aprom_size", "APROM boyutu", base.DEC)
+f.dataflash = ProtoField.uint32("isp_uart.dataflash", "Data flash adresi", base.HEX)
+f.device_id = ProtoField.uint32("isp_uart.device_id", "PDID", base.HEX)
+f.fw_version = ProtoField.uint8("isp_uart.fw_version", "FW surumu", base.HEX)
+f.payload = ProtoField.bytes("isp_uart.payload", "Yanit verisi")
+
+local ok, direction_field = pcall(Field.new, "frame.packet_flags_direction")
+if not ok then
+    direction_field = nil
+end
+
+-- Ilk geciste kurulan durum: yanit -> istek eslesmesi, devam paketinin komutu
+local state = {}
+local responses = {}
+local continuations = {}
+
+function isp.init()
+    state = {}
+    responses = {}
+    continuations = {}
+end
+
+local function is_request(pinfo)
+    if direction_field then
+        local value = direction_field()
+        if value then
+            return value.value == 2  -- outbound
+        end
+    end
+    return pinfo.p2p_dir == 0  -- P2P_DIR_SENT
+end
+
+local function frame_sum(buffer)
+    local sum = 0
+    for i = 0, buffer:len() - 1 do
+        sum = sum + buffer(i, 1):uint()
+    end
+    return sum % 0x10000
+end
+
+local function dissect_request(buffer, pinfo, tree)
+    local cmd = buffer(0, 4):le_uint()
+    if not pinfo.visited then
+        if cmd ~= 0 and cmd ~= 0xFF then
+            state.gcmd = cmd
+        end
+        continuations[pinfo.number] = state.gcmd
+        state.request = { cmd = cmd, frame = pinfo.number, sum = frame_sum(buffer) }
+    end
+    local name = commands[cmd] or string.format("0x%08X", cmd)
+    if cmd == 0 then
+        local gcmd = continuations[pinfo.number]
+        name = (gcmd and commands[gcmd] or "DATA") .. "+"
+    end
+    pinfo.cols.info = "-> " .. name
+
+    tree:add(f.direction, "host -> kart")
+    tree:add_le(f.command, buffer(0, 4))
+    tree:add_le(f.packno, buffer(4, 4))
+    if cmd == CMD_UPDATE_APROM then
+        tree:add_le(f.address, buffer(8, 4))
+        tree:add_le(f.size, buffer(12, 4))
+        tree:add(f.data, buffer(16, 48))
+        pinfo.cols.info:append(string.format(" adr=0x%08X boyut=%d", buffer(8, 4):le_uint(),
+                                             buffer(12, 4):le_uint()))
+    elseif cmd == CMD_UPDATE_DATAFLASH then
+        tree:add_le(f.size, buffer(12, 4))
+        tree:add(f.data, buffer(16, 48))
+    elseif cmd == 0 then
+        tree:add(f.data, buffer(8, 56))
+    elseif cmd == CMD_SYNC_PACKNO then
+        tree:add_le(f.new_packno, buffer(8, 4))
+    elseif cmd == CMD_UPDATE_CONFIG then
+        tree:add(f.config, buffer(8, 16))
+    end
+end
+
+local function dissect_response(buffer, pinfo, tree)
+    local checksum = buffer(0, 2):le_uint()
+    if not pinfo.visited then
+        local request = state.request
+        if request then
+            responses[pinfo.number] = { cmd = request.cmd, frame = request.frame,
+                                        ok = request.sum == checksum }
+            state.request = nil
+        end
+    end
+    local match = responses[pinfo.number]
+
+    tree:add(f.direction, "kart -> host")
+    tree:add_le(f.checksum, buffer(0, 2))
+    tree:add_le(f.packno, buffer(4, 4))
+    pinfo.cols.info = string.format("<- no=%d ck=0x%04X", buffer(4, 4):le_uint(), checksum)
+    if not match then
+        tree:add(f.payload, buffer(8, 56))
+        pinfo.cols.info:append(" (istek yok)")
+        return
+    end
+
+    tree:add(f.request, match.cmd)
+    tree:add(f.request_frame, match.frame)
+    local item = tree:add(f.checksum_ok, match.ok)
+    if not match.ok then
+        item:add_expert_info(PI_CHECKSUM, PI_WARN, "Checksum istekle eslesmiyor")
+    end
+    pinfo.cols.info:prepend((commands[match.cmd] or "?") .. " ")
+    pinfo.cols.info:append(match.ok and " OK" or " HATA")
+
+    if match.cmd == CMD_CONNECT then
+        tree:add_le(f.aprom_size, buffer(8, 4))
+        tree:add_le(f.dataflash, buffer(12, 4))
+    elseif match.cmd == CMD_GET_DEVICEID then
+        tree:add_le(f.device_id, buffer(8, 4))
+    elseif match.cmd == CMD_GET_FWVER then
+        tree:add(f.fw_version, buffer(8, 1))
+    else
+        tree:add(f.config, buffer(8, 16))
+    end
+end
+
+function isp.dissector(buffer, pinfo, tree)
+    if buffer:len() < 64 then
+        return 0
+    end
+    pinfo.cols.protocol = "ISP_UART"
+    local subtree = tree:add(isp, buffer(0, 64))
+    if is_request(pinfo) then
+        dissect_request(buffer, pinfo, subtree)
+    else
+        dissect_response(buffer, pinfo, subtree)
+    end
+    return 64
+end
+
+local encap = wtap_encaps and wtap_encaps.USER0 or wtap.USER0
+DissectorTable.get("wtap_encap"):add(encap, isp)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Silme planlayici
+Imaj ve cihaz icin en az silme yapan stratejiyi secer. Her ilk
+CMD_UPDATE_APROM paketi bootloader'da EraseAP(adres, boyut) calistirir; bu
+silme zaten yapildigi icin CMD_ERASE_ALL (tum g_u32ApromSize) gereksizdir.
+
+Stratejiler:
+    range    Tek segment: ilk paketin EraseAP'i imajin sayfalarini siler
+    segment  Sparse: her segmentin ilk paketi kendi sayfalarini ve ardindaki
+             bos (atlanan) sayfalari siler; bos sayfalar gonderilmez ama
+             silinir
+    full     CMD_ERASE_ALL - sadece acikca istenirse
+
+EraseAP tasmasi: fmc_user.c EraseAP() 'size -= u32Size' ile unsigned
+ilerler; boyut sayfa kati degilse size tasar ve silme APROM sonuna kadar
+(ISPFF hatasi) devam eder. Bugune kadar sayfa kati olmayan her imaj ilk
+paketinde imajdan sonraki tum APROM'u da siliyordu (CMD_ERASE_ALL'dan
+sonra ikinci kez). Planlayici ilk pakette boyutu sayfa katina yuvarlar
+(erase_size). Bootloader bu boyutu yazma uzunlugu olarak da kullanir: son
+paketin 56 byte'i tamamen yazilir; paket dolgusu 0xFF oldugu icin silinmis
+flash'a 0xFF yazilir (degisiklik yok). Segment bitince bootloader'da kalan
+u32TotalLen bir sonraki ilk paket veya CMD_RUN_APROM ile onemsizdir.
+
+NOT: range/segment stratejisinde imajin son sayfasindan sonraki APROM
+(eski firmware'in kalan kismi) silinmez; gerekiyorsa full kullanin.
+"""
+
+from isp_image import FLASH_PAGE_SIZE
+
+# fmc_user.h (M261/M263)
+FMC_BLOCK_SIZE = FLASH_PAGE_SIZE * 4
+FMC_BANK_SIZE = 0x40000
+
+# Silme komutu (sayfa/blok/bank) basina tipik sure; olculen deger yoksa
+ERASE_OP_TIME = 0.02
+
+ERASE_RANGE = "range"
+ERASE_SEGMENT = "segment"
+ERASE_FULL = "full"
+
+
+def page_ceil(value, page_size=FLASH_PAGE_SIZE):
+    """Degeri sayfa katina yukari yuvarlar"""
+    return value + (-value) % page_size
+
+
+def erase_ops(address, size, aprom_size=None, page_size=FLASH_PAGE_SIZE):
+    """EraseAP(address, size) cagrisinin FMC silme komutu sayisi
+
+    fmc_user.c ile birebir: hizali ve yeterli boyutta bank, sonra blok,
+    yoksa sayfa silme. Boyut tasarsa silme APROM sonuna kadar surer
+    (aprom_size bilinmiyorsa tasma sayilmaz).
+
+    Returns:
+        (komut sayisi, silinen byte)
+    """
+    size &= 0xFFFFFFFF
+    if aprom_size is None:
+        size = page_ceil(size, page_size)
+        aprom_size = address + size
+    ops = 0
+    erased = 0
+    while size > 0:
+        if size >= FMC_BANK_SIZE and not address & (FMC_BANK_SIZE - 1):
+            op_size = FMC_BANK_SIZE
+        elif size >= FMC_BLOCK_SIZE and not address & (FMC_BLOCK_SIZE - 1):
+            op_size = FMC_BLOCK_SIZE
+        else:
+            op_size = page_size
+        if address >= aprom_size:
+            break  # ISPFF: APROM disi
+        ops += 1
+        erased += min(op_size, aprom_size - address)
+        address += op_size
+        size = (size - op_size) & 0xFFFFFFFF
+    return ops, erased
+
+
+class ErasePlan:
+    """Silme plani
+
+    Attributes:
+        strategy: ERASE_RANGE / ERASE_SEGMENT / ERASE_FULL
+        erase_all: CMD_ERASE_ALL gonderilsin mi
+        segments: [(adres, veri, erase_size), ...] - erase_size ilk paketteki
+                  boyut (sayfa kati, EraseAP'in silecegi alan)
+        ops, erased: Planin silme komutu sayisi ve silinen byte
+        baseline_ops, baseline_erased: Eski davranis (CMD_ERASE_ALL + ilk
+                  pakette veri uzunlugu, tasma dahil)
+    """
+
+    def __init__(self, strategy, erase_all, segments, ops, erased, baseline_ops,
+                 baseline_erased):
+        self.strategy = strategy
+        self.erase_all = erase_all
+        self.segments = segments
+        self.ops = ops
+        self.erased = erased
+        self.baseline_ops = baseline_ops
+        self.baseline_erased = baseline_erased
+
+    @property
+    def saved_ops(self):
+        return max(0, self.baseline_ops - self.ops)
+
+    def saved_time(self, op_time=ERASE_OP_TIME):
+        """Eski davranisa gore kazanilan tahmini silme suresi (saniye)"""
+        return self.saved_ops * op_time
+
+    def summary(self, op_time=ERASE_OP_TIME):
+        return (f"{self.strategy}: {self.ops} silme komutu ({self.erased // 1024} KB), "
+                f"onceki {self.baseline_ops} ({self.baseline_erased // 1024} KB), "
+                f"~{self.saved_time(op_time) * 1000:.0f} ms kazanc")
+
+
+def plan_erase(segments, aprom_size=None, full=False, fill_gaps=False, baseline_full=True,
+               page_size=FLASH_PAGE_SIZE):
+    """Segmentler icin silme plani olusturur
+
+    Args:
+        segments: [(adres, veri), ...] - adrese gore sirali, sayfa sinirinda baslar
+        aprom_size: CMD_CONNECT yanitindaki APROM boyutu (None: bilinmiyor)
+        full: CMD_ERASE_ALL kullan
+        fill_gaps: Segmentler arasi atlanan sayfalar bos (sparse): bir onceki
+                   segmentin ilk paketi bunlari da siler. Delta modda False
+                   (aradaki sayfalar degismemis, silinmemeli)
+        baseline_full: Karsilastirilan eski davranista CMD_ERASE_ALL var miydi
+
+    Returns:
+        ErasePlan
+    """
+    planned = []
+    ops = erased = 0
+    full_ops, full_erased = erase_ops(0, aprom_size, aprom_size, page_size) \
+        if aprom_size else (0, 0)
+    baseline_ops, baseline_erased = (full_ops, full_erased) if baseline_full else (0, 0)
+    if full:
+        ops, erased = full_ops, full_erased
+
+    for index, (address, data) in enumerate(segments):
+        end = page_ceil(address + len(data), page_size)
+        if fill_gaps and not full and index + 1 < len(segments):
+            end = max(end, segments[index + 1][0])
+        if aprom_size:
+            end = min(end, max(aprom_size, address + len(data)))
+        erase_size = end - address
+        planned.append((address, data, erase_size))
+        seg_ops, seg_erased = erase_ops(address, erase_size, aprom_size, page_size)
+        ops += seg_ops
+        erased += seg_erased
+        seg_ops, seg_erased = erase_ops(address, len(data), aprom_size, page_size)
+        baseline_ops += seg_ops
+        baseline_erased += seg_erased
+
+    if full:
+        strategy = ERASE_FULL
+    elif len(segments) > 1:
+        strategy = ERASE_SEGMENT
+    else:
+        strategy = ERASE_RANGE
+    return ErasePlan(strategy, full, planned, ops, erased, baseline_ops, baseline_erased)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Onceden derlenmis paket akisi
+Bir segmentin tum CMD_UPDATE_APROM paketlerini (ilk paket + devam paketleri)
+bir kez, tek bir bitisik buffer'a 64 byte'lik frame'ler olarak yerlestirir
+ve her frame'in beklenen yanit checksum'ini hesaplar. Gonderim dongusu
+sadece memoryview dilimleri verir: frame basina bytearray ayirma, veri
+dilimi kopyalama, baslik olusturma ve checksum toplama yoktur.
+
+Yerlesim (pkt_update_first / pkt_update_next ile ayni):
+    frame 0   byte 0-3 komut, 4-7 sira no, 8-11 adres, 12-15 boyut,
+              16-63 veri (48 byte)
+    frame k   byte 0-3 0, 4-7 sira no, 8-63 veri (56 byte)
+    dolgu     0xFF (isp_erase: son paket tamamen yazilabilir)
+
+Sira numarasi (byte 4-7) bootloader'ca okunmaz ama yanit checksum'ina
+girer. Ayni frame tekrar gonderilecekse restamp() yeni numara yazar ve
+sadece o frame'in checksum'ini yeniden hesaplar (kurtarma yolu).
+
+NumPy varsa (opsiyonel) devam paketleri tek adimda derlenir: 0xFF ile
+doldurulmus veri (N, 56) diziye cevrilir, basliklar sutun olarak yazilir ve
+tum checksum'lar (isp_user.c Checksum: 16 bit toplam) tek vektorel toplamla
+hesaplanir. NumPy yoksa ayni sonucu veren saf Python yolu kullanilir.
+"""
+
+import struct
+
+try:
+    import numpy
+except ImportError:  # numpy yoksa saf Python derleyici kullanilir
+    numpy = None
+
+from isp_protocol import CMD_UPDATE_APROM, MAX_PKT_SIZE
+
+FIRST_DATA_LEN = 48  # Ilk paket: byte 16-63
+NEXT_DATA_LEN = 56  # Devam paketi: byte 8-63
+
+_FIRST_HEADER = struct.Struct('<IIII')  # komut, sira no, adres, boyut
+_NEXT_HEADER = struct.Struct('<II')  # 0, sira no
+_SEQUENCE = struct.Struct('<I')
+
+
+def frame_count(size, start=0):
+    """start ofsetinden itibaren segmentin frame sayisi (ilk paket dahil)"""
+    remaining = max(0, size - start - FIRST_DATA_LEN)
+    return 1 + (remaining + NEXT_DATA_LEN - 1) // NEXT_DATA_LEN
+
+
+def _compile_python(buffer, rest, sequence):
+    """Devam paketlerini frame frame yazar, checksum listesini dondurur"""
+    position = MAX_PKT_SIZE
+    for offset in range(0, len(rest), NEXT_DATA_LEN):
+        chunk = rest[offset:offset + NEXT_DATA_LEN]
+        _NEXT_HEADER.pack_into(buffer, position, 0, sequence + 1 + position // MAX_PKT_SIZE)
+        buffer[position + 8:position + 8 + len(chunk)] = chunk
+        position += MAX_PKT_SIZE
+    view = memoryview(buffer)
+    return [sum(view[i:i + MAX_PKT_SIZE]) & 0xFFFF for i in range(0, len(buffer), MAX_PKT_SIZE)]
+
+
+def _compile_numpy(buffer, rest, count, sequence):
+    """Devam paketlerini (N, 64) dizi olarak tek adimda yazar (buffer yerinde)"""
+    frames = numpy.frombuffer(buffer, dtype=numpy.uint8).reshape(count, MAX_PKT_SIZE)
+    if count > 1:
+        padded = numpy.full((count - 1) * NEXT_DATA_LEN, 0xFF, dtype=numpy.uint8)
+        padded[:len(rest)] = numpy.frombuffer(rest, dtype=numpy.uint8)
+        frames[1:, 8:] = padded.reshape(count - 1, NEXT_DATA_LEN)
+        frames[1:, 0:4] = 0
+        numbers = numpy.arange(sequence + 2, sequence + 1 + count, dtype='<u4')
+        frames[1:, 4:8] = numbers.view(numpy.uint8).reshape(count - 1, 4)
+    return (frames.sum(axis=1, dtype=numpy.uint32) & 0xFFFF).tolist()
+
+
+class FrameStream:
+    """Bir segmentin derlenmis frame akisi
+
+    Ornek:
+        stream = FrameStream(address, data, erase_size)
+        for index in range(len(stream)):
+            ser.write(stream.frame(index))     # memoryview, kopya yok
+            ... yanit checksum'i == stream.checksums[index]
+
+    Args:
+        address: Segment baslangic adresi
+        data: Segment verisi (bytes / bytearray / memoryview)
+        erase_size: Ilk paketteki boyut (isp_erase), None ise veri uzunlugu
+        start: Ilk paketin segment icindeki ofseti (yeniden baslatma)
+        sequence: Son kullanilan sira numarasi; frame'ler sequence + 1'den
+                  itibaren numaralanir
+        command: Ilk paketin komutu (CMD_UPDATE_APROM / CMD_UPDATE_DATAFLASH)
+        vectorized: NumPy ile derle (None: NumPy kuruluysa)
+
+    Attributes:
+        buffer: Tum frame'ler (bytearray, len(stream) * 64 byte)
+        checksums: Frame basina beklenen yanit checksum'i
+        sent: Frame basina gonderildi bayragi (program dongusu isaretler)
+        sequence: Kullanilan son sira numarasi
+    """
+
+    def __init__(self, address, data, erase_size=None, start=0, sequence=0,
+                 command=CMD_UPDATE_APROM, vectorized=None):
+        size = len(data)
+        erase_size = size if erase_size is None else erase_size
+        data = memoryview(data).cast("B")
+        count = frame_count(size, start)
+        if vectorized is None:
+            vectorized = numpy is not None
+
+        buffer = bytearray(b'\xff') * (count * MAX_PKT_SIZE)
+        end = min(size, start + FIRST_DATA_LEN)
+        _FIRST_HEADER.pack_into(buffer, 0, command, sequence + 1, address + start,
+                                erase_size - start)
+        buffer[16:16 + end - start] = data[start:end]
+        if vectorized:
+            checksums = _compile_numpy(buffer, data[end:], count, sequence)
+        else:
+            checksums = _compile_python(buffer, data[end:], sequence)
+
+        self.address = address
+        self.start = start
+        self.size = size
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.checksums = checksums
+        self.sent = bytearray(count)
+        self.sequence = sequence + count
+
+    def __len__(self):
+        return len(self.checksums)
+
+    def copy(self):
+        """Bagimsiz kopya (buffer ve checksum'lar kopyalanir, gonderim bayraklari sifir)"""
+        clone = FrameStream.__new__(FrameStream)
+        clone.__dict__.update(self.__dict__)
+        clone.buffer = bytearray(self.buffer)
+        clone.view = memoryview(clone.buffer)
+        clone.checksums = list(self.checksums)
+        clone.sent = bytearray(len(self.sent))
+        return clone
+
+    def index(self, offset):
+        """Veri ofsetinden (start'tan sonraki devam paketi) frame indeksi"""
+        if offset <= self.start:
+            return 0
+        return 1 + (offset - self.start - FIRST_DATA_LEN) // NEXT_DATA_LEN
+
+    def frame(self, index):
+        """64 byte frame (memoryview, kopya yok)"""
+        position = index * MAX_PKT_SIZE
+        return self.view[position:position + MAX_PKT_SIZE]
+
+    def restamp(self, index, sequence):
+        """Frame'in sira numarasini degistirir, checksum'ini gunceller"""
+        position = index * MAX_PKT_SIZE
+        _SEQUENCE.pack_into(self.buffer, position + 4, sequence)
+        self.checksums[index] = sum(self.view[position:position + MAX_PKT_SIZE]) & 0xFFFF
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Firmware imaji yardimcilari
+APROM imajini flash sayfalarina gore parcalara (segment) ayirir
+"""
+
+# M261/M263 flash sayfa boyutu (FMC_FLASH_PAGE_SIZE = 0x800)
+FLASH_PAGE_SIZE = 2048
+
+# Silinmis flash degeri
+BLANK_BYTE = 0xFF
+
+
+def is_blank(data):
+    """Verinin tamamen bos (0xFF) olup olmadigini kontrol eder"""
+    return data.count(BLANK_BYTE) == len(data)
+
+
+def split_segments(bin_data, base_address=0x00000000, page_size=FLASH_PAGE_SIZE):
+    """Imaji bos olmayan segmentlere ayirir (sparse programlama icin)
+
+    Imaj sayfa sayfa taranir, tamamen 0xFF olan sayfalar atlanir ve
+    ardisik dolu sayfalar tek segmentte birlestirilir.
+
+    NOT: Bootloader her ilk pakette EraseAP(address, size) cagiriyor.
+    Segmentler sayfa sinirinda basladigi ve (son segment haric) sayfa
+    katlarinda bittigi icin bir segmentin silmesi komsu segmenti bozmaz.
+    Atlanan bos sayfalar segmentin kendi boyutuyla SILINMEZ;
+    isp_erase.plan_erase(fill_gaps=True) bunlari onceki segmentin ilk
+    paketindeki boyuta ekler.
+
+    Args:
+        bin_data: Firmware imaji (bytes)
+        base_address: Imajin flash'taki baslangic adresi
+        page_size: Flash sayfa boyutu
+
+    Returns:
+        list: [(address, data), ...] - her segment icin adres ve veri
+    """
+    segments = []
+    seg_start = None
+    total_size = len(bin_data)
+
+    for offset in range(0, total_size, page_size):
+        page = bin_data[offset:offset+page_size]
+        if is_blank(page):
+            if seg_start is not None:
+                segments.append((base_address + seg_start, bin_data[seg_start:offset]))
+                seg_start = None
+        elif seg_start is None:
+            seg_start = offset
+
+    if seg_start is not None:
+        segments.append((base_address + seg_start, bin_data[seg_start:total_size]))
+
+    return segments
+
+
+def changed_segments(old_data, new_data, base_address=0x00000000, page_size=FLASH_PAGE_SIZE):
+    """Iki imaj arasinda degisen sayfalari segment olarak dondurur (delta programlama)
+
+    Her iki imaj da sayfa katina 0xFF ile tamamlanir; eski imajin
+    sonrasindaki alanin bos (silinmis) oldugu varsayilir. Yeni imaj
+    kisalmissa eski icerigin kalan sayfalari 0xFF ile yeniden yazilir.
+
+    Segment verileri sayfa katidir, boylece ilk paketteki
+    EraseAP(address, size) tam olarak degisen sayfalari siler.
+
+    Returns:
+        list: [(address, data), ...]
+    """
+    length = max(len(old_data), len(new_data))
+    length += (-length) % page_size
+    old_data = bytes(old_data) + bytes([BLANK_BYTE]) * (length - len(old_data))
+    new_data = bytes(new_data) + bytes([BLANK_BYTE]) * (length - len(new_data))
+
+    segments = []
+    seg_start = None
+
+    for offset in range(0, length, page_size):
+        if old_data[offset:offset+page_size] == new_data[offset:offset+page_size]:
+            if seg_start is not None:
+                segments.append((base_address + seg_start, new_data[seg_start:offset]))
+                seg_start = None
+        elif seg_start is None:
+            seg_start = offset
+
+    if seg_start is not None:
+        segments.append((base_address + seg_start, new_data[seg_start:length]))
+
+    return segments
+
+
+def clip_segments(segments, address):
+    """Segment listesinin `address` ve sonrasini dondurur (kaldigi yerden devam)
+
+    `address` bir segmentin ortasina denk gelirse o segment bu adresten
+    baslatilir. Adres sayfa sinirinda olmalidir: ilk paketteki
+    EraseAP(address, size) adresin bulundugu sayfanin tamamini siler.
+
+    Returns:
+        list: [(address, data), ...]
+    """
+    clipped = []
+    for seg_address, seg_data in segments:
+        seg_end = seg_address + len(seg_data)
+        if seg_end <= address:
+            continue
+        if seg_address < address:
+            seg_data = seg_data[address - seg_address:]
+            seg_address = address
+        clipped.append((seg_address, seg_data))
+    return clipped
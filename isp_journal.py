@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Kaldigi yerden devam icin yazma gunlugu (journal)
+Yazma sirasinda imaj ozeti (SHA-256), cihaz PDID'si ve checksum'i dogrulanmis
+son adres diske kaydedilir. Yazma yarida kalirsa (USB kopmasi,
+SerialException, Ctrl+C) sonraki calistirmada istenirse (--resume)
+CMD_ERASE_ALL atlanir ve kalan kisim icin yeni bir ilk paket gonderilir;
+bootloader EraseAP(adres, boyut) ile sadece kalan kismi siler.
+
+Devam istege baglidir: arada kart baska bir aracla yazildiysa gunluk bunu
+bilemez ve atlanan sayfalar eski icerikle kalir. Kayit imaj ozeti, boyutu
+veya PDID tutmuyorsa --resume verilse de devam edilmez (bastan yazilir).
+
+Devam adresi sayfa sinirina yuvarlanir: ilk paketteki EraseAP() adresin
+bulundugu sayfanin tamamini siler, o sayfa bastan yazilmalidir. Bu yuzden
+kayit her pakette degil, dogrulanan adres yeni bir sayfa sinirini gectiginde
+guncellenir.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from isp_cache import CACHE_DIR
+from isp_image import FLASH_PAGE_SIZE
+
+# Varsayilan gunluk dizini (anahtar: isp_cache.device_cache_key)
+JOURNAL_DIR = os.path.join(CACHE_DIR, "journal")
+
+
+def image_digest(data):
+    """Imajin SHA-256 ozeti (hex)"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class FlashJournal:
+    """Tek cihazin yazma gunlugu
+
+    Ornek:
+        journal = FlashJournal(device_cache_key(pdid, port))
+        start = journal.resume_address(bin_data, pdid)   # 0: bastan
+        journal.begin(bin_data, pdid, start)
+        ... her yanittan sonra journal.acknowledge(adres, checksum_tuttu) ...
+        journal.clear()                                  # basarili bitis
+    """
+
+    def __init__(self, key, journal_dir=JOURNAL_DIR, page_size=FLASH_PAGE_SIZE):
+        self.key = key
+        self.journal_dir = journal_dir
+        self.page_size = page_size
+        self.path = os.path.join(journal_dir, f"{key}.json")
+        self._record = None
+        self._held = False
+
+    def load(self):
+        """Diskteki kaydi dondurur (yoksa veya okunamazsa None)"""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def resume_address(self, bin_data, pdid, digest=None):
+        """Kayit bu imaj ve cihaza aitse devam adresini (sayfa siniri), degilse 0 dondurur
+
+        digest: Onceden hesaplanmis image_digest(bin_data) (isp_pipeline)
+        """
+        record = self.load()
+        if (record is None
+                or record.get("image_sha256") != (digest or image_digest(bin_data))
+                or record.get("image_size") != len(bin_data) or record.get("pdid") != pdid):
+            return 0
+        acked = min(int(record.get("acked", 0)), len(bin_data))
+        return acked - acked % self.page_size
+
+    def begin(self, bin_data, pdid, address=0, digest=None):
+        """Yeni yazmayi (veya devam eden yazmayi) kaydeder"""
+        self._record = {
+            "image_sha256": digest or image_digest(bin_data),
+            "image_size": len(bin_data),
+            "pdid": pdid,
+            "acked": address,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self._held = False
+        self._write()
+
+    def acknowledge(self, address, ok=True):
+        """`address`e kadar yazilan paketin yaniti geldi
+
+        ok=False ise (checksum uyusmadi, dogrulamasiz modda yazma devam etti)
+        kayit bu yazma boyunca ilerletilmez; dogrulanan adres kesintisiz kalir.
+        Adres kayittakinden geriye giderse (CMD_RESEND_PACKET sayfayi sildi,
+        yeni ilk paket) kayit geri cekilir. Kayit sadece sayfa siniri
+        degistiginde diske yazilir.
+        """
+        if self._record is None:
+            return
+        page = address - address % self.page_size
+        if page < self._record["acked"]:
+            self._record["acked"] = page
+            self._write()
+        if not ok:
+            self._held = True
+        if self._held:
+            return
+        if page > self._record["acked"]:
+            self._record["acked"] = page
+            self._write()
+
+    def clear(self):
+        """Kaydi siler (yazma basariyla tamamlandi)"""
+        self._record = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _write(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._record, f)
+        os.replace(tmp_path, self.path)
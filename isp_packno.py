@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Paket numarasi takibi
+Bootloader'in u32PackNo sayacinin (isp_user.c ParseCmd) birebir modeli.
+Tum araclar yanit paket numarasini ayni sekilde bekler ve kontrol eder.
+
+ParseCmd:
+    CMD_CONNECT      u32PackNo = 1
+    CMD_SYNC_PACKNO  u32PackNo = inpw(paket + 8)
+    her paket (out:) ++u32PackNo; yanit byte 4-7 = u32PackNo; u32PackNo++
+    CMD_RUN_APROM    yanit yok (NVIC_SystemReset)
+
+Yani yanitlar 2'ser artar (CMD_CONNECT yaniti 2, sonraki 4, ...); bootloader
+hostun paket icine yazdigi numaraya bakmaz. Paket numarasi 32 bit okunur
+(16 bit "normalize" etmek 65536 paket sonrasi yanlis sonuc verir).
+
+Kontrol sonucu (check):
+    PACKNO_OK      yanit beklenen numarada
+    PACKNO_STALE   daha kucuk numara, checksum bu paketin degil: onceki bir
+                   komutun gec gelen yaniti (atlanmali)
+    PACKNO_LOST    daha kucuk numara ama checksum bu paketin: aradaki
+                   paket(ler) bootloader'a hic ulasmadi
+    PACKNO_AHEAD   daha buyuk numara: bootloader hostun bilmedigi paket(ler)
+                   isledi (tekrar/bozuk paket)
+"""
+
+import struct
+
+from isp_protocol import CMD_CONNECT, CMD_RUN_APROM, CMD_SYNC_PACKNO
+
+PACKNO_OK = "ok"
+PACKNO_STALE = "stale"
+PACKNO_LOST = "lost"
+PACKNO_AHEAD = "ahead"
+
+PACKNO_MASK = 0xFFFFFFFF
+
+
+def response_packno(response):
+    """Yanit byte 4-7: paket numarasi (32 bit)"""
+    return struct.unpack_from('<I', response, 4)[0]
+
+
+def _checksum(data):
+    return sum(data) & 0xFFFF
+
+
+class PacketTracker:
+    """Bootloader u32PackNo sayacinin host tarafi kopyasi
+
+    Her gonderilen paket icin sent() beklenen yanit numarasini dondurur ve
+    sayaci paket islenmis gibi ilerletir; check() gelen yaniti siniflandirir
+    ve kayip/fazla paket durumunda sayaci yanita gore duzeltir.
+
+    Istatistikler: lost (ulasmayan paket), extra (hostun bilmedigi islenen
+    paket), stale (atlanan gec yanit)
+    """
+
+    def __init__(self):
+        self.counter = None  # u32PackNo (bir sonraki paket islenmeden once), None: bilinmiyor
+        self.lost = 0
+        self.extra = 0
+        self.stale = 0
+
+    def connected(self):
+        """CMD_CONNECT yaniti alindi (yanit no 2)"""
+        self.counter = 3
+
+    def reset(self):
+        """Sayac bilinmiyor (bootloader resetlendi / yeniden baglanilacak)"""
+        self.counter = None
+
+    def sent(self, packet):
+        """Paket gonderildi: beklenen yanit numarasini dondurur (bilinmiyorsa None)"""
+        cmd = struct.unpack_from('<I', packet, 0)[0]
+        if cmd == CMD_CONNECT:
+            self.counter = 1
+        elif cmd == CMD_SYNC_PACKNO:
+            self.counter = struct.unpack_from('<I', packet, 8)[0]
+        elif cmd == CMD_RUN_APROM:
+            self.counter = None
+            return None
+        if self.counter is None:
+            return None
+        expected = (self.counter + 1) & PACKNO_MASK
+        self.counter = (self.counter + 2) & PACKNO_MASK
+        return expected
+
+    def unsent(self):
+        """Son sent() paketinin bootloader'a ulasmadigi kesinlesti"""
+        if self.counter is not None:
+            self.counter = (self.counter - 2) & PACKNO_MASK
+
+    def check(self, packet, response, expected):
+        """Yaniti siniflandirir
+
+        Returns:
+            (sonuc, paket_sayisi): PACKNO_* ve fark (kac paket kayip/fazla)
+        """
+        packno = response_packno(response)
+        if expected is None:
+            # Ilk yanittan ogren
+            self.counter = (packno + 1) & PACKNO_MASK
+            return PACKNO_OK, 0
+        diff = (packno - expected) & PACKNO_MASK
+        if diff & 0x80000000:
+            diff -= PACKNO_MASK + 1
+        if diff == 0:
+            return PACKNO_OK, 0
+        frames = abs(diff) // 2
+        if diff < 0 and struct.unpack_from('<H', response, 0)[0] != _checksum(packet):
+            self.stale += 1
+            return PACKNO_STALE, frames
+        # Sayac yanita gore duzeltilir
+        self.counter = (packno + 1) & PACKNO_MASK
+        if diff < 0:
+            self.lost += frames
+            return PACKNO_LOST, frames
+        self.extra += frames
+        return PACKNO_AHEAD, frames
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Seri oturumlarin pcapng ciktisi
+Host -> kart ve kart -> host trafigini pcapng dosyasina yazar: her 64 byte
+ISP paketi bir Enhanced Packet Block, zaman damgasi nanosaniye
+(if_tsresol = 9), yon epb_flags ile (inbound: kart -> host, outbound:
+host -> kart). Paketler isp_decoder ile cerceveler; her paketin yorumunda
+(opt_comment) cozucunun aciklamasi ve isaretleri bulunur, Wireshark'ta
+`frame.comment contains "checksum"` ile filtrelenebilir.
+
+Link tipi LINKTYPE_USER0 (147). Paket yerlesimi (isp_user.c) icin Lua
+dissector: isp_dissector.lua
+    Wireshark: Analyze > Enabled Protocols'ta ISP_UART; eklenti dizinine
+    (~/.local/lib/wireshark/plugins/) kopyalanir veya
+    wireshark -X lua_script:isp_dissector.lua oturum.pcapng
+
+Iki kullanim:
+    Canli   PcapngSink, isp_capture.CaptureWriter ile ayni record() arayuzune
+            sahiptir; flash_port(capture=...) veya AsyncIspClient(capture=...)
+            ile oturuma baglanir
+    Donusum python3 isp_pcap.py <kayit.ispcap> <cikti.pcapng>
+"""
+
+import struct
+import sys
+import threading
+import time
+
+from isp_capture import DIR_RX, DIR_TX, CaptureRecord, iter_capture
+from isp_decoder import DecoderEvent, IspDecoder
+
+LINKTYPE_USER0 = 147
+SNAPLEN = 0xFFFF
+
+_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+_BLOCK_SHB = 0x0A0D0D0A
+_BLOCK_IDB = 0x00000001
+_BLOCK_EPB = 0x00000006
+
+_OPT_END = 0
+_OPT_COMMENT = 1
+_OPT_SHB_USERAPPL = 4
+_OPT_IF_NAME = 2
+_OPT_IF_DESCRIPTION = 3
+_OPT_IF_TSRESOL = 9
+_OPT_EPB_FLAGS = 2
+
+# epb_flags bit 0-1: yon
+_EPB_INBOUND = 0x1
+_EPB_OUTBOUND = 0x2
+_DIRECTION_FLAGS = {DIR_RX: _EPB_INBOUND, DIR_TX: _EPB_OUTBOUND}
+
+
+def _pad(data):
+    return data + bytes(-len(data) % 4)
+
+
+def _option(code, value):
+    return struct.pack('<HH', code, len(value)) + _pad(value)
+
+
+def _block(block_type, body):
+    length = 12 + len(body)
+    return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+
+class PcapngWriter:
+    """Tek arayuzlu (LINKTYPE_USER0, ns cozunurluk) pcapng yazici
+
+    Args:
+        path: Cikti dosyasi
+        interface: Arayuz adi (orn. port adi)
+    """
+
+    def __init__(self, path, interface="isp-uart"):
+        self.path = path
+        self.packets = 0
+        self._file = open(path, "wb")
+        shb = struct.pack('<IHHq', _BYTE_ORDER_MAGIC, 1, 0, -1)
+        shb += _option(_OPT_SHB_USERAPPL, b"isp_pcap") + _option(_OPT_END, b"")
+        idb = struct.pack('<HHI', LINKTYPE_USER0, 0, SNAPLEN)
+        idb += _option(_OPT_IF_NAME, interface.encode())
+        idb += _option(_OPT_IF_DESCRIPTION, b"Nuvoton ISP_UART 64 byte paket")
+        idb += _option(_OPT_IF_TSRESOL, b"\x09") + _option(_OPT_END, b"")
+        self._file.write(_block(_BLOCK_SHB, shb) + _block(_BLOCK_IDB, idb))
+
+    def write_packet(self, timestamp_ns, direction, data, comment=None):
+        """Paketi yazar (timestamp_ns: Unix epoch nanosaniye)"""
+        body = struct.pack('<IIIII', 0, timestamp_ns >> 32, timestamp_ns & 0xFFFFFFFF,
+                           len(data), len(data)) + _pad(bytes(data))
+        if comment:
+            body += _option(_OPT_COMMENT, comment.encode())
+        body += _option(_OPT_EPB_FLAGS, struct.pack('<I', _DIRECTION_FLAGS[direction]))
+        body += _option(_OPT_END, b"")
+        self._file.write(_block(_BLOCK_EPB, body))
+        self.packets += 1
+
+    def close(self):
+        self._file.close()
+
+
+class PcapngSink:
+    """Ham byte akisini ISP paketlerine cerceveleyip pcapng'ye yazan kayitci
+
+    record() arayuzu isp_capture.CaptureWriter ile aynidir. Cozucu olaylari
+    (resync, rx_timeout, yanitsiz istek) bir sonraki paketin yorumuna eklenir.
+
+    Ornek:
+        with PcapngSink("oturum.pcapng", port) as sink:
+            flash_port(port, fw, capture=sink)
+
+    Args:
+        path: Cikti dosyasi
+        interface: Arayuz adi
+        baudrate: Hat hizi (cozucunun RX timeout hesabi)
+        start_ns: Kayit basinin Unix zamani (ns, None: simdi)
+    """
+
+    def __init__(self, path, interface="isp-uart", baudrate=115200, start_ns=None):
+        self.writer = PcapngWriter(path, interface)
+        self.decoder = IspDecoder(baudrate)
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.start_monotonic_ns = time.monotonic_ns()
+        self._notes = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return self.decoder.stats
+
+    def record(self, data, direction=DIR_RX, time_ns=None):
+        """Okunan/yazilan byte'lari isler (time_ns: time.monotonic_ns() degeri)"""
+        if not data:
+            return
+        if time_ns is None:
+            time_ns = time.monotonic_ns()
+        self.feed(CaptureRecord(time_ns - self.start_monotonic_ns, direction, bytes(data)))
+
+    def feed(self, record):
+        """Kayit basina gore zamanlanmis bir isp_capture.CaptureRecord isler"""
+        with self._lock:
+            self._write(self.decoder.feed(record))
+
+    def close(self):
+        """Yarim paketleri bildirir ve dosyayi kapatir"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._write(self.decoder.finish())
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write(self, items):
+        for item in items:
+            if isinstance(item, DecoderEvent):
+                self._notes.append(f"** {item.kind}: {item.detail}")
+                continue
+            comment = "; ".join(self._notes + [item.describe().strip()])
+            self._notes.clear()
+            self.writer.write_packet(self.start_ns + item.time_ns, item.direction, item.data,
+                                     comment)
+
+
+def export_capture(source, destination, interface=None):
+    """isp_capture kaydini pcapng'ye donusturur (tek gecis, sabit bellek)
+
+    Returns:
+        PcapngSink (packets: writer.packets, istatistikler: stats)
+    """
+    header, records = iter_capture(source)
+    sink = PcapngSink(destination, interface or source, header.baudrate or 115200,
+                      header.start_ns)
+    with sink:
+        for record in records:
+            sink.feed(record)
+    return sink
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) != 2:
+        print("Kullanim: python3 isp_pcap.py <kayit.ispcap> <cikti.pcapng>")
+        sys.exit(1)
+
+    t0 = time.monotonic()
+    sink = export_capture(args[0], args[1])
+    stats = sink.stats
+    print(f"{args[1]}: {sink.writer.packets} paket ({time.monotonic() - t0:.2f} s), "
+          f"checksum hatasi: {stats['checksum']}, yanitsiz: {stats['unanswered']}, "
+          f"resync: {stats['resync']}")
+    print("Wireshark: wireshark -X lua_script:isp_dissector.lua " + args[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Arka planda imaj hazirlama
+Imaj yolu bilinir bilinmez yukleme, SHA-256 ozeti (isp_journal), segmentlere
+ayirma, silme plani (isp_erase), frame derleme ve checksum hesabi
+(isp_frames) bir is parcaciginda yapilir; ana thread bu sirada bootloader'i
+yakalar. Bootloader yanit verdiginde hazirlik bitmis olur, programlama
+hemen baslar.
+
+Ornek:
+    pipeline = ImagePipeline("fw.bin", sparse=True)   # hemen doner
+    catch = ConnectCatcher(ser).catch()
+    image = pipeline.result()                         # genelde beklemeden
+    frames = image.stream(address, data, erase_size)  # derlenmis akis (kopya)
+
+Ilk paket boyutlari APROM boyutu bilinmeden (aprom_size=None) planlanir.
+Cihazin planindaki boyut farkliysa (APROM sonuna kirpma), stream() None
+dondurur ve akis gonderimden once derlenir.
+"""
+
+import threading
+import time
+
+from isp_erase import plan_erase
+from isp_frames import FrameStream
+from isp_image import split_segments
+from isp_journal import image_digest
+
+
+class PreparedImage:
+    """Hazirlanmis imaj
+
+    Attributes:
+        data: Imaj (bytes)
+        digest: SHA-256 ozeti (hex, isp_journal.image_digest)
+        segments: [(adres, veri), ...]
+        streams: {(adres, boyut, erase_size): FrameStream}
+        prepare_time: Hazirlama suresi (saniye)
+    """
+
+    def __init__(self, data, digest, segments, streams, prepare_time):
+        self.data = data
+        self.digest = digest
+        self.segments = segments
+        self.streams = streams
+        self.prepare_time = prepare_time
+
+    def stream(self, address, data, erase_size):
+        """Segmentin derlenmis akisinin kopyasi (yoksa None)
+
+        Akis gonderimde isaretlenir ve tekrar gonderimde yerinde degisir; her
+        cagri bagimsiz kopya dondurur (coklu port ayni imaji paylasir).
+        """
+        stream = self.streams.get((address, len(data), erase_size))
+        return stream.copy() if stream is not None else None
+
+
+class ImagePipeline:
+    """Imaji arka plan thread'inde hazirlar
+
+    Args:
+        source: Imaj dosyasi yolu veya imaj verisi (bytes)
+        sparse: Bos (0xFF) sayfalari atlayan segmentler derlensin
+        base_address: Imajin flash'taki baslangic adresi
+    """
+
+    def __init__(self, source, sparse=False, base_address=0x00000000):
+        self.source = source
+        self.sparse = sparse
+        self.base_address = base_address
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="isp-image", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            t0 = time.monotonic()
+            if isinstance(self.source, (bytes, bytearray, memoryview)):
+                data = bytes(self.source)
+            else:
+                with open(self.source, "rb") as f:
+                    data = f.read()
+            digest = image_digest(data)
+            if self.sparse:
+                segments = split_segments(data, self.base_address)
+            else:
+                segments = [(self.base_address, data)]
+            plan = plan_erase(segments, fill_gaps=self.sparse)
+            streams = {(address, len(seg_data), erase_size): FrameStream(address, seg_data,
+                                                                         erase_size)
+                       for address, seg_data, erase_size in plan.segments}
+            self._result = PreparedImage(data, digest, segments, streams,
+                                         time.monotonic() - t0)
+        except Exception as e:  # Hata result() ile cagirana tasinir
+            self._error = e
+
+    def done(self):
+        """Hazirlik bitti mi (basarili veya hatali)"""
+        return not self._thread.is_alive()
+
+    def result(self, timeout=None):
+        """Hazirlanan imaji dondurur (bitene kadar bekler)
+
+        Raises:
+            TimeoutError: timeout icinde bitmedi
+            OSError vb.: Hazirlama hatasi (dosya okunamadi)
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError("Imaj hazirlama suresi asildi")
+        if self._error is not None:
+            raise self._error
+        return self._result
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Protokol sabitleri ve paket yardimcilari
+ISP_UART komutlari (isp_user.h), 64 byte paket olusturma ve checksum
+fonksiyonlari. Kutuphane modulleri (isp_recovery, isp_frames, isp_session,
+isp_async, isp_decoder) ve CLI araclari (uart_receiver_nuvoton.py) bunlari
+buradan alir; bu modul baska bir isp_* modulune bagli degildir.
+"""
+
+# UART ayarlari (ISP_UART varsayilani)
+BAUD_RATE = 115200
+MAX_PKT_SIZE = 64
+
+# Nuvoton ISP Komutlari (isp_user.h'den)
+CMD_UPDATE_APROM = 0x000000A0
+CMD_UPDATE_CONFIG = 0x000000A1
+CMD_READ_CONFIG = 0x000000A2
+CMD_ERASE_ALL = 0x000000A3
+CMD_SYNC_PACKNO = 0x000000A4
+CMD_GET_FWVER = 0x000000A6
+CMD_RUN_APROM = 0x000000AB
+CMD_RUN_LDROM = 0x000000AC
+CMD_RESET = 0x000000AD
+CMD_CONNECT = 0x000000AE
+CMD_DISCONNECT = 0x000000AF
+CMD_GET_DEVICEID = 0x000000B1
+CMD_UPDATE_DATAFLASH = 0x000000C3
+CMD_RESEND_PACKET = 0x000000FF
+
+
+def uint32_to_bytes(value):
+    """uint32_t degerini little-endian byte array'e cevirir"""
+    return bytes([
+        (value >> 0) & 0xFF,
+        (value >> 8) & 0xFF,
+        (value >> 16) & 0xFF,
+        (value >> 24) & 0xFF
+    ])
+
+def bytes_to_uint32(data, offset=0):
+    """Byte array'den little-endian uint32_t okur"""
+    return (data[offset + 0] << 0) | \
+           (data[offset + 1] << 8) | \
+           (data[offset + 2] << 16) | \
+           (data[offset + 3] << 24)
+
+def calculate_checksum(data):
+    """16-bit checksum hesaplama (Nuvoton protokolu)
+
+    Tek paket icin; tum imajin frame checksum'lari isp_frames.FrameStream
+    ile (NumPy varsa vektorel) bir kez hesaplanir.
+    """
+    return sum(data) & 0xFFFF  # 16-bit
+
+def response_checksum(response):
+    """Yanitin byte 0-1'indeki 16-bit checksum'i okur (outps, little-endian)"""
+    return response[0] | (response[1] << 8)
+
+def checksum_matches(packet, response):
+    """Yanit checksum'i gonderilen paketin checksum'i ile ayni mi?
+
+    ISP_UART ParseCmd: WriteData() sonrasi veri ReadData() ile ayni buffer'a
+    geri okunuyor, checksum bu buffer uzerinden hesaplaniyor. Yani eslesen
+    checksum, flash'a yazilan verinin dogru geri okundugunu gosterir.
+    """
+    return response_checksum(response) == calculate_checksum(packet)
+
+def pkt_update_first(addr, size, data, packno):
+    """İlk CMD_UPDATE_APROM paketi (Kullanıcı önerisi - packno ile)
+
+    NOT: ISP_UART kodunda Byte 4-7 atlanıyor (pu8Src += 8)
+    Ama bazı bootloader versiyonları packno'yu okuyor olabilir
+
+    Format:
+    - Byte 0-3: CMD_UPDATE_APROM
+    - Byte 4-7: packno (bazı bootloader'lar için)
+    - Byte 8-11: addr
+    - Byte 12-15: size
+    - Byte 16-63: data (48 byte, eksik kisim 0xFF)
+
+    NOT: size veri uzunlugundan buyukse (isp_erase: sayfa katina yuvarlanmis
+    boyut) bootloader son paketin tamamini yazar; dolgu 0xFF oldugu icin
+    silinmis flash degismez.
+    """
+    p = bytearray(64)
+    p[16:64] = b'\xff' * 48
+    p[0:4] = uint32_to_bytes(CMD_UPDATE_APROM)
+    p[4:8] = uint32_to_bytes(packno)  # Kullanıcı önerisi
+    p[8:12] = uint32_to_bytes(addr)
+    p[12:16] = uint32_to_bytes(size)
+    if data:
+        data_len = min(len(data), 48)
+        p[16:16+data_len] = data[:data_len]
+    return p
+
+def pkt_update_next(data, packno):
+    """Devam CMD_UPDATE_APROM paketleri (Kullanıcı önerisi - packno ile)
+
+    NOT: ISP_UART kodunda Byte 4-7 atlanıyor (pu8Src += 8)
+    Ama bazı bootloader versiyonları packno'yu okuyor olabilir
+
+    NOT: Byte 0-3 = 0 olmali! ParseCmd CMD_UPDATE_APROM goren her paketi
+    ilk paket sayar (adres/boyut okur, EraseAP cagirir). Komut 0 ise
+    u32Gcmd korunur ve veri u32StartAddress'e yazilir.
+
+    Format:
+    - Byte 0-3: 0 (devam paketi)
+    - Byte 4-7: packno (bazı bootloader'lar için)
+    - Byte 8-63: data (56 byte, eksik kisim 0xFF)
+    """
+    p = bytearray(64)
+    p[8:64] = b'\xff' * 56
+    p[0:4] = uint32_to_bytes(0)
+    p[4:8] = uint32_to_bytes(packno)  # Kullanıcı önerisi
+    if data:
+        data_len = min(len(data), 56)
+        p[8:8+data_len] = data[:data_len]
+    return p
+
+def create_packet(cmd, param1=0, param2=0, data=None, is_first_packet=False):
+    """
+    64 byte Nuvoton paketi olusturur (geriye uyumluluk icin)
+
+    YENI: pkt_update_first() ve pkt_update_next() kullanin!
+    """
+    packet = bytearray(MAX_PKT_SIZE)
+    packet[0:4] = uint32_to_bytes(cmd)
+
+    # CMD_SYNC_PACKNO icin ozel format: Byte 8-11'de paket numarasi
+    if cmd == CMD_SYNC_PACKNO:
+        packet[8:12] = uint32_to_bytes(param1)
+        return packet
+
+    # Ilk paket icin ozel format (CMD_UPDATE_APROM):
+    if is_first_packet and param2 != 0:
+        packet[8:12] = uint32_to_bytes(param1)
+        packet[12:16] = uint32_to_bytes(param2)
+        if data:
+            data_len = min(len(data), 48)
+            packet[16:16+data_len] = data[:data_len]
+    else:
+        if data:
+            data_len = min(len(data), 56)
+            packet[8:8+data_len] = data[:data_len]
+
+    return packet
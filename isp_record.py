@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Seri oturum kaydi ve tekrar oynatma
+Zamanlama hatalari (300 ms penceresi, RX timeout, uzun EraseAP) kartsiz
+tekrarlanamaz. RecordingSerial araclarin kullandigi seri port nesnesini
+sarar ve her okuma/yazmayi zamaniyla isp_capture biciminde kaydeder.
+ReplaySerial ayni arayuzu (pyserial alt kumesi) kayittan sunar: hostun
+yazdiklari kayitla karsilastirilir, kartin yanitlari kayittaki zamanlamayla
+(veya olceklenmis) geri verilir. send_update_aprom(), get_device_id(ser),
+IspSession gibi `ser` alan her akis kart olmadan yeniden calistirilabilir
+(profil ve regresyon testi icin).
+
+Zamanlama modeli: her RX kaydi, kayitta kendisinden onceki son TX kaydina
+baglidir. Host o TX'i yazdiginda, RX byte'lari yazma anindan itibaren
+kayittaki aralik x scale sonra okunabilir olur. Boylece yanit, hostun ayni
+(N.) paketinden sonra gelir; yakalayicinin CMD_CONNECT sayisi veya host
+hizi farkli olsa da akis bozulmaz. scale=0: yanitlar hemen (en hizli),
+scale=1: kayittaki gibi.
+
+Host kararlari zamanlamaya bagli oldugu icin akis ayrisabilir (uyusmazlik):
+kayitta yavas (kayip degil) yanit yuzunden olusan zaman asimi ve RESEND,
+scale < 1 ile ortadan kalkar; scale=1'de oynatmanin uyku gecikmesi
+(yuk altinda birkac ms) ogrenilen dar sureyi (isp_deadline, >= 20 ms)
+asabilir. Kayittaki hic gelmeyen yanitlar her olcekte zaman asimi olarak
+tekrarlanir.
+
+Kayit okuma zamanini tutar (byte'larin gelis anini degil); polling yapan
+araclarin kaydinda yanitlar biraz gec gorunur. DTR/RTS hat degisiklikleri
+kaydedilmez (isp_reset ile alinan kayit da host yazmalari ile oynatilir).
+
+Ornek:
+    ser = RecordingSerial(open_transport(port, 115200, timeout=1), "oturum.ispcap")
+    send_update_aprom(ser, bin_data)
+    ser.close()
+
+    ser = ReplaySerial("oturum.ispcap", scale=0, strict=True)
+    send_update_aprom(ser, bin_data)     # kartsiz, ayni paketler/yanitlar
+    print(ser.summary())                 # uyusmazlik, tuketilmeyen kayit
+
+Arac destegi:
+    python3 uart_receiver_nuvoton.py <port> fw.bin --record=oturum.ispcap
+    python3 uart_receiver_nuvoton.py fw.bin --replay=oturum.ispcap [--replay-scale=0]
+    python3 get_device_id.py <port> --record=oturum.ispcap
+    python3 get_device_id.py --replay=oturum.ispcap [--replay-scale=0]
+    (tekrar oynatmada uyusmazlik varsa cikis kodu 1)
+"""
+
+import collections
+import time
+
+from isp_capture import DIR_RX, DIR_TX, CaptureWriter, iter_capture
+from isp_transport import SerialException, TapSerial
+
+
+class ReplayMismatch(Exception):
+    """Hostun yazdigi byte'lar kayittakinden farkli (strict tekrar oynatma)"""
+
+
+class RecordingSerial(TapSerial):
+    """Seri portu sarar, okuma/yazmalari isp_capture dosyasina kaydeder
+
+    Args:
+        ser: Acik seri port (pyserial / isp_transport.TermiosSerial)
+        path: Kayit dosyasi (.ispcap)
+
+    close() portu ve kaydi kapatir.
+    """
+
+    def __init__(self, ser, path):
+        super().__init__(ser, CaptureWriter(path, baudrate=getattr(ser, "baudrate", 0) or 0))
+
+    def close(self):
+        try:
+            self._ser.close()
+        finally:
+            self.capture.close()
+
+
+class ReplaySerial:
+    """Kayittan oynatan seri port (pyserial arayuzu, fileno yok)
+
+    Args:
+        path: RecordingSerial / isp_capture kaydi
+        scale: Yanit zamanlamasi carpani (1: kayittaki gibi, 0: hemen)
+        strict: Yazilan byte'lar kayitla uyusmazsa ReplayMismatch
+        timeout: Okuma timeout'u (pyserial gibi; None: veri gelene kadar)
+
+    Istatistikler: writes, mismatches, tx_bytes, rx_bytes (hosta verilen),
+    exhausted (kayit bittikten sonra yazilan byte), remaining() (tuketilmeyen
+    kayit sayisi).
+    """
+
+    def __init__(self, path, scale=1.0, strict=False, timeout=None, write_timeout=None):
+        header, records = iter_capture(path)
+        self.path = path
+        self.port = f"replay:{path}"
+        self.baudrate = header.baudrate or 115200
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.scale = scale
+        self.strict = strict
+        self.is_open = True
+
+        self.writes = 0
+        self.mismatches = 0
+        self.first_mismatch = None  # (yazma sirasi, beklenen, yazilan)
+        self.tx_bytes = 0
+        self.rx_bytes = 0
+        self.exhausted = 0
+
+        self._records = records
+        self._next = next(records, None)
+        self._expected = bytearray()  # Kismen tuketilmis TX kaydi
+        self._scheduled = collections.deque()  # (zaman, byte'lar)
+        self._rx = bytearray()
+        self._unread = 0  # remaining() ile sayilip atlanan kayitlar
+        # Baglam: kayit zamani <-> oynatma zamani (ilk TX'e kadar acilis ani)
+        self._anchor_record_ns = 0
+        self._anchor_ns = time.monotonic_ns()
+
+    # --- kayit akisi ---
+
+    def _schedule_rx(self):
+        """Siradaki TX'e kadar olan RX kayitlarini zamanlar"""
+        while self._next is not None and self._next.direction == DIR_RX:
+            record = self._next
+            delay = (record.time_ns - self._anchor_record_ns) * self.scale
+            self._scheduled.append((self._anchor_ns + max(0, int(delay)), record.data))
+            self._next = next(self._records, None)
+
+    def _deliver(self):
+        """Zamani gelen RX byte'larini okuma buffer'ina tasir"""
+        self._schedule_rx()
+        now = time.monotonic_ns()
+        while self._scheduled and self._scheduled[0][0] <= now:
+            self._rx += self._scheduled.popleft()[1]
+
+    def _consume_tx(self, size):
+        """Kayittan size byte TX alir (kayit biterse eksik doner)"""
+        self._schedule_rx()
+        while len(self._expected) < size and self._next is not None:
+            if self._next.direction == DIR_TX:
+                if not self._expected:
+                    # Sonraki RX'ler bu yazmaya gore zamanlanir
+                    self._anchor_record_ns = self._next.time_ns
+                    self._anchor_ns = time.monotonic_ns()
+                self._expected += self._next.data
+                self._next = next(self._records, None)
+            else:
+                # TX ortasinda RX: kayitta paket bolunmus, kalan TX sonra gelir
+                self._schedule_rx()
+        expected = bytes(self._expected[:size])
+        del self._expected[:size]
+        return expected
+
+    def remaining(self):
+        """Tuketilmeyen kayit sayisi (okunmamis RX dahil)
+
+        Kaydin kalanini okuyup sayar; oynatma bittikten sonra cagirin.
+        """
+        if self._next is not None:
+            self._unread += 1 + sum(1 for _ in self._records)
+            self._next = None
+        return self._unread + len(self._scheduled) + (1 if self._expected else 0)
+
+    # --- pyserial arayuzu ---
+
+    def write(self, data):
+        if not self.is_open:
+            raise SerialException("Port kapali")
+        data = bytes(memoryview(data).cast("B"))
+        expected = self._consume_tx(len(data))
+        self.writes += 1
+        self.tx_bytes += len(data)
+        if len(expected) < len(data):
+            self.exhausted += len(data) - len(expected)
+        if expected != data:
+            self.mismatches += 1
+            if self.first_mismatch is None:
+                self.first_mismatch = (self.writes, expected, data)
+            if self.strict:
+                raise ReplayMismatch(f"Yazma #{self.writes}: beklenen {expected[:16].hex()}..., "
+                                     f"yazilan {data[:16].hex()}...")
+        return len(data)
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise SerialException("Port kapali")
+        deadline = None if self.timeout is None else time.monotonic_ns() + int(self.timeout * 1e9)
+        while True:
+            self._deliver()
+            if len(self._rx) >= size:
+                break
+            now = time.monotonic_ns()
+            if deadline is not None and now >= deadline:
+                break
+            if not self._scheduled:
+                if deadline is None:
+                    break  # Kayit hostun yazmasini bekliyor: sonsuza kadar bloklama
+                time.sleep((deadline - now) / 1e9)
+                continue
+            wake = self._scheduled[0][0] if deadline is None else min(self._scheduled[0][0],
+                                                                      deadline)
+            time.sleep(max(0, wake - now) / 1e9)
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        self.rx_bytes += len(data)
+        return data
+
+    @property
+    def in_waiting(self):
+        self._deliver()
+        return len(self._rx)
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self._deliver()
+        self._rx.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def fileno(self):
+        raise SerialException("ReplaySerial: fd yok")
+
+    def readable(self):
+        return self.is_open
+
+    def writable(self):
+        return self.is_open
+
+    def setDTR(self, level=True):
+        pass
+
+    def setRTS(self, level=True):
+        pass
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # --- sonuc ---
+
+    def ok(self):
+        """Regresyon kapisi: uyusmazlik yok ve kayit tamamen tuketildi"""
+        return self.mismatches == 0 and self.remaining() == 0
+
+    def summary(self):
+        """Tek satirlik ozet (kaydin kalani okunur: oynatma bittikten sonra cagirin)"""
+        text = (f"Tekrar oynatma: {self.writes} yazma ({self.tx_bytes} byte), "
+                f"{self.rx_bytes} byte yanit, {self.mismatches} uyusmazlik, "
+                f"{self.remaining()} kayit tuketilmedi")
+        if self.first_mismatch is not None:
+            index, expected, data = self.first_mismatch
+            text += (f"; ilk uyusmazlik yazma #{index}: beklenen {expected[:8].hex() or '-'}, "
+                     f"yazilan {data[:8].hex()}")
+        return text
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - CMD_RESEND_PACKET kurtarma durum makinesi
+Bir segmenti (ilk paket + devam paketleri) yazarken bootloader'in ParseCmd
+durumunu (isp_user.c) hostta birebir izler ve hatalardan tek bir
+CMD_RESEND_PACKET tur suresiyle kurtulur.
+
+isp_user.c ParseCmd ozeti:
+- Ilk paket (CMD_UPDATE_APROM): u32StartAddress = adres, u32TotalLen = boyut,
+  EraseAP(adres, boyut), ardindan 48 byte yazilir
+- Devam paketi (komut 0): u32Gcmd korunur, min(56, u32TotalLen) byte
+  u32StartAddress'e yazilir; u32StartAddress += n, u32LastDataLen = n
+- CMD_RESEND_PACKET: u32StartAddress -= u32LastDataLen,
+  u32TotalLen += u32LastDataLen, sayfanin adrese kadar olan kismi geri okunup
+  sayfa silinir ve geri yazilir. u32Gcmd DEGISMEZ, yani sadece SON islenen
+  paket geri alinir; ikinci bir RESEND ayni uzunlukta bir kez daha geri sarar
+- Her islenen paketin yaniti: checksum = alinan paketin toplami (yazma
+  sonrasi geri okunan veriyle), paket no = onceki + 2. Bootloader hostun
+  gonderdigi paket numarasina bakmaz
+
+Hata durumlari ve kurtarma:
+- Checksum uyusmazligi: paket islendi (adres ilerledi) ama yanlis yazildi.
+  RESEND bu paketi geri alir, paket tekrar gonderilir
+- Zaman asimi / yarim yanit: paketin islenip islenmedigi bilinmez. Hat
+  bosalinca RESEND gonderilir; RESEND yanitinin paket numarasi karari verir:
+    beklenen      -> paket hic islenmedi (RX timeout ile atildi), RESEND bir
+                     onceki paketi geri aldi: onceki paketten devam edilir
+    beklenen + 2  -> paket islendi, yanit kayboldu: RESEND bu paketi geri
+                     aldi, paket tekrar gonderilir
+- Paket numarasi kaymasi (isp_packno.PacketTracker): beklenenden kucuk
+  numarali ve checksum'i baska pakete ait yanit eski (gec gelen) bir
+  yanittir, atlanir. Fark ilk yanitta gorulur; bootloader bilinmeyen
+  paketler islemis veya hostun islendi sandigi bir paket ulasmamissa
+  u32StartAddress bilinmez
+- Bilinmeyen durum (kayma, RESEND yanitsiz): dogrulanan son adresin sayfa
+  sinirindan yeni bir ilk paket gonderilir (EraseAP kalani siler)
+
+Ilk paketin kaybi/bozulmasi icin RESEND kullanilmaz: ilk paket adres ve
+boyutu yeniden kurdugu icin tekrar gonderilir.
+
+Her gonderimde byte 4-7'ye artan bir sira numarasi yazilir. Bootloader bu
+alana bakmaz ama yanit checksum'i tum buffer uzerinden hesaplanir; boylece
+ayni paketin tekrar gonderilen kopyalari farkli checksum'li yanit alir ve
+onceki kopyanin gec gelen yaniti eski yanit olarak ayirt edilir.
+
+Paketler segment basinda isp_frames.FrameStream ile bir kez derlenir
+(beklenen checksum'lar dahil); dongu sadece memoryview dilimi gonderir.
+Tekrar gonderilen frame'e yeni sira numarasi restamp() ile yazilir.
+
+Durum makinesi port I/O'su yapmaz: program_steps() yazma/okuma/bosaltma
+adimlarini (STEP_*) yield eden bir uretectir. program() bu adimlari
+bloklayan portta calistirir; isp_async ayni uretec ile asyncio
+transport'unda calistirir, boylece iki yol ayni kurtarma mantigini kullanir.
+"""
+
+import time
+
+from isp_deadline import (DEADLINE_FIRST, DEADLINE_NEXT, DEADLINE_RESEND, DeadlineEstimator,
+                          erase_pages)
+from isp_frames import FIRST_DATA_LEN, NEXT_DATA_LEN, FrameStream
+from isp_image import FLASH_PAGE_SIZE
+from isp_packno import PACKNO_LOST, PACKNO_OK, PACKNO_STALE, PacketTracker, response_packno
+from isp_protocol import (CMD_RESEND_PACKET, CMD_UPDATE_APROM, calculate_checksum, create_packet,
+                          response_checksum)
+from isp_transport import port_frame_writer, read_frame
+
+# Bir segmentte izin verilen toplam kurtarma sayisi
+MAX_RECOVERIES = 16
+
+MAX_VERIFY_RETRY = 3  # Checksum uyusmazliginda maksimum tekrar
+
+# Zaman asimindan sonra hattin bos sayilmasi icin sessizlik suresi
+DRAIN_QUIET = 0.02
+
+RESEND_PACKET = bytes(create_packet(CMD_RESEND_PACKET))
+
+# Durum makinesinin surucuye verdigi adimlar: (tur, arguman) -> sonuc
+STEP_WRITE = "write"  # (STEP_WRITE, paket) -> send() sonucu (False: gonderilemedi)
+STEP_READ = "read"  # (STEP_READ, sure) -> 64 byte yanit, sure dolarsa None
+STEP_DRAIN = "drain"  # (STEP_DRAIN, sessizlik) -> hat bu kadar sessiz kalana dek gelenleri at
+
+# Yanit siniflari
+RESPONSE_OK = "ok"
+RESPONSE_CHECKSUM = "checksum"
+RESPONSE_TIMEOUT = "timeout"
+RESPONSE_DESYNC = "desync"
+
+
+class RecoveryError(Exception):
+    """Segment kurtarma siniri asildi veya port kullanilamiyor"""
+
+
+class SegmentProgrammer:
+    """Bootloader durumunu izleyerek segment yazan durum makinesi
+
+    Args:
+        ser: Serial port nesnesi
+        send: send(packet) - paketi gonderir (varsayilan: portun FrameWriter'i ile
+              tek yazma)
+        timeout: Devam paketi / RESEND yanit suresi (saniye, ogrenilene kadar)
+        first_timeout: Ilk paket yanit suresi (EraseAP dahil, ogrenilene kadar)
+        deadlines: isp_deadline.DeadlineEstimator - olculen yanit surelerinden
+                   zaman asimi (None: timeout/first_timeout varsayilanli, sadece
+                   bu segment boyunca ogrenen yeni tahminci)
+        verify: Checksum uyusmazliginda paketi RESEND ile tekrar yaz. False ise
+                uyusmazlik sadece bildirilir (acknowledge(..., False))
+        tracker: isp_packno.PacketTracker - oturumun paket numarasi modeli
+                 (None: yeni model, sayac ilk yanittan ogrenilir)
+        on_event: on_event(olay, adres, aciklama) - kurtarma olaylari (loglama icin)
+
+    Istatistikler: frames (gonderilen paket), recoveries, resends, resyncs
+
+    ser ve send sadece program() (bloklayan surucu) icin kullanilir;
+    program_steps() ile kendi I/O'sunu yapan surucude (isp_async) ser None
+    olabilir.
+    """
+
+    def __init__(self, ser, send=None, timeout=1.0, first_timeout=10.0, verify=False,
+                 tracker=None, deadlines=None, max_recoveries=MAX_RECOVERIES, on_event=None):
+        self.ser = ser
+        self._write = send or (lambda packet: port_frame_writer(ser).write(ser, packet))
+        if deadlines is None:
+            deadlines = DeadlineEstimator(defaults={DEADLINE_FIRST: first_timeout,
+                                                    DEADLINE_NEXT: timeout,
+                                                    DEADLINE_RESEND: timeout},
+                                          deadline_dir=None)
+        self.deadlines = deadlines
+        self._sent_at = 0.0
+        self.verify = verify
+        self.tracker = tracker if tracker is not None else PacketTracker()
+        self.max_recoveries = max_recoveries
+        self.on_event = on_event or (lambda *args: None)
+        self.frames = 0
+        self.sequence = 0  # Son kullanilan paket byte 4-7 sira numarasi
+        self.recoveries = 0
+        self.resends = 0
+        self.resyncs = 0
+
+    # --- bloklayan surucu ---
+
+    def run(self, steps):
+        """Adim ureteci (program_steps) bloklayan portta calistirir, sonucunu dondurur"""
+        result = None
+        try:
+            while True:
+                kind, arg = steps.send(result)
+                if kind == STEP_WRITE:
+                    result = self._write(arg)
+                elif kind == STEP_READ:
+                    result = read_frame(self.ser, arg)
+                else:
+                    while read_frame(self.ser, arg, 1) is not None:
+                        pass
+                    self.ser.reset_input_buffer()
+                    result = None
+        except StopIteration as stop:
+            return stop.value
+
+    # --- alt katman (adim uretecleri, yield from ile) ---
+
+    def send(self, packet):
+        """Paketi gonderir, beklenen yanit paket numarasini dondurur"""
+        if (yield STEP_WRITE, packet) is False:
+            raise RecoveryError("Paket gonderilemedi")
+        self.frames += 1
+        self._sent_at = time.monotonic()
+        return self.tracker.sent(packet)
+
+    def drain(self):
+        """Hat DRAIN_QUIET kadar sessiz kalana dek gelen byte'lari atar (yarim yanitlar)"""
+        yield STEP_DRAIN, DRAIN_QUIET
+
+    def receive(self, packet, expected, command_class, units=1, checksum=None):
+        """`packet`in yanitini bekler, eski yanitlari atlar
+
+        Zaman asimi deadlines'tan alinir; gecikme olculup kaydedilir.
+        checksum: Beklenen yanit checksum'i (derlenmis akistan), None ise hesaplanir
+
+        Returns:
+            (sinif, yanit): RESPONSE_OK / RESPONSE_CHECKSUM / RESPONSE_DESYNC /
+            RESPONSE_TIMEOUT (yanit None)
+        """
+        if checksum is None:
+            checksum = calculate_checksum(packet)
+        deadline = self._sent_at + self.deadlines.timeout(command_class, units)
+        while True:
+            response = yield STEP_READ, max(0.0, deadline - time.monotonic())
+            if response is None:
+                self.deadlines.expired(command_class)
+                return RESPONSE_TIMEOUT, None
+            state, frames = self.tracker.check(packet, response, expected)
+            if state == PACKNO_STALE:
+                self.on_event("stale", None, f"eski yanit atlandi (paket no "
+                              f"{response_packno(response)}, beklenen {expected})")
+                continue
+            self.deadlines.observe(command_class, time.monotonic() - self._sent_at, units)
+            if state != PACKNO_OK:
+                self.on_event(state, None, f"paket no {response_packno(response)}, "
+                              f"beklenen {expected} ({frames} paket)")
+                return RESPONSE_DESYNC, response
+            if response_checksum(response) == checksum:
+                return RESPONSE_OK, response
+            return RESPONSE_CHECKSUM, response
+
+    def resend(self):
+        """CMD_RESEND_PACKET gonderir
+
+        Returns:
+            (kayip, paket_no): Son veri paketi bootloader'a ulastiysa 0 (RESEND
+            onu geri aldi), ulasmadiysa 1 (RESEND bir onceki paketi geri aldi),
+            bilinmiyorsa None
+        """
+        self.resends += 1
+        expected = yield from self.send(RESEND_PACKET)
+        # RESEND sonucu belirsiz kalirsa yeni ilk paket gerekir: ogrenilen
+        # sure dolsa da varsayilan sureye kadar beklenir
+        deadline = self._sent_at + self.deadlines.timeout(DEADLINE_RESEND)
+        hard_deadline = self._sent_at + self.deadlines.hard_timeout(DEADLINE_RESEND)
+        while True:
+            response = yield STEP_READ, max(0.0, deadline - time.monotonic())
+            if response is None:
+                if deadline < hard_deadline:
+                    self.deadlines.expired(DEADLINE_RESEND)
+                    deadline = hard_deadline
+                    continue
+                return None, None
+            packno = response_packno(response)
+            if response_checksum(response) != calculate_checksum(RESEND_PACKET):
+                if expected is not None and packno < expected:
+                    continue  # Zaman asimina ugrayan veri paketinin gec gelen yaniti
+                return None, packno
+            self.deadlines.observe(DEADLINE_RESEND, time.monotonic() - self._sent_at)
+            if expected is None:
+                self.tracker.check(RESEND_PACKET, response, None)
+                return None, packno
+            state, frames = self.tracker.check(RESEND_PACKET, response, expected)
+            if state == PACKNO_OK:
+                return 0, packno
+            if state == PACKNO_LOST and frames == 1:
+                return 1, packno
+            return None, packno
+
+    # --- segment ---
+
+    def program(self, address, data, progress=None, acknowledge=None, erase_size=None,
+                frames=None, command=CMD_UPDATE_APROM):
+        """Segmenti bloklayan portta yazar (argumanlar: program_steps)
+
+        Raises:
+            RecoveryError: Kurtarma siniri asildi
+        """
+        return self.run(self.program_steps(address, data, progress, acknowledge, erase_size,
+                                           frames, command))
+
+    def program_steps(self, address, data, progress=None, acknowledge=None, erase_size=None,
+                      frames=None, command=CMD_UPDATE_APROM):
+        """Segmenti yazan adim ureteci (STEP_* adimlari, run() veya isp_async surer)
+
+        Args:
+            address: Segment baslangic adresi
+            data: Segment verisi
+            erase_size: Ilk paketteki boyut (isp_erase: sayfa kati, EraseAP'in
+                        silecegi alan); None ise veri uzunlugu
+            progress: progress(offset) her onaylanan paketten sonra
+            acknowledge: acknowledge(adres, ok) her yanittan sonra (isp_journal);
+                         geri sarma/yeniden baslatmada adres geriye gidebilir
+            frames: Onceden derlenmis isp_frames.FrameStream (ayni adres, veri ve
+                    erase_size ile, isp_pipeline); None ise burada derlenir
+            command: Ilk paketin komutu. CMD_UPDATE_DATAFLASH'ta bootloader adresi
+                     kendisi secer ve her ilk pakette tum data flash'i siler;
+                     yeni ilk paket gereken kurtarmalar segmentin basindan baslar
+
+        Raises:
+            RecoveryError: Kurtarma siniri asildi
+        """
+        size = len(data)
+        erase_size = size if erase_size is None else erase_size
+        start = 0  # Son ilk paketin segment icindeki ofseti
+        offset = 0  # Sonraki paketin ofseti (bootloader u32StartAddress - address)
+        last_len = 0  # Bootloader u32LastDataLen
+        first = True
+        checksum_failures = 0
+        confirmed = 0  # Checksum'i tutan kesintisiz son ofset
+        resumable = command == CMD_UPDATE_APROM  # Ilk paket ortadan baslatilabilir mi
+        stream = frames
+        if stream is not None:
+            self.sequence = max(self.sequence, stream.sequence)
+
+        while True:
+            if first:
+                if stream is None or stream.start != start:
+                    # Yeniden baslatmada frame sinirlari kayar: kalan kisim derlenir
+                    stream = FrameStream(address, data, erase_size, start, self.sequence,
+                                         command)
+                    self.sequence = stream.sequence
+                index = 0
+                length = min(FIRST_DATA_LEN, size - start)
+                command_class = DEADLINE_FIRST
+                units = erase_pages(address + start, erase_size - start)
+            else:
+                if offset >= size:
+                    return
+                index = stream.index(offset)
+                length = min(NEXT_DATA_LEN, size - offset)
+                command_class = DEADLINE_NEXT
+                units = 1
+            if stream.sent[index]:
+                self.sequence += 1
+                stream.restamp(index, self.sequence)
+            stream.sent[index] = 1
+            packet = stream.frame(index)
+            checksum = stream.checksums[index]
+
+            expected = yield from self.send(packet)
+            result, response = yield from self.receive(packet, expected, command_class, units,
+                                                       checksum)
+            if (result == RESPONSE_DESYNC and first
+                    and response_checksum(response) == checksum):
+                # Ilk paket bootloader durumunu bastan kurar: aradaki kayip/fazla
+                # paketler onemsiz, sayac check() ile duzeltildi
+                result = RESPONSE_OK
+
+            if result == RESPONSE_OK or (result == RESPONSE_CHECKSUM and not self.verify):
+                ok = result == RESPONSE_OK
+                if not ok:
+                    self.on_event("checksum", address + offset,
+                                  f"checksum 0x{response_checksum(response):04X}, beklenen "
+                                  f"0x{checksum:04X} (dogrulama kapali)")
+                offset = (start if first else offset) + length
+                last_len = length
+                first = False
+                checksum_failures = 0
+                if ok and offset - length <= confirmed:
+                    confirmed = max(confirmed, offset)
+                if acknowledge:
+                    acknowledge(address + offset, ok)
+                if progress:
+                    progress(offset)
+                if offset >= size:
+                    return
+                continue
+
+            self._count_recovery(address + offset)
+
+            if result == RESPONSE_CHECKSUM:
+                # Paket islendi ama yanlis yazildi
+                checksum_failures += 1
+                self.on_event("checksum", address + offset,
+                              f"checksum 0x{response_checksum(response):04X}, beklenen "
+                              f"0x{checksum:04X}")
+                if checksum_failures > MAX_VERIFY_RETRY:
+                    raise RecoveryError(f"Dogrulama hatasi: 0x{address + offset:08X}")
+                if first:
+                    continue  # Ilk paket aralik yeniden silinerek tekrar yazilir
+                lost, _ = yield from self.resend()
+                if lost == 0:
+                    continue  # RESEND bu paketi geri aldi
+                start = offset = self._resync(address, confirmed if resumable else 0, acknowledge)
+                first = True
+                continue
+
+            if result == RESPONSE_DESYNC:
+                if first:
+                    continue  # Ilk paket adresi yeniden kurar: tekrar gonder
+                yield from self.drain()
+                start = offset = self._resync(address, confirmed if resumable else 0, acknowledge)
+                first = True
+                continue
+
+            # RESPONSE_TIMEOUT: paket veya yaniti kayboldu (yarim paket dahil)
+            yield from self.drain()
+            if first:
+                self.on_event("timeout", address + start, "ilk paket yanitsiz, tekrar gonderiliyor")
+                # Sayac islenmis varsayimiyla korunur: gec gelen yanit eski yanit
+                # olarak atlanir, paket ulasmadiysa tekrarin yaniti sayaci duzeltir
+                continue
+            lost, packno = yield from self.resend()
+            if lost == 0:
+                self.on_event("timeout", address + offset,
+                              f"paket islendi, yanit kayboldu (RESEND paket no {packno})")
+                continue
+            if lost == 1 and last_len:
+                # RESEND bir onceki paketi geri aldi: oradan devam
+                offset -= last_len
+                confirmed = min(confirmed, offset)
+                last_len = 0  # Ikinci bir RESEND ayni uzunlukta tekrar geri sarar
+                # Geri alinan paket ilk paketse o tekrar gonderilir (adres/boyut +
+                # 48 byte); devam paketi olarak 56 byte gonderilse host ofseti
+                # u32StartAddress'in 8 byte onune gecer
+                first = offset == start
+                if acknowledge:
+                    acknowledge(address + offset, True)  # Geri sarilan sayfa silindi
+                self.on_event("timeout", address + offset,
+                              f"paket ulasmadi, onceki paketten devam (RESEND paket no {packno})")
+                continue
+            self.on_event("timeout", address + offset, "RESEND sonucu belirsiz")
+            # Sayac korunur: gec gelen veri/RESEND yanitlari eski yanit olarak
+            # atlanir, sayac yanlissa ilk paket yanitindan duzeltilir
+            start = offset = self._resync(address, confirmed if resumable else 0, acknowledge)
+            first = True
+
+    def _count_recovery(self, address):
+        self.recoveries += 1
+        if self.recoveries > self.max_recoveries:
+            raise RecoveryError(f"Kurtarma siniri asildi ({self.max_recoveries}): "
+                                f"0x{address:08X}")
+
+    def _resync(self, address, confirmed, acknowledge):
+        """Dogrulanan son adresin sayfa sinirindan yeni ilk paket icin ofset dondurur"""
+        self.resyncs += 1
+        page_start = (address + confirmed) - (address + confirmed) % FLASH_PAGE_SIZE
+        offset = max(0, page_start - address)
+        self.on_event("resync", address + offset, "yeni ilk paket (EraseAP kalani siler)")
+        if acknowledge:
+            acknowledge(address + offset, True)
+        return offset
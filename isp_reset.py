@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Otomatik reset ve bootloader'a giris
+Kart ya nRESET'e bagli DTR/RTS hattina darbe verilerek ya da calisan
+uygulamaya gecis byte'i (0x42, application_bootloader_switch.c) gonderilerek
+resetlenir; ardindan CMD_CONNECT paketleri 300 ms penceresi icinde hat
+hizinda gonderilir (isp_catcher). Operatorun reset butonuna basmasi gerekmez.
+
+Reset tanimi (--reset=...):
+    dtr          DTR hattina darbe
+    rts          RTS hattina darbe
+    dtr+rts      Ikisine birden
+    !dtr         Ters polarite (darbe sirasinda hat pasif, bosta aktif)
+    dtr:50       Darbe genisligi 50 ms (varsayilan 20 ms)
+    switch       Uygulamaya 0x42 gonder (SwitchToBootloader -> NVIC_SystemReset)
+    switch:0x42  Gecis byte'i
+    switch:0x42:200
+                 Uygulamanin byte'i okuyup reset atmasi icin en fazla 200 ms
+                 (varsayilan 100 ms; CheckBootloaderSwitch() cagrilma araligi)
+
+NOT: pyserial'de setDTR(True) hatti "aktif" yapar; cogu USB-UART
+donusturucude bu pinin LOW olmasi demektir (nRESET'i cekmek icin).
+"""
+
+import time
+
+from isp_catcher import ConnectCatcher
+
+CONNECT_WINDOW = 0.3  # main.c: SysTick 300 ms
+DEFAULT_PULSE_WIDTH = 0.02
+
+# application_bootloader_switch.c
+CMD_SWITCH_TO_BOOTLOADER = 0x42
+DEFAULT_SWITCH_LATENCY = 0.1
+
+
+class ResetStrategy:
+    """DTR/RTS darbe ile reset
+
+    Args:
+        lines: ("dtr",), ("rts",) veya ("dtr", "rts")
+        invert: True ise darbe sirasinda hat pasif (False), bosta aktif
+        pulse_width: Reset darbe genisligi (saniye)
+        boot_delay: Reset birakildiktan sonra ilk CMD_CONNECT'e kadar bekleme
+                    (bootloader saat/UART baslatma suresi)
+    """
+
+    # Reset birakildiktan sonra kartin gercekten resetlenmesi icin gecebilecek
+    # en uzun sure (CMD_CONNECT penceresine eklenir)
+    latency = 0.0
+
+    def __init__(self, lines=("dtr",), invert=False, pulse_width=DEFAULT_PULSE_WIDTH,
+                 boot_delay=0.0):
+        for line in lines:
+            if line not in ("dtr", "rts"):
+                raise ValueError(f"Bilinmeyen hat: {line} (dtr veya rts)")
+        self.lines = tuple(lines)
+        self.invert = invert
+        self.pulse_width = pulse_width
+        self.boot_delay = boot_delay
+
+    @classmethod
+    def from_spec(cls, spec):
+        """'dtr', 'rts', 'dtr+rts', '!dtr', 'rts:50' gibi tanimdan olusturur"""
+        invert = spec.startswith('!')
+        spec = spec.lstrip('!')
+        pulse_width = DEFAULT_PULSE_WIDTH
+        if ':' in spec:
+            spec, width_ms = spec.split(':', 1)
+            pulse_width = float(width_ms) / 1000.0
+        return cls(tuple(spec.split('+')), invert, pulse_width)
+
+    def __str__(self):
+        return (f"{'!' if self.invert else ''}{'+'.join(self.lines)}:"
+                f"{self.pulse_width * 1000:.0f}ms")
+
+    def _set(self, ser, active):
+        level = active != self.invert
+        for line in self.lines:
+            if line == "dtr":
+                ser.setDTR(level)
+            else:
+                ser.setRTS(level)
+
+    def idle(self, ser):
+        """Hatlari bosta (reset birakilmis) durumuna alir"""
+        self._set(ser, False)
+
+    def pulse(self, ser):
+        """Reset darbesi verir, resetin birakildigi ani (time.monotonic) dondurur"""
+        self._set(ser, True)
+        time.sleep(self.pulse_width)
+        self._set(ser, False)
+        return time.monotonic()
+
+
+class SwitchStrategy:
+    """Calisan uygulamaya gecis byte'i gondererek reset (DTR/RTS gerekmez)
+
+    Uygulama byte'i okuyunca vector sayfasini LDROM'a alip NVIC_SystemReset()
+    yapar. Byte hatta bittigi anda yakalayici baslar; reset ani uygulamanin
+    byte'i ne zaman okudugune bagli oldugu icin pencere `latency` kadar uzar.
+
+    Args:
+        command: Gecis byte'i (varsayilan 0x42)
+        latency: Uygulamanin byte'i okuyup reset atmasi icin en uzun sure
+        boot_delay: ResetStrategy ile ayni
+    """
+
+    def __init__(self, command=CMD_SWITCH_TO_BOOTLOADER, latency=DEFAULT_SWITCH_LATENCY,
+                 boot_delay=0.0):
+        if not 0 <= command <= 0xFF:
+            raise ValueError(f"Gecis komutu bir byte olmali: {command:#x}")
+        self.command = command
+        self.latency = latency
+        self.boot_delay = boot_delay
+
+    @classmethod
+    def from_spec(cls, spec):
+        """'switch', 'switch:0x42', 'switch:0x42:200' gibi tanimdan olusturur"""
+        parts = spec.split(':')
+        if parts[0] != "switch":
+            raise ValueError(f"Gecersiz gecis tanimi: {spec}")
+        command = int(parts[1], 0) if len(parts) > 1 and parts[1] else CMD_SWITCH_TO_BOOTLOADER
+        latency = float(parts[2]) / 1000.0 if len(parts) > 2 else DEFAULT_SWITCH_LATENCY
+        return cls(command, latency)
+
+    def __str__(self):
+        return f"switch:{self.command:#04x}:{self.latency * 1000:.0f}ms"
+
+    def idle(self, ser):
+        """Hat durumu degismez"""
+
+    def pulse(self, ser):
+        """Gecis byte'ini gonderir, byte hatta bittigi ani dondurur"""
+        ser.reset_output_buffer()
+        ser.write(bytes([self.command]))
+        ser.flush()  # tcdrain: byte UART'tan cikana kadar bekler
+        return time.monotonic()
+
+
+def strategy_from_spec(spec):
+    """--reset=... tanimindan ResetStrategy veya SwitchStrategy olusturur"""
+    if spec.split(':', 1)[0] == "switch":
+        return SwitchStrategy.from_spec(spec)
+    return ResetStrategy.from_spec(spec)
+
+
+def connect_after_reset(ser, released_at, window=CONNECT_WINDOW, boot_delay=0.0, interval=None):
+    """Reset birakildiktan sonra 300 ms penceresi boyunca CMD_CONNECT gonderir
+
+    Paketler isp_catcher ile hat hizinda, released_at + boot_delay anindan
+    baslayan sabit cizelgeyle gonderilir (kayma birikmez).
+
+    Returns:
+        isp_catcher.CatchResult, pencere kacirildiysa None
+    """
+    catcher = ConnectCatcher(ser, interval)
+    return catcher.catch(start_at=released_at + boot_delay, deadline=released_at + window,
+                         reset_at=released_at)
+
+
+def enter_bootloader(ser, strategy, retries=3, window=CONNECT_WINDOW, interval=None):
+    """Karti resetleyip bootloader'a baglanir
+
+    Args:
+        strategy: ResetStrategy veya SwitchStrategy
+
+    Returns:
+        isp_catcher.CatchResult (response: CMD_CONNECT yaniti), basarisizsa None
+    """
+    strategy.idle(ser)
+    for _ in range(retries):
+        released_at = strategy.pulse(ser)
+        result = connect_after_reset(ser, released_at, window + strategy.latency,
+                                     strategy.boot_delay, interval)
+        if result is not None:
+            return result
+    return None
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Sessiz (print'siz) tek port oturumu
+Bir port icin connect, sync, erase, program ve run adimlarini calistirir.
+Coklu port flash'lama (uart_receiver_multi.py) her port icin bir oturum acar.
+"""
+
+import time
+
+from isp_cache import device_cache_key
+from isp_catcher import ConnectCatcher
+from isp_deadline import (DEADLINE_CONNECT, DEADLINE_ERASE_ALL, DEADLINE_FIRST, DEADLINE_NEXT,
+                          DEADLINE_RESEND, DeadlineEstimator)
+from isp_erase import plan_erase
+from isp_image import clip_segments, split_segments
+from isp_journal import JOURNAL_DIR, FlashJournal
+from isp_pipeline import ImagePipeline
+from isp_packno import PACKNO_OK, PACKNO_STALE, PacketTracker, response_packno
+from isp_protocol import (BAUD_RATE, CMD_ERASE_ALL, CMD_GET_DEVICEID, CMD_RUN_APROM,
+                          CMD_SYNC_PACKNO, bytes_to_uint32, create_packet)
+from isp_recovery import RecoveryError, SegmentProgrammer
+from isp_reset import enter_bootloader
+from isp_transport import TapSerial, open_transport, port_frame_writer, read_frame
+
+# Yanit bekleme sureleri (saniye) - olcum birikene kadar ve ust sinir olarak;
+# sonrasinda isp_deadline ile olculen gecikmelerden ogrenilir
+COMMAND_TIMEOUT = 1.0  # Basit komutlar ve devam paketleri
+ERASE_TIMEOUT = 10.0  # CMD_ERASE_ALL ve ilk paket (EraseAP)
+
+SESSION_TIMEOUTS = {
+    DEADLINE_CONNECT: COMMAND_TIMEOUT,
+    DEADLINE_ERASE_ALL: ERASE_TIMEOUT,
+    DEADLINE_FIRST: ERASE_TIMEOUT,
+    DEADLINE_NEXT: COMMAND_TIMEOUT,
+    DEADLINE_RESEND: COMMAND_TIMEOUT,
+}
+
+PHASES = ("connect", "sync", "erase", "program", "run")
+
+
+class IspError(Exception):
+    """ISP oturum hatasi (hangi adimda oldugu mesajda)"""
+
+
+class IspSession:
+    """Acik bir port uzerinde sessiz ISP komutlari
+
+    Her oturumun kendi paket numarasi modeli (isp_packno.PacketTracker) ve
+    yanit suresi tahmincisi (isp_deadline.DeadlineEstimator) vardir; paketler
+    portun FrameWriter'i (isp_transport.port_frame_writer) ile yazilir.
+    Paralel oturumlarda metrikler karismaz.
+    """
+
+    def __init__(self, ser, deadlines=None):
+        self.ser = ser
+        self.writer = port_frame_writer(ser)
+        self.tracker = PacketTracker()
+        self.deadlines = deadlines or DeadlineEstimator(defaults=SESSION_TIMEOUTS)
+        self.frames = 0
+        self.recoveries = 0
+
+    def write(self, packet):
+        """Paketi paket numarasi modeline islemeden gonderir"""
+        self.writer.write(self.ser, packet)
+        self.frames += 1
+
+    def send(self, packet):
+        """Paketi yanit beklemeden gonderir, beklenen yanit paket numarasini dondurur"""
+        self.write(packet)
+        return self.tracker.sent(packet)
+
+    def transact(self, packet, command_class=DEADLINE_CONNECT):
+        """Paketi gonderir ve 64 byte yaniti dondurur
+
+        Bu komutlarin kurtarmasi yok: olculen gecikmelerden ogrenilen sure
+        (isp_deadline) dolarsa gecikme kaydedilir ve varsayilan sureye kadar
+        beklenir. Onceki komutlarin gec gelen yanitlari atlanir; paket
+        numarasi kaymasi (kayip veya fazladan islenen paket) hatadir.
+        """
+        expected = self.send(packet)
+        sent_at = time.monotonic()
+        deadline = sent_at + self.deadlines.timeout(command_class)
+        hard_deadline = sent_at + self.deadlines.hard_timeout(command_class)
+        while True:
+            response = read_frame(self.ser, max(0.0, deadline - time.monotonic()))
+            if response is None:
+                if deadline < hard_deadline:
+                    self.deadlines.expired(command_class)
+                    deadline = hard_deadline
+                    continue
+                raise IspError(f"Yanit yok (komut 0x{bytes_to_uint32(packet, 0):02X}, "
+                               f"{deadline - sent_at:.3f} s)")
+            state, frames = self.tracker.check(packet, response, expected)
+            if state == PACKNO_STALE:
+                continue
+            self.deadlines.observe(command_class, time.monotonic() - sent_at)
+            if state != PACKNO_OK:
+                raise IspError(f"Paket numarasi kaymasi (komut 0x{bytes_to_uint32(packet, 0):02X}): "
+                               f"{response_packno(response)}, beklenen {expected} "
+                               f"({frames} paket {state})")
+            return response
+
+    def catch_bootloader(self, timeout):
+        """Reset sonrasi 300 ms penceresini yakalamak icin hat hizinda CMD_CONNECT gonderir
+
+        Returns:
+            isp_catcher.CatchResult (response byte 8-11: APROM boyutu)
+        """
+        catcher = ConnectCatcher(self.ser)
+        result = catcher.catch(timeout)
+        if result is None:
+            raise IspError(f"Bootloader yakalanamadi ({timeout:g} s)")
+        self.frames += result.attempts
+        self.tracker.connected()
+        return result
+
+    def program_segment(self, address, data, verify=False, progress=None, acknowledge=None,
+                        erase_size=None, frames=None):
+        """Bir segmenti yazar (ilk paket + devam paketleri)
+
+        Hatalar isp_recovery.SegmentProgrammer ile CMD_RESEND_PACKET
+        uzerinden kurtarilir.
+        progress(offset) her onaylanan paketten sonra cagrilir.
+        acknowledge(address, ok) her yanittan sonra paketin bitis adresi ve
+        checksum'in tutup tutmadigiyla cagrilir (isp_journal).
+        erase_size: Ilk paketteki boyut (isp_erase plani), None ise veri uzunlugu
+        frames: Onceden derlenmis akis (isp_pipeline), None ise derlenir
+        """
+        programmer = SegmentProgrammer(self.ser, send=self.write, timeout=COMMAND_TIMEOUT,
+                                       first_timeout=ERASE_TIMEOUT, verify=verify,
+                                       tracker=self.tracker, deadlines=self.deadlines)
+        try:
+            programmer.program(address, data, progress, acknowledge, erase_size, frames)
+        except RecoveryError as e:
+            raise IspError(str(e))
+        finally:
+            self.recoveries += programmer.recoveries
+
+
+def flash_port(port, bin_data, connect_timeout=30.0, erase=False, sparse=False, verify=False,
+               backend="pyserial", progress=None, reset=None, journal=False,
+               resume=False, journal_dir=JOURNAL_DIR, deadlines=None, capture=None):
+    """Tek portta tam ISP oturumu calistirir
+
+    Args:
+        port: Port adi (orn. /dev/ttyACM0)
+        bin_data: Firmware imaji veya isp_pipeline.ImagePipeline (bootloader
+                  yakalanirken arka planda hazirlanan imaj; birden fazla port
+                  ayni pipeline'i paylasabilir)
+        connect_timeout: Bootloader yakalama suresi (saniye)
+        erase: CMD_ERASE_ALL gonderilsin mi (tum APROM); False ise sadece imajin
+               sayfalari ilk paketlerin EraseAP'i ile silinir (isp_erase)
+        sparse: Bos (0xFF) sayfalari atla (gonderilmez, ilk pakette silinir)
+        verify: Yanit checksum'i ile dogrula
+        backend: "pyserial" veya "termios"
+        progress: progress(port, phase, done, total) - ilerleme bildirimi
+        reset: isp_reset.ResetStrategy / SwitchStrategy - verilirse kart DTR/RTS
+               veya uygulamaya gecis komutu ile resetlenir, yoksa manuel reset beklenir
+        journal: Yazma gunlugu tut (isp_journal)
+        resume: Gunlukte ayni imaj ve cihaz icin yarida kalan yazma varsa
+                CMD_ERASE_ALL olmadan kaldigi sayfadan devam et (gunluk
+                tutmayi da acar); kayit tutmuyorsa bastan yazilir
+        journal_dir: Gunluk dizini
+        deadlines: isp_deadline.DeadlineEstimator (None: varsayilan yuzdelik);
+                   cihaz tipinin kayitli olcumleri yuklenir, sonunda kaydedilir
+        capture: Port trafigini kaydeden record(data, direction, time_ns)
+                 arayuzlu kayitci (isp_capture.CaptureWriter, isp_pcap.PcapngSink);
+                 kayitciyi cagiran kapatir
+
+    Returns:
+        dict: port, ok, error, device_id, aprom_size, catch_latency_s, resumed_from,
+              bytes, frames, recoveries, worst_gap_s, deadlines (ogrenilen zaman
+              asimlari), erase_plan (silme plani ozeti), erase_saved_s (eski
+              davranisa gore tahmini silme kazanci), phases (adim bazinda sure),
+              total (saniye)
+    """
+    result = {"port": port, "ok": False, "error": None, "device_id": None, "aprom_size": None,
+              "catch_latency_s": None, "resumed_from": None, "bytes": 0, "frames": 0,
+              "phases": {}, "total": 0.0}
+    notify = progress or (lambda *args: None)
+    start = time.monotonic()
+    phase = "open"
+    ser = None
+    session = None
+
+    def mark(name, t0):
+        result["phases"][name] = time.monotonic() - t0
+
+    try:
+        ser = open_transport(port, BAUD_RATE, backend, timeout=COMMAND_TIMEOUT, write_timeout=5)
+        if capture is not None:
+            ser = TapSerial(ser, capture)
+        session = IspSession(ser, deadlines)
+
+        phase = "connect"
+        notify(port, phase, 0, 0)
+        t0 = time.monotonic()
+        if reset is not None:
+            catch = enter_bootloader(ser, reset)
+            if catch is None:
+                raise IspError(f"Otomatik reset ile bootloader yakalanamadi ({reset})")
+            session.tracker.connected()
+        else:
+            catch = session.catch_bootloader(connect_timeout)
+        result["aprom_size"] = catch.aprom_size
+        result["catch_latency_s"] = catch.latency
+        mark(phase, t0)
+
+        image = None
+        if isinstance(bin_data, ImagePipeline):
+            # Hazirlik yakalama sirasinda bitmis olmali; bitmediyse kalani beklenir
+            phase = "image"
+            image = bin_data.result()
+            bin_data = image.data
+
+        phase = "sync"
+        notify(port, phase, 0, 0)
+        t0 = time.monotonic()
+        session.transact(create_packet(CMD_SYNC_PACKNO, 1))
+        response = session.transact(create_packet(CMD_GET_DEVICEID))
+        result["device_id"] = bytes_to_uint32(response, 8)
+        session.deadlines.attach(result["device_id"])
+        mark(phase, t0)
+
+        progress_journal = None
+        resume_address = 0
+        if journal or resume:
+            progress_journal = FlashJournal(device_cache_key(result["device_id"], port),
+                                            journal_dir)
+            digest = image.digest if image else None
+            if resume:
+                resume_address = progress_journal.resume_address(bin_data, result["device_id"],
+                                                                 digest)
+            progress_journal.begin(bin_data, result["device_id"], resume_address, digest)
+            if resume_address:
+                result["resumed_from"] = resume_address
+
+        segments = split_segments(bin_data) if sparse else [(0x00000000, bin_data)]
+        if resume_address:
+            # Kalan kisim icin yeni ilk paket: EraseAP sadece kalani siler
+            segments = clip_segments(segments, resume_address)
+        plan = plan_erase(segments, catch.aprom_size, full=erase and not resume_address,
+                          fill_gaps=sparse, baseline_full=not resume_address)
+        result["erase_plan"] = plan.summary()
+        result["erase_saved_s"] = plan.saved_time()
+
+        phase = "erase"
+        t0 = time.monotonic()
+        if plan.erase_all:
+            notify(port, phase, 0, 0)
+            session.transact(create_packet(CMD_ERASE_ALL), DEADLINE_ERASE_ALL)
+        mark(phase, t0)
+
+        phase = "program"
+        t0 = time.monotonic()
+        acknowledge = progress_journal.acknowledge if progress_journal else None
+        total = sum(len(data) for _, data in segments)
+        done = 0
+        for address, data, erase_size in plan.segments:
+            def segment_progress(offset, base=done):
+                notify(port, phase, base + offset, total)
+            frames = image.stream(address, data, erase_size) if image else None
+            session.program_segment(address, data, verify, segment_progress, acknowledge,
+                                    erase_size, frames)
+            done += len(data)
+            notify(port, phase, done, total)
+        result["bytes"] = done
+        mark(phase, t0)
+
+        phase = "run"
+        t0 = time.monotonic()
+        # CMD_RUN_APROM yanitsiz: bootloader hemen NVIC_SystemReset() yapar
+        session.send(create_packet(CMD_RUN_APROM))
+        mark(phase, t0)
+        if progress_journal:
+            progress_journal.clear()
+
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{phase}: {e}"
+    finally:
+        if ser is not None:
+            try:
+                ser.close()
+            except Exception:
+                pass
+        result["total"] = time.monotonic() - start
+        if session is not None:
+            result["frames"] = session.frames
+            result["recoveries"] = session.recoveries
+            result["worst_gap_s"] = session.writer.worst_gap
+            result["deadlines"] = session.deadlines.summary()
+            session.deadlines.save()
+        notify(port, "done" if result["ok"] else "failed", 0, 0)
+
+    return result
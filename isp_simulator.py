@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP Bootloader Simulatoru (pty uzerinde)
+ISP_UART bootloader'inin (main.c, uart_transfer.c, isp_user.c ParseCmd,
+fmc_user.c EraseAP/WriteData) host tarafindan gorulen davranisini taklit eder.
+Kart ve manuel reset olmadan araclari test/benchmark etmek icin.
+
+Modellenen davranislar:
+- 64 byte paket, UART RX FIFO (14 byte tetik seviyesi) ve RX timeout
+  (0x40 bit sure bosluk -> g_u8bufhead = 0, yarim paket atilir)
+- Reset sonrasi 300 ms CMD_CONNECT penceresi (sonra APROM'a gecis)
+- ParseCmd birebir: u32Gcmd, paket numarasi (+2 adim), CMD_RESEND_PACKET,
+  EraseAP (bank/blok/sayfa), WriteData sonrasi ReadData ile geri okunan
+  buffer uzerinden checksum, CMD_RUN_APROM yanitsiz reset
+- Baud hizinda hat suresi ve flash silme/yazma sureleri
+- Istege bagli: uygulamanin 0x42 gecis komutu ile NVIC_SystemReset()
+  yapmasi (application_bootloader_switch.c)
+
+Kullanim:
+    python3 isp_simulator.py [--baud=115200] [--link=/tmp/ttyISP] [--no-pace]
+                             [--switch=50] (uygulama 0x42 ile 50 ms sonra resetlenir)
+    (Enter: reset, Ctrl+C: cikis)
+"""
+
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import tty
+
+# isp_user.h
+CMD_UPDATE_APROM = 0x000000A0
+CMD_UPDATE_CONFIG = 0x000000A1
+CMD_READ_CONFIG = 0x000000A2
+CMD_ERASE_ALL = 0x000000A3
+CMD_SYNC_PACKNO = 0x000000A4
+CMD_GET_FWVER = 0x000000A6
+CMD_RUN_APROM = 0x000000AB
+CMD_CONNECT = 0x000000AE
+CMD_GET_DEVICEID = 0x000000B1
+CMD_UPDATE_DATAFLASH = 0x000000C3
+CMD_RESEND_PACKET = 0x000000FF
+FW_VERSION = 0x32
+
+# application_bootloader_switch.c
+CMD_SWITCH_TO_BOOTLOADER = 0x42
+
+MAX_PKT_SIZE = 64
+RX_FIFO_TRIGGER = 14  # UART_FIFO_RFITL_14BYTES
+TX_FIFO_SIZE = 16
+RX_TIMEOUT_BITS = 0x40  # UART0->TOUT
+
+# M261/M263 flash yerlesimi
+FMC_FLASH_PAGE_SIZE = 0x800
+FMC_BLOCK_SIZE = FMC_FLASH_PAGE_SIZE * 4
+FMC_BANK_SIZE = 0x40000
+FMC_CONFIG_BASE = 0x00300000
+DEFAULT_APROM_SIZE = 512 * 1024
+DEFAULT_PDID = 0x00D26300  # Ornek deger
+
+# Varsayilan sureler (saniye) - karta gore ayarlanabilir
+CONNECT_WINDOW = 0.3  # main.c: SysTick 300 ms
+ERASE_OP_TIME = 0.02  # Sayfa/blok/bank silme komutu basina
+PROGRAM_WORD_TIME = 40e-6  # 32-bit kelime yazma basina
+PARSE_OVERHEAD = 50e-6  # ParseCmd + config okuma
+
+# pty uzerinde thread zamanlamasi 0.5 ms'lik RX timeout'tan daha titrek
+# olabilir; varsayilan olarak timeout bu degerin altina inmez (0: birebir)
+RX_TIMEOUT_FLOOR = 0.002
+
+# Durumlar
+STATE_BOOT = "boot"  # Reset sonrasi CMD_CONNECT bekleniyor
+STATE_ISP = "isp"  # ParseCmd dongusu
+STATE_APROM = "aprom"  # Uygulama calisiyor (girdi yok sayilir)
+
+
+def inpw(buf, offset):
+    return struct.unpack_from('<I', buf, offset)[0]
+
+
+def outpw(buf, offset, value):
+    struct.pack_into('<I', buf, offset, value & 0xFFFFFFFF)
+
+
+class BootloaderSimulator:
+    """pty uzerinde ISP_UART bootloader simulatoru
+
+    Ornek:
+        sim = BootloaderSimulator()
+        port = sim.start()        # /dev/pts/N
+        ...  araclar port'a baglanir ...
+        sim.stop()
+        sim.aprom[:len(fw)] == fw
+
+    Hata enjeksiyonu:
+        corrupt_frames: Bu siradaki (1'den baslayan) paketlerde yazilan
+                        verinin ilk byte'i bozulur (checksum uyusmaz)
+        drop_frames: Bu siradaki paketler islenir ama yanit verilmez (yanit kaybi)
+        lose_frames: Bu siradaki paketler hic islenmez (hatta bozulup RX
+                     timeout ile atilmis paket)
+        delay_frames: {sira: saniye} - yanit bu kadar gecikmeli gonderilir
+
+    switch_latency: None degilse uygulama CMD_SWITCH_TO_BOOTLOADER byte'ini
+                    aldiktan bu kadar sure sonra (CheckBootloaderSwitch()
+                    cagrilma araligi) kendini resetler; arada gelen byte'lar
+                    uygulamaya gider.
+
+    trace=True ise her islenen paket icin self.trace'e
+    (ilk byte gelis, yanit bitis, komut) zamanlari eklenir (time.monotonic).
+    """
+
+    def __init__(self, aprom_size=DEFAULT_APROM_SIZE, dataflash_addr=None, pdid=DEFAULT_PDID,
+                 baudrate=115200, pace=True, connect_window=CONNECT_WINDOW,
+                 erase_op_time=ERASE_OP_TIME, program_word_time=PROGRAM_WORD_TIME,
+                 parse_overhead=PARSE_OVERHEAD, rx_timeout_floor=RX_TIMEOUT_FLOOR,
+                 corrupt_frames=(), drop_frames=(), lose_frames=(), delay_frames=None,
+                 switch_latency=None, trace=False):
+        self.aprom_size = aprom_size
+        self.aprom = bytearray(b'\xff' * aprom_size)
+        self.config = bytearray(b'\xff' * 16)
+        self.pdid = pdid
+        self.baudrate = baudrate
+        self.pace = pace
+        self.connect_window = connect_window
+        self.erase_op_time = erase_op_time
+        self.program_word_time = program_word_time
+        self.parse_overhead = parse_overhead
+        self.rx_timeout = max(RX_TIMEOUT_BITS / float(baudrate), rx_timeout_floor)
+        self.corrupt_frames = set(corrupt_frames)
+        self.drop_frames = set(drop_frames)
+        self.lose_frames = set(lose_frames)
+        self.delay_frames = dict(delay_frames or {})
+        self.switch_latency = switch_latency
+        self.trace = [] if trace else None
+
+        # main.c: g_u32DataFlashAddr = SCU->FNSADDR, APROM icindeyse data flash var
+        self.dataflash_addr = aprom_size if dataflash_addr is None else dataflash_addr
+        self.dataflash_size = max(0, aprom_size - self.dataflash_addr)
+
+        # ParseCmd static degiskenleri
+        self._start_address = 0
+        self._total_len = 0
+        self._last_data_len = 0
+        self._pack_no = 1
+        self._gcmd = 0
+
+        # uart_transfer.c
+        self._rcvbuf = bytearray(MAX_PKT_SIZE)
+        self._bufhead = 0
+        self._rx_line_until = 0.0
+        self._rx_now = 0.0
+        self._frame_arrival = 0.0
+
+        self.state = STATE_BOOT
+        self._boot_deadline = 0.0
+        self._switch_at = None
+        self._busy = 0.0  # Bu paketteki flash islem suresi
+
+        # Istatistikler
+        self.frames = 0
+        self.dropped_partial = 0
+        self.erase_ops = 0
+        self.programmed_bytes = 0
+        self.resets = 0
+        self.log = []
+
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    # --- pty / thread ---
+
+    def start(self):
+        """pty olusturur, simulatoru baslatir ve slave port adini dondurur"""
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self.reset()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def reset(self):
+        """Karti resetler (reset butonu): 300 ms CMD_CONNECT penceresi baslar"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.state = STATE_BOOT
+        self._boot_deadline = time.monotonic() + self.connect_window
+        self._bufhead = 0
+        self._pack_no = 1
+        self._gcmd = 0
+        self._switch_at = None
+        self.resets += 1
+
+    def _byte_time(self):
+        return 10.0 / self.baudrate if self.pace else 0.0  # 8N1
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                readable, _, _ = select.select([self._master], [], [], 0.01)
+            except (OSError, ValueError):
+                return
+            with self._lock:
+                if self._switch_at is not None and time.monotonic() >= self._switch_at:
+                    # SwitchToBootloader(): NVIC_SystemReset()
+                    self._reset()
+                    self.log.append(("boot", "switch"))
+                if self.state == STATE_BOOT and time.monotonic() >= self._boot_deadline:
+                    # SysTick time-out: APROM'a gec
+                    self.state = STATE_APROM
+                    self.log.append(("aprom", "timeout"))
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            with self._lock:
+                self._receive(data, time.monotonic())
+
+    # --- UART alici (uart_transfer.c UART0_IRQHandler) ---
+
+    def _receive(self, data, now):
+        byte_time = self._byte_time()
+        # Hat bosta kaldigi sure: onceki byte'larin hatta bittigi andan bu yana
+        gap = now - self._rx_line_until
+        if self._bufhead and gap > self.rx_timeout:
+            # RXTOIF: yarim paket atilir
+            self._bufhead = 0
+            self.dropped_partial += 1
+            self.log.append(("rx_timeout", gap))
+        self._rx_line_until = max(now, self._rx_line_until) + len(data) * byte_time
+        self._rx_now = now
+
+        if self.state == STATE_APROM:
+            self.on_aprom_data(data)
+            return
+
+        for i in range(0, len(data), RX_FIFO_TRIGGER):
+            self._irq(data[i:i+RX_FIFO_TRIGGER])
+
+    def _irq(self, chunk):
+        """FIFO'dan okunan byte'lar; paket tamamlaninca islenir"""
+        for offset, byte in enumerate(chunk):
+            if self._bufhead == 0:
+                self._frame_arrival = self._rx_now
+            self._rcvbuf[self._bufhead] = byte
+            self._bufhead += 1
+            if self._bufhead == MAX_PKT_SIZE:
+                self._bufhead = 0
+                if self.state == STATE_ISP:
+                    self._frame_ready(bytes(self._rcvbuf))
+                    if self.state != STATE_ISP:
+                        # CMD_RUN_APROM: kalan byte'lar uygulamaya gider
+                        self.on_aprom_data(chunk[offset+1:])
+                        return
+
+        if self.state == STATE_BOOT and self._bufhead >= 4:
+            # main.c: ilk kelime CMD_CONNECT ise ISP'ye gir, degilse buffer sifirlanir
+            if inpw(self._rcvbuf, 0) == CMD_CONNECT:
+                self.state = STATE_ISP
+                self.log.append(("isp", "connect"))
+            else:
+                self._bufhead = 0
+
+    def _frame_ready(self, frame):
+        self.frames += 1
+        frame_no = self.frames
+        arrival = self._frame_arrival
+        if frame_no in self.lose_frames:
+            self.log.append(("lost", frame_no))
+            return
+        # Paketin son byte'i hatta bitene kadar bootloader onu goremez
+        self._sleep_until(self._rx_line_until)
+
+        self._busy = self.parse_overhead
+        buffer = bytearray(frame)
+        response = self.parse_cmd(buffer, frame_no)
+        self._sleep(self._busy)
+        if frame_no in self.delay_frames:
+            time.sleep(self.delay_frames[frame_no])
+
+        if response is not None and frame_no not in self.drop_frames:
+            self._put_string(response)
+        if self.trace is not None:
+            self.trace.append((arrival, time.monotonic(), inpw(frame, 0)))
+
+    def _put_string(self, response):
+        """PutString(): yanit TX FIFO uzerinden baud hizinda gonderilir"""
+        byte_time = self._byte_time()
+        start = time.monotonic()
+        for i in range(0, MAX_PKT_SIZE, TX_FIFO_SIZE):
+            try:
+                os.write(self._master, response[i:i+TX_FIFO_SIZE])
+            except OSError:
+                return
+            self._sleep_until(start + (i + TX_FIFO_SIZE) * byte_time)
+
+    def _sleep(self, duration):
+        if self.pace and duration > 0:
+            time.sleep(duration)
+
+    def _sleep_until(self, deadline):
+        if self.pace:
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def on_aprom_data(self, data):
+        """Uygulama calisirken gelen byte'lar (varsayilan: gecis komutu disinda yok sayilir)"""
+        if (self.switch_latency is not None and self._switch_at is None
+                and CMD_SWITCH_TO_BOOTLOADER in data):
+            self._switch_at = self._rx_now + self.switch_latency
+
+    # --- flash (fmc_user.c) ---
+
+    def _in_aprom(self, address):
+        return 0 <= address < self.aprom_size
+
+    def _erase_page(self, address):
+        if self._in_aprom(address):
+            page = address - (address % FMC_FLASH_PAGE_SIZE)
+            self.aprom[page:page+FMC_FLASH_PAGE_SIZE] = b'\xff' * FMC_FLASH_PAGE_SIZE
+
+    def erase_ap(self, addr_start, size):
+        """EraseAP(): bank/blok/sayfa silme
+
+        NOT: size sayfa kati degilse orijinal kodda 'size -= u32Size'
+        unsigned tasar; silme APROM sonuna (ISPFF hatasi) kadar devam eder.
+        """
+        address = addr_start
+        size &= 0xFFFFFFFF
+        while size > 0:
+            if size >= FMC_BANK_SIZE and not (address & (FMC_BANK_SIZE - 1)):
+                op_size = FMC_BANK_SIZE
+            elif size >= FMC_BLOCK_SIZE and not (address & (FMC_BLOCK_SIZE - 1)):
+                op_size = FMC_BLOCK_SIZE
+            else:
+                op_size = FMC_FLASH_PAGE_SIZE
+            if not self._in_aprom(address):
+                return -1  # ISPFF
+            end = min(address + op_size, self.aprom_size)
+            self.aprom[address:end] = b'\xff' * (end - address)
+            self.erase_ops += 1
+            self._busy += self.erase_op_time
+            self.log.append(("erase", address, op_size))
+            address += op_size
+            size = (size - op_size) & 0xFFFFFFFF
+        return 0
+
+    def write_data(self, addr_start, addr_end, buf, offset):
+        """WriteData(): 32-bit kelime kelime programlama (bitler sadece 1->0)"""
+        address = addr_start
+        while address < addr_end:
+            if not self._in_aprom(address):
+                return
+            word = buf[offset:offset+4]
+            for i, byte in enumerate(word):
+                if self._in_aprom(address + i):
+                    self.aprom[address + i] &= byte
+            self.programmed_bytes += 4
+            self._busy += self.program_word_time
+            address += 4
+            offset += 4
+
+    def read_data(self, addr_start, addr_end, buf, offset):
+        """ReadData(): kelime kelime okuma (APROM disi okuma hata, buffer degismez)"""
+        address = addr_start
+        while address < addr_end:
+            if not self._in_aprom(address):
+                return
+            n = min(4, len(buf) - offset)
+            buf[offset:offset+n] = self.aprom[address:address+n]
+            address += 4
+            offset += 4
+
+    # --- ParseCmd (isp_user.c) ---
+
+    def parse_cmd(self, buffer, frame_no=0):
+        """ParseCmd() birebir; yanit (64 byte) veya None (CMD_RUN_APROM) dondurur
+
+        buffer yerinde degistirilir (WriteData sonrasi geri okunan veri),
+        checksum bu buffer uzerinden hesaplanir.
+        """
+        response = bytearray(MAX_PKT_SIZE)
+        src = 8
+        srclen = len(buffer) - 8
+        lcmd = inpw(buffer, 0)
+
+        response[8:24] = self.config  # ReadData(Config0, Config0 + 16, ...)
+
+        if lcmd == CMD_SYNC_PACKNO:
+            self._pack_no = inpw(buffer, src)
+
+        if lcmd and lcmd != CMD_RESEND_PACKET:
+            self._gcmd = lcmd
+
+        skip_write = False
+        if lcmd == CMD_GET_FWVER:
+            response[8] = FW_VERSION
+        elif lcmd == CMD_GET_DEVICEID:
+            outpw(response, 8, self.pdid)
+            skip_write = True
+        elif lcmd == CMD_RUN_APROM:
+            self.state = STATE_APROM
+            self.log.append(("aprom", "run"))
+            return None
+        elif lcmd == CMD_CONNECT:
+            self._pack_no = 1
+            outpw(response, 8, self.aprom_size)
+            outpw(response, 12, self.dataflash_addr)
+            skip_write = True
+        elif lcmd == CMD_ERASE_ALL:
+            self.erase_ap(0, self.aprom_size)
+
+        if skip_write:
+            pass
+        elif lcmd in (CMD_UPDATE_APROM, CMD_UPDATE_DATAFLASH):
+            if lcmd == CMD_UPDATE_DATAFLASH:
+                self._start_address = self.dataflash_addr
+                if self.dataflash_size:
+                    self.erase_ap(self.dataflash_addr, self.dataflash_size)
+                else:
+                    skip_write = True
+            else:
+                self._start_address = inpw(buffer, src)
+                self._total_len = inpw(buffer, src + 4)
+                self.erase_ap(self._start_address, self._total_len)
+
+            if not skip_write:
+                self._total_len = inpw(buffer, src + 4)
+                src += 8
+                srclen -= 8
+        elif lcmd == CMD_UPDATE_CONFIG:
+            self.config[:] = buffer[src:src+16]
+            response[8:24] = self.config
+            skip_write = True
+        elif lcmd == CMD_RESEND_PACKET:
+            self._resend()
+            skip_write = True
+
+        if not skip_write and self._gcmd in (CMD_UPDATE_APROM, CMD_UPDATE_DATAFLASH):
+            if self._total_len < srclen:
+                srclen = self._total_len  # Son paket fazlasini yazmasin
+            self._total_len -= srclen
+            end = self._start_address + srclen
+            if frame_no in self.corrupt_frames and srclen:
+                buffer[src] ^= 0x55  # Hatali yazma
+            self.write_data(self._start_address, end, buffer, src)
+            buffer[src:src+srclen] = bytes(srclen)  # memset(pu8Src, 0, u32srclen)
+            self.read_data(self._start_address, end, buffer, src)
+            self._start_address = end
+            self._last_data_len = srclen
+
+        # out:
+        struct.pack_into('<H', response, 0, sum(buffer) & 0xFFFF)
+        self._pack_no = (self._pack_no + 1) & 0xFFFFFFFF
+        outpw(response, 4, self._pack_no)
+        self._pack_no = (self._pack_no + 1) & 0xFFFFFFFF
+        return bytes(response)
+
+    def _resend(self):
+        """CMD_RESEND_PACKET: son paketin sayfasi geri okunup silinir ve tekrar yazilir"""
+        self._start_address -= self._last_data_len
+        self._total_len += self._last_data_len
+        page_address = self._start_address & (0x100000 - FMC_FLASH_PAGE_SIZE)
+        if page_address >= FMC_CONFIG_BASE:
+            return
+
+        saved = bytearray(self._start_address - page_address)
+        self.read_data(page_address, self._start_address, saved, 0)
+        self._erase_page(page_address)
+        self.erase_ops += 1
+        self._busy += self.erase_op_time
+        self.write_data(page_address, self._start_address, saved, 0)
+
+        if (self._start_address % FMC_FLASH_PAGE_SIZE) >= (FMC_FLASH_PAGE_SIZE - self._last_data_len):
+            self._erase_page(page_address + FMC_FLASH_PAGE_SIZE)
+            self.erase_ops += 1
+            self._busy += self.erase_op_time
+        self.log.append(("resend", self._start_address))
+
+
+def main():
+    baud = 115200
+    link = None
+    switch_latency = None
+    pace = '--no-pace' not in sys.argv
+    for arg in sys.argv[1:]:
+        if arg.startswith('--baud='):
+            baud = int(arg.split('=', 1)[1])
+        elif arg.startswith('--link='):
+            link = arg.split('=', 1)[1]
+        elif arg.startswith('--switch='):
+            switch_latency = float(arg.split('=', 1)[1]) / 1000.0
+
+    sim = BootloaderSimulator(baudrate=baud, pace=pace, switch_latency=switch_latency)
+    port = sim.start()
+    if link:
+        if os.path.islink(link):
+            os.remove(link)
+        os.symlink(port, link)
+
+    print("=" * 60)
+    print("Nuvoton ISP Bootloader Simulatoru")
+    print("=" * 60)
+    print(f"Port: {port}" + (f" ({link})" if link else ""))
+    print(f"Baud: {baud}, hat zamanlamasi: {'acik' if pace else 'kapali'}")
+    print("Enter: reset (300 ms CMD_CONNECT penceresi), Ctrl+C: cikis\n")
+
+    try:
+        while True:
+            sys.stdin.readline()
+            sim.reset()
+            print(f"[RESET] durum: {sim.state}, paket: {sim.frames}, "
+                  f"RX timeout: {sim.dropped_partial}, silme: {sim.erase_ops}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+        if link and os.path.islink(link):
+            os.remove(link)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP - Serial aktarim yardimcilari
+64 byte paketleri polling ve chunk'lara bolme olmadan okur/yazar
+"""
+
+import os
+import select
+import threading
+import time
+import weakref
+
+from isp_capture import DIR_RX, DIR_TX
+from isp_protocol import MAX_PKT_SIZE
+
+try:
+    from serial import SerialException, SerialTimeoutException
+except ImportError:  # pyserial yoksa da kullanilabilsin
+    SerialException = OSError
+    SerialTimeoutException = OSError
+
+
+def _port_fileno(ser):
+    """Port'un dosya tanimlayicisini dondurur (yoksa None - orn. Windows)"""
+    try:
+        return ser.fileno()
+    except Exception:
+        # fileno() yok veya desteklenmiyor (pyserial: SerialException)
+        return None
+
+
+def read_frame(ser, timeout=1.0, size=MAX_PKT_SIZE):
+    """64 byte paketi okur, son byte geldigi anda doner
+
+    POSIX'te port fd'si uzerinde select() ile beklenir; veri gelene kadar
+    thread kernel'de uyur, polling gecikmesi (sleep 1-10 ms) olmaz.
+    fd yoksa pyserial'in kendi bloklayan read()'i kalan sure ile cagrilir.
+
+    Args:
+        ser: Serial port nesnesi (pyserial veya ayni arayuze sahip nesne)
+        timeout: Saniye cinsinden toplam sure, None ise suresiz bekler
+        size: Beklenen paket boyutu
+
+    Returns:
+        bytes: size byte paket, sure dolarsa None
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    fd = _port_fileno(ser)
+    response = bytearray()
+
+    while len(response) < size:
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+
+        if fd is not None:
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                return None
+            data = os.read(fd, size - len(response))
+            if not data:
+                # Port kapandi (USB cikarildi vb.)
+                return None
+        else:
+            old_timeout = ser.timeout
+            ser.timeout = remaining
+            try:
+                data = ser.read(size - len(response))
+            finally:
+                ser.timeout = old_timeout
+
+        response.extend(data)
+
+    return bytes(response)
+
+
+# Bootloader RX timeout: UART0->TOUT = 0x40 bit suresi (uart_transfer.c)
+# Bu sureden uzun bir bosluk g_u8bufhead'i sifirlar ve paket kaybolur
+RX_TIMEOUT_BITS = 0x40
+
+
+def rx_timeout(baudrate):
+    """Bootloader'in RX timeout suresini (saniye) dondurur"""
+    return RX_TIMEOUT_BITS / float(baudrate)
+
+
+class FrameWriter:
+    """64 byte paketi tek yazma ile gonderen yazici (port basina bir tane)
+
+    Test byte'i, chunk'lara bolme veya aradaki sleep yok: paket kernel'e
+    tek seferde verilir, UART surucusu byte'lari bosluksuz gonderir.
+    Yazma kismi kalirsa (tx buffer dolu) kalan kisim hemen yazilir ve
+    hostun olusturdugu bosluk olculur.
+
+    Olculen iki sure vardir:
+    - worst_gap: Paket ICI bosluk. Ayni paketin kismi os.write() cagrilari
+      arasinda, onceki parcanin hatta bitecegi an ile sonraki cagrinin
+      zamani arasindaki fark (pozitifse). Sadece bu deger RX timeout'u
+      (0x40 bit) asarsa bootloader paketi sessizce atar. Port fd'si yoksa
+      (pyserial fileno'suz, TapSerial) paket tek ser.write() ile verilir
+      ve bu deger olculemez (0 kalir).
+    - idle: Paketler ARASI bosluk. Onceki paketin hatta bitmesinden (tahmini)
+      bu paketin write() cagrisina kadar gecen sure: yanit beklemesi, yanit
+      isleme ve write() oncesi host gecikmeleri (sleep vb.) dahildir. Paketi
+      bozmaz ama hizi belirler; ortalamasi yanit suresinden (115200'de
+      ~6 ms) cok buyukse host paketler arasinda bekliyordur.
+
+    Istatistikler paylasilmasin diye her port (veya oturum) kendi yazicisini
+    kullanir: port_frame_writer(ser).
+    """
+
+    def __init__(self, drain=True):
+        self.drain = drain
+        self.frames = 0
+        self.write_calls = 0
+        self.split_frames = 0
+        self.worst_gap = 0.0
+        self.idle = 0.0
+        self.idle_frames = 0
+        self.baudrate = None
+        self._line_free_at = None  # Onceki paketin hatta bitis ani (perf_counter)
+
+    def write(self, ser, frame):
+        """Paketi yazar, yazilan byte sayisini dondurur"""
+        if len(frame) != MAX_PKT_SIZE:
+            raise ValueError(f"Paket boyutu {len(frame)} byte, {MAX_PKT_SIZE} byte olmali")
+
+        baudrate = getattr(ser, "baudrate", None) or 115200
+        self.baudrate = baudrate
+        byte_time = 10.0 / baudrate  # 8N1
+        fd = _port_fileno(ser)
+
+        start = time.perf_counter()
+        if self._line_free_at is not None and start > self._line_free_at:
+            self.idle += start - self._line_free_at
+            self.idle_frames += 1
+
+        if fd is None:
+            written = ser.write(frame)
+            self.write_calls += 1
+            line_busy_until = start + len(frame) * byte_time
+        else:
+            data = memoryview(frame).cast("B")
+            written = 0
+            calls = 0
+            line_busy_until = None
+            while written < len(data):
+                _, ready, _ = select.select([], [fd], [], getattr(ser, "write_timeout", None))
+                if not ready:
+                    raise SerialTimeoutException("Yazma zaman asimi")
+                now = time.perf_counter()
+                if line_busy_until is not None:
+                    self.worst_gap = max(self.worst_gap, now - line_busy_until)
+                try:
+                    n = os.write(fd, data[written:])
+                except BlockingIOError:
+                    continue
+                calls += 1
+                written += n
+                line_busy_until = max(line_busy_until or now, now) + n * byte_time
+            self.write_calls += calls
+            if calls > 1:
+                self.split_frames += 1
+
+        if self.drain:
+            ser.flush()
+        self.frames += 1
+        self._line_free_at = line_busy_until
+        return written
+
+    def stats(self):
+        """Olculen metrikleri dondurur"""
+        return {
+            "frames": self.frames,
+            "write_calls": self.write_calls,
+            "split_frames": self.split_frames,
+            "worst_gap_s": self.worst_gap,
+            "mean_idle_s": self.idle / self.idle_frames if self.idle_frames else 0.0,
+            "rx_timeout_s": rx_timeout(self.baudrate or 115200),
+        }
+
+    def summary(self):
+        """Tek satirlik ozet"""
+        s = self.stats()
+        return (f"{s['frames']} frame, {s['write_calls']} write, {s['split_frames']} bolunmus, "
+                f"paket ici en kotu bosluk {s['worst_gap_s']*1e6:.0f} us "
+                f"(RX timeout {s['rx_timeout_s']*1e6:.0f} us), "
+                f"paketler arasi ort. {s['mean_idle_s']*1e3:.1f} ms")
+
+
+# Port nesnesi -> FrameWriter (port kapatilip birakilinca kayit da silinir)
+_port_writers = weakref.WeakKeyDictionary()
+_port_writers_lock = threading.Lock()
+
+
+def port_frame_writer(ser):
+    """Portun FrameWriter'ini dondurur (ilk kullanimda olusturulur)
+
+    Ayni port nesnesini kullanan araclar (ConnectCatcher, send_packet,
+    SegmentProgrammer) ayni yaziciyi paylasir; farkli portlar/thread'ler
+    (uart_receiver_multi, isp_async) birbirinin metriklerini gormez.
+    """
+    with _port_writers_lock:
+        writer = _port_writers.get(ser)
+        if writer is None:
+            writer = _port_writers[ser] = FrameWriter()
+        return writer
+
+
+def write_frame(ser, frame):
+    """64 byte paketi portun FrameWriter'i ile tek yazma olarak gonderir"""
+    return port_frame_writer(ser).write(ser, frame)
+
+
+# ---------------------------------------------------------------------------
+# Linux termios aktarimi (pyserial yerine, opsiyonel)
+# ---------------------------------------------------------------------------
+
+
+class TermiosSerial:
+    """Ham (raw) termios ile acilan seri port - pyserial Serial arayuzu
+
+    Port VMIN=64 ile acilir: kernel read() cagrisini 64 byte gelene kadar
+    (veya byte'lar arasi VTIME suresi dolana kadar) bloklar. Boylece bir
+    64 byte paket her yonde tek os.read()/os.write() ile aktarilir.
+    Toplam okuma suresi (timeout) select() ile uygulanir; VTIME sadece
+    byte'lar arasi bosluk icindir (0.1 s birim).
+
+    Araclarin kullandigi pyserial alt kumesini destekler: read, write, flush,
+    in_waiting, out_waiting, reset_input_buffer, reset_output_buffer,
+    setDTR/setRTS, open/close, is_open, readable/writable, fileno.
+    """
+
+    def __init__(self, port=None, baudrate=115200, timeout=None, write_timeout=None,
+                 vmin=MAX_PKT_SIZE, vtime=1, **kwargs):
+        # kwargs: rtscts/dsrdtr/xonxoff gibi pyserial parametreleri (hepsi kapali)
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.vmin = vmin
+        self.vtime = vtime
+        self.fd = None
+        self._owns_fd = True
+        if port is not None:
+            self.open()
+
+    @classmethod
+    def from_fd(cls, fd, baudrate=115200, timeout=None, write_timeout=None,
+                vmin=MAX_PKT_SIZE, vtime=1):
+        """Acik bir fd'den (orn. pty slave) transport olusturur - test icin"""
+        ser = cls(None, baudrate, timeout, write_timeout, vmin, vtime)
+        ser.fd = fd
+        ser._owns_fd = False
+        ser._configure()
+        return ser
+
+    # --- port yonetimi ---
+
+    def open(self):
+        """Portu acar ve raw moda alir"""
+        try:
+            self.fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        except FileNotFoundError:
+            raise
+        except OSError as e:
+            raise SerialException(f"Port acilamadi: {self.port}: {e}")
+        self._owns_fd = True
+        try:
+            self._configure()
+        except Exception:
+            os.close(self.fd)
+            self.fd = None
+            raise
+
+    def _configure(self):
+        import fcntl
+        import termios
+
+        # Bloklayan moda gec (zamanlama select/VMIN/VTIME ile yapiliyor)
+        flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
+        fcntl.fcntl(self.fd, fcntl.F_SETFL, flags & ~os.O_NONBLOCK)
+
+        speed = getattr(termios, f"B{self.baudrate}", None)
+        if speed is None:
+            raise ValueError(f"Desteklenmeyen baud rate: {self.baudrate}")
+
+        iflag, oflag, cflag, lflag, ispeed, ospeed, cc = termios.tcgetattr(self.fd)
+        # Ham mod: 8N1, akis kontrolu yok, satir isleme/echo yok
+        iflag = 0
+        oflag = 0
+        cflag = termios.CS8 | termios.CREAD | termios.CLOCAL
+        lflag = 0
+        cc[termios.VMIN] = self.vmin
+        cc[termios.VTIME] = self.vtime
+        termios.tcsetattr(self.fd, termios.TCSANOW,
+                          [iflag, oflag, cflag, lflag, speed, speed, cc])
+        termios.tcflush(self.fd, termios.TCIOFLUSH)
+
+    def close(self):
+        if self.fd is not None:
+            if self._owns_fd:
+                os.close(self.fd)
+            self.fd = None
+
+    @property
+    def is_open(self):
+        return self.fd is not None
+
+    def readable(self):
+        return self.is_open
+
+    def writable(self):
+        return self.is_open
+
+    def fileno(self):
+        if self.fd is None:
+            raise SerialException("Port kapali")
+        return self.fd
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # --- veri aktarimi ---
+
+    def read(self, size=1):
+        """size byte okur; timeout dolarsa o ana kadar gelenleri dondurur"""
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        data = bytearray()
+        while len(data) < size:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self.fileno()], [], [], remaining)
+            if not readable:
+                break
+            chunk = os.read(self.fd, size - len(data))
+            if not chunk:
+                raise SerialException("Port baglantisi koptu")
+            data.extend(chunk)
+        return bytes(data)
+
+    def write(self, data):
+        """Verinin tamamini yazar (normalde tek os.write cagrisi)"""
+        data = memoryview(data).cast("B")
+        deadline = None if self.write_timeout is None else time.monotonic() + self.write_timeout
+        written = 0
+        while written < len(data):
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            _, ready, _ = select.select([], [self.fileno()], [], remaining)
+            if not ready:
+                raise SerialTimeoutException("Yazma zaman asimi")
+            written += os.write(self.fd, data[written:])
+        return written
+
+    def flush(self):
+        """Cikis buffer'i hatta gidene kadar bekler (tcdrain)"""
+        import termios
+        termios.tcdrain(self.fileno())
+
+    @property
+    def in_waiting(self):
+        import fcntl
+        import struct
+        import termios
+        buf = fcntl.ioctl(self.fileno(), termios.FIONREAD, b"\0\0\0\0")
+        return struct.unpack("I", buf)[0]
+
+    @property
+    def out_waiting(self):
+        import fcntl
+        import struct
+        import termios
+        buf = fcntl.ioctl(self.fileno(), termios.TIOCOUTQ, b"\0\0\0\0")
+        return struct.unpack("I", buf)[0]
+
+    def reset_input_buffer(self):
+        import termios
+        termios.tcflush(self.fileno(), termios.TCIFLUSH)
+
+    def reset_output_buffer(self):
+        import termios
+        termios.tcflush(self.fileno(), termios.TCOFLUSH)
+
+    # --- modem hatlari ---
+
+    def _set_modem_line(self, bit, level):
+        import fcntl
+        import struct
+        import termios
+        request = termios.TIOCMBIS if level else termios.TIOCMBIC
+        fcntl.ioctl(self.fileno(), request, struct.pack("I", bit))
+
+    def setDTR(self, level=True):
+        import termios
+        self._set_modem_line(termios.TIOCM_DTR, level)
+
+    def setRTS(self, level=True):
+        import termios
+        self._set_modem_line(termios.TIOCM_RTS, level)
+
+
+# ---------------------------------------------------------------------------
+# Trafik kaydi (isp_capture / isp_pcap)
+# ---------------------------------------------------------------------------
+
+class TapSerial:
+    """Okunan/yazilan her byte'i bir kayitciya da veren seri port sarmalayici
+
+    capture.record(data, direction, time_ns) arayuzlu herhangi bir kayitci
+    kullanilabilir (isp_capture.CaptureWriter, isp_pcap.PcapngSink).
+    fileno() bilerek desteklenmez: read_frame, FrameWriter ve ConnectCatcher
+    fd yerine read()/write() yoluna duser, boylece tum trafik buradan gecer.
+    Diger nitelikler (baudrate, in_waiting, reset_input_buffer...) alttaki
+    porta yonlendirilir.
+    """
+
+    def __init__(self, ser, capture):
+        self.__dict__["_ser"] = ser
+        self.__dict__["capture"] = capture
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+    def __setattr__(self, name, value):
+        # timeout gibi ayarlar alttaki porta yazilir (read_frame timeout'u degistirir)
+        setattr(self._ser, name, value)
+
+    def fileno(self):
+        raise SerialException("TapSerial: fd yok, read()/write() kullanin")
+
+    def read(self, size=1):
+        data = self._ser.read(size)
+        if data:
+            self.capture.record(data, DIR_RX, time.monotonic_ns())
+        return data
+
+    def write(self, data):
+        time_ns = time.monotonic_ns()
+        written = self._ser.write(data)
+        count = len(data) if written is None else written
+        self.capture.record(bytes(memoryview(data).cast("B")[:count]), DIR_TX, time_ns)
+        return written
+
+    def close(self):
+        self._ser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_transport(port, baudrate=115200, backend="pyserial", timeout=None, write_timeout=None):
+    """Secilen backend ile seri portu acar
+
+    Args:
+        backend: "pyserial" (varsayilan, her platform) veya "termios" (Linux,
+                 VMIN=64 ile tek syscall'da paket okuma)
+    """
+    if backend == "termios":
+        return TermiosSerial(port, baudrate, timeout=timeout, write_timeout=write_timeout)
+    if backend == "pyserial":
+        import serial
+        return serial.Serial(port, baudrate, timeout=timeout, write_timeout=write_timeout,
+                             rtscts=False, dsrdtr=False, xonxoff=False)
+    raise ValueError(f"Bilinmeyen backend: {backend}")
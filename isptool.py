@@ -7,12 +7,20 @@ import struct
 import sys
 import os
 
+from isp_cache import ImageCache, device_cache_key
+from isp_catcher import ConnectCatcher
+from isp_erase import plan_erase
+from isp_image import changed_segments, split_segments
+from isp_packno import PACKNO_OK, PACKNO_STALE, PacketTracker, response_packno
+from isp_transport import read_frame
+
 # ===============================
 # CONFIG
 # ===============================
 PORT = "/dev/ttyACM0"
 BAUD = 115200
 PACKET_SIZE = 64
+RESPONSE_TIMEOUT = 2.0  # saniye
 
 # ===============================
 # COMMANDS (ISP)
@@ -23,6 +31,12 @@ CMD_GET_DEVICEID   = 0xB1
 CMD_ERASE_ALL      = 0xA3
 CMD_UPDATE_APROM   = 0xA0
 CMD_RUN_APROM      = 0xAB
+CMD_RESEND_PACKET  = 0xFF
+
+VERIFY_RETRY = 3
+
+# Bootloader u32PackNo modeli: paketteki packno'ya bakilmaz, yanitlar +2 artar
+tracker = PacketTracker()
 
 # ===============================
 # UTILS
@@ -33,16 +47,6 @@ def u32(v):
 def checksum(buf):
     return sum(buf) & 0xFFFF
 
-def read_exact(ser, n, timeout=2):
-    buf = b""
-    t = time.time()
-    while len(buf) < n:
-        if ser.in_waiting:
-            buf += ser.read(n - len(buf))
-        elif time.time() - t > timeout:
-            return None
-    return buf
-
 def send_packet(ser, pkt):
     if len(pkt) != 64:
         raise ValueError("Packet must be 64 bytes")
@@ -50,7 +54,29 @@ def send_packet(ser, pkt):
     ser.flush()
 
 def recv_packet(ser):
-    return read_exact(ser, 64)
+    # select() ile bekler (isp_transport), sure dolarsa None
+    return read_frame(ser, RESPONSE_TIMEOUT, PACKET_SIZE)
+
+def transact(ser, pkt):
+    # Eski (gec gelen) yanitlari atla, paket no kaymasinda None
+    send_packet(ser, pkt)
+    expected = tracker.sent(pkt)
+    while True:
+        r = recv_packet(ser)
+        if r is None:
+            return None
+        state, frames = tracker.check(pkt, r, expected)
+        if state == PACKNO_STALE:
+            continue
+        if state != PACKNO_OK:
+            print(f"❌ Paket no kayması: {response_packno(r)}, beklenen {expected} "
+                  f"({frames} paket {state})")
+            return None
+        return r
+
+def verified(pkt, r):
+    # Bootloader checksum'ı flash'tan geri okunan veri üzerinden hesaplar
+    return r is not None and (r[0] | (r[1] << 8)) == checksum(pkt)
 
 # ===============================
 # PACKET BUILDERS
@@ -62,7 +88,8 @@ def pkt_simple(cmd, packno):
     return p
 
 def pkt_update_first(addr, size, data, packno):
-    p = bytearray(64)
+    # Dolgu 0xFF: size sayfa katina yuvarlaninca son paket tamamen yazilir
+    p = bytearray(b"\xff" * 64)
     p[0:4]   = u32(CMD_UPDATE_APROM)
     p[4:8]   = u32(packno)
     p[8:12]  = u32(addr)
@@ -71,8 +98,9 @@ def pkt_update_first(addr, size, data, packno):
     return p
 
 def pkt_update_next(data, packno):
-    p = bytearray(64)
-    p[0:4] = u32(CMD_UPDATE_APROM)
+    # Devam paketinde komut 0: ParseCmd u32Gcmd'yi korur, adrese devam eder
+    p = bytearray(b"\xff" * 64)
+    p[0:4] = u32(0)
     p[4:8] = u32(packno)
     p[8:8+len(data)] = data
     return p
@@ -82,53 +110,97 @@ def pkt_update_next(data, packno):
 # ===============================
 def wait_bootloader(ser):
     print("[*] Bootloader bekleniyor (RESET at)...")
-    while True:
-        send_packet(ser, pkt_simple(CMD_CONNECT, 1))
-        r = recv_packet(ser)
-        if r:
-            print("[OK] Bootloader bulundu!")
-            return
-        time.sleep(0.2)
+    # Hat hizinda CMD_CONNECT, yanit paket hizasi ile tespit edilir
+    catch = ConnectCatcher(ser).catch()
+    tracker.connected()
+    print(f"[OK] Bootloader bulundu! ({catch})")
+    return catch
 
 def get_device_id(ser):
-    send_packet(ser, pkt_simple(CMD_GET_DEVICEID, 2))
-    r = recv_packet(ser)
+    r = transact(ser, pkt_simple(CMD_GET_DEVICEID, 2))
     if not r:
         return None
     return struct.unpack("<I", r[8:12])[0]
 
 def erase_flash(ser):
     print("[*] Flash siliniyor...")
-    send_packet(ser, pkt_simple(CMD_ERASE_ALL, 3))
-    recv_packet(ser)
+    transact(ser, pkt_simple(CMD_ERASE_ALL, 3))
     print("[OK] Flash silindi")
 
-def program_flash(ser, fw):
-    size = len(fw)
-    print(f"[*] Yazılıyor: {size} byte")
-
-    packno = 4
-    offset = 0
+def program_segment(ser, addr, data, packno, verify=False, erase_size=None):
+    size = len(data)
 
-    first = pkt_update_first(0x00000000, size, fw[:48], packno)
-    send_packet(ser, first)
-    recv_packet(ser)
+    # erase_size: ilk paketteki boyut (isp_erase, sayfa kati) - EraseAP bu kadar siler
+    first = pkt_update_first(addr, size if erase_size is None else erase_size,
+                             data[:48], packno)
+    for _ in range(VERIFY_RETRY + 1):
+        r = transact(ser, first)
+        if not verify or verified(first, r):
+            break
+        print("  ⚠ İlk paket doğrulanamadı, tekrar gönderiliyor")
+    else:
+        print("❌ Doğrulama hatası")
+        return None
 
     offset = 48
     packno += 1
+    failures = 0
 
     while offset < size:
-        chunk = fw[offset:offset+56]
+        chunk = data[offset:offset+56]
         pkt = pkt_update_next(chunk, packno)
-        send_packet(ser, pkt)
-        r = recv_packet(ser)
+        r = transact(ser, pkt)
         if not r:
             print("❌ Yazma hatası")
-            return False
+            return None
+
+        if verify and not verified(pkt, r):
+            failures += 1
+            if failures > VERIFY_RETRY:
+                print("❌ Doğrulama hatası")
+                return None
+            print(f"  ⚠ 0x{addr + offset:08X} doğrulanamadı, CMD_RESEND_PACKET")
+            transact(ser, pkt_simple(CMD_RESEND_PACKET, packno))
+            continue
+        failures = 0
 
         offset += len(chunk)
         packno += 1
-        print(f"  → {offset}/{size}")
+        print(f"  → 0x{addr + offset:08X} ({offset}/{size})")
+
+    return packno
+
+def program_flash(ser, fw, sparse=False, previous=None, verify=False, aprom_size=None,
+                  full_erase=False):
+    size = len(fw)
+    print(f"[*] Yazılıyor: {size} byte")
+
+    # previous: cihazda olduğu bilinen imaj (delta) - sadece değişen sayfalar
+    # sparse: boş (0xFF) sayfaları atla, her dolu segment için yeni ilk paket
+    if previous is not None:
+        segments = changed_segments(previous, fw)
+        print(f"[*] Delta: {len(segments)} segment, "
+              f"{sum(len(d) for _, d in segments)} byte değişti")
+    elif sparse:
+        segments = split_segments(fw)
+        print(f"[*] Sparse: {len(segments)} segment, "
+              f"{sum(len(d) for _, d in segments)} byte veri")
+    else:
+        segments = [(0x00000000, fw)]
+
+    # Ilk paketlerin EraseAP'i imajin sayfalarini siler; CMD_ERASE_ALL sadece
+    # --full-erase ile (sparse: atlanan bos sayfalar da ilk pakette silinir)
+    plan = plan_erase(segments, aprom_size, full=full_erase and previous is None,
+                      fill_gaps=sparse and previous is None, baseline_full=previous is None)
+    print(f"[*] Silme: {plan.summary()}")
+    if plan.erase_all:
+        erase_flash(ser)
+
+    packno = 4
+    for addr, data, erase_size in plan.segments:
+        packno = program_segment(ser, addr, data, packno, verify=verify, erase_size=erase_size)
+        if packno is None:
+            return False
 
     print("[OK] Yazma tamamlandı")
     return True
@@ -136,6 +208,7 @@ def program_flash(ser, fw):
 def run_app(ser):
     print("[*] Uygulama başlatılıyor")
     send_packet(ser, pkt_simple(CMD_RUN_APROM, 0))
+    tracker.sent(pkt_simple(CMD_RUN_APROM, 0))
     time.sleep(0.5)
 
 # ===============================
@@ -143,6 +216,10 @@ def run_app(ser):
 # ===============================
 def main():
     fw_name = "NuvotonM26x-Bootloader-Test.bin"
+    sparse = "--sparse" in sys.argv
+    delta = "--delta" in sys.argv
+    verify = "--verify" in sys.argv
+    full_erase = "--full-erase" in sys.argv
 
     print("=== M263 UART ISP ===")
 
@@ -157,13 +234,27 @@ def main():
         dsrdtr=False
     )
 
-    wait_bootloader(ser)
+    catch = wait_bootloader(ser)
 
     dev = get_device_id(ser)
     print(f"[OK] Device ID: 0x{dev:08X}")
 
-    erase_flash(ser)
-    program_flash(ser, fw)
+    previous = None
+    if delta:
+        cache = ImageCache()
+        key = device_cache_key(dev, PORT)
+        previous = cache.load(key)
+        cache.invalidate(key)
+
+    ok = program_flash(ser, fw, sparse=sparse, previous=previous, verify=verify,
+                       aprom_size=catch.aprom_size, full_erase=full_erase)
+    if not ok:
+        # Yarim yazilmis APROM'a gecilmez; kart bootloader'da kalir
+        print("\n❌ Firmware yüklenemedi, uygulama başlatılmadı")
+        ser.close()
+        sys.exit(1)
+    if delta:
+        cache.store(key, fw)
     run_app(ser)
 
     print("\n✅ Firmware başarıyla yüklendi")
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Ortak fixture'lar: pty uzerinde isp_simulator, bagli transport ve oturum kaydi"""
+
+import random
+
+import pytest
+
+from isp_deadline import (DEADLINE_CONNECT, DEADLINE_FIRST, DEADLINE_NEXT, DEADLINE_RESEND,
+                          DeadlineEstimator)
+from isp_protocol import (CMD_CONNECT, CMD_GET_DEVICEID, CMD_SYNC_PACKNO, bytes_to_uint32,
+                          create_packet)
+from isp_record import RecordingSerial
+from isp_session import IspSession
+from isp_simulator import DEFAULT_PDID, BootloaderSimulator
+from isp_transport import open_transport, read_frame, write_frame
+
+
+def random_image(size, seed=None):
+    """Tekrarlanabilir rastgele imaj (0xFF sayfasi yok)"""
+    rng = random.Random(size if seed is None else seed)
+    return bytes(rng.randrange(256) for _ in range(size))
+
+
+def fast_deadlines():
+    """Kisa varsayilan sureli, diske yazmayan zaman asimi tahmincisi"""
+    return DeadlineEstimator(defaults={DEADLINE_CONNECT: 0.5, DEADLINE_FIRST: 0.5,
+                                       DEADLINE_NEXT: 0.2, DEADLINE_RESEND: 0.2},
+                             deadline_dir=None)
+
+
+def run_session(ser, data):
+    """CONNECT, SYNC_PACKNO, GET_DEVICEID ve tek segment yazma; PDID dondurur"""
+    session = IspSession(ser, fast_deadlines())
+    session.write(create_packet(CMD_CONNECT))
+    assert read_frame(ser, 1.0) is not None
+    session.tracker.connected()
+    session.transact(create_packet(CMD_SYNC_PACKNO, 1))
+    pdid = bytes_to_uint32(session.transact(create_packet(CMD_GET_DEVICEID)), 8)
+    session.program_segment(0, data)
+    return pdid
+
+
+@pytest.fixture
+def simulator():
+    """simulator(**kwargs) -> baslatilmis BootloaderSimulator (test sonunda durdurulur)"""
+    started = []
+
+    def start(**kwargs):
+        kwargs.setdefault("pace", False)
+        sim = BootloaderSimulator(**kwargs)
+        sim.start()
+        started.append(sim)
+        return sim
+
+    yield start
+    for sim in started:
+        sim.stop()
+
+
+@pytest.fixture
+def connected(simulator):
+    """connected(**kwargs) -> (sim, ser): CMD_CONNECT ile ISP moduna alinmis port"""
+    ports = []
+
+    def connect(**kwargs):
+        sim = simulator(**kwargs)
+        ser = open_transport(sim.port, sim.baudrate, "termios", timeout=1, write_timeout=1)
+        ports.append(ser)
+        write_frame(ser, create_packet(CMD_CONNECT))
+        response = read_frame(ser, 1.0)
+        assert response is not None and response[0] == CMD_CONNECT
+        return sim, ser
+
+    yield connect
+    for ser in ports:
+        ser.close()
+
+
+@pytest.fixture
+def recording(simulator, tmp_path):
+    """recording(data, **kwargs) -> (sim, kayit yolu): run_session simulatorle kaydedilir"""
+    def record(data, **kwargs):
+        sim = simulator(**kwargs)
+        path = str(tmp_path / "session.ispcap")
+        ser = RecordingSerial(open_transport(sim.port, sim.baudrate, "termios", timeout=1,
+                                             write_timeout=1), path)
+        try:
+            assert run_session(ser, data) == DEFAULT_PDID
+        finally:
+            ser.close()
+        return sim, path
+    return record
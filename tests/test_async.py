@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""isp_async: asyncio yolunun isp_recovery durum makinesiyle kurtarmasi"""
+
+import asyncio
+
+import pytest
+
+from conftest import random_image
+from isp_async import AsyncIspClient
+from isp_deadline import (DEADLINE_CONNECT, DEADLINE_FIRST, DEADLINE_NEXT, DEADLINE_RESEND,
+                          DeadlineEstimator)
+from isp_session import IspError
+
+
+def deadlines():
+    return DeadlineEstimator(defaults={DEADLINE_CONNECT: 0.5, DEADLINE_FIRST: 0.5,
+                                       DEADLINE_NEXT: 0.2, DEADLINE_RESEND: 0.2},
+                             deadline_dir=None)
+
+
+def run(sim, job):
+    async def session():
+        async with AsyncIspClient(sim.port, sim.baudrate, deadlines=deadlines()) as isp:
+            await isp.connect(timeout=2.0)
+            await isp.sync_packno()
+            return await job(isp)
+    return asyncio.run(session())
+
+
+@pytest.mark.parametrize("loss", [dict(lose_frames={6}), dict(drop_frames={6}),
+                                  dict(lose_frames={4}, drop_frames={9})])
+def test_update_aprom_recovers(simulator, loss):
+    data = random_image(1000)
+    sim = simulator(**loss)
+    assert run(sim, lambda isp: isp.update_aprom(data)) == len(data)
+    assert bytes(sim.aprom[:len(data)]) == data
+
+
+def test_update_aprom_verify_rewrites(simulator):
+    data = random_image(600)
+    sim = simulator(corrupt_frames={5})
+    run(sim, lambda isp: isp.update_aprom(data, verify=True))
+    assert bytes(sim.aprom[:len(data)]) == data
+
+
+def test_update_dataflash(simulator):
+    data = random_image(300)
+    sim = simulator(aprom_size=0x4000, dataflash_addr=0x3800, lose_frames={5})
+    done = []
+
+    async def job(isp):
+        return await isp.update_dataflash(data, progress=lambda d, t: done.append((d, t)))
+
+    assert run(sim, job) == len(data)
+    assert bytes(sim.aprom[0x3800:0x3800 + len(data)]) == data
+    assert done[-1] == (len(data), len(data))
+
+
+def test_update_dataflash_without_dataflash(simulator):
+    sim = simulator(aprom_size=0x4000)
+    with pytest.raises(IspError):
+        run(sim, lambda isp: isp.update_dataflash(b"\x00" * 64))
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""isp_capture: halka buffer sarmasi, bekleme yolu ve blok sinirlarinda okuma"""
+
+import io
+import threading
+
+import pytest
+
+from conftest import random_image
+from isp_capture import (DIR_RX, DIR_TX, MAX_RECORD_DATA, CaptureError, CaptureRing,
+                         CaptureWriter, iter_capture, read_capture)
+
+RECORD_HEADER = 12  # Q zaman, B yon, x, H uzunluk
+
+
+def sample_records(count=200, seed=1):
+    """Farkli uzunluklarda (1-80 byte) iki yonlu kayitlar"""
+    image = random_image(count * 80, seed)
+    return [(index * 1000, DIR_TX if index % 3 else DIR_RX,
+             image[index * 80:index * 80 + 1 + (index * 37) % 80]) for index in range(count)]
+
+
+def write_capture(path, records, ring_size):
+    with CaptureWriter(str(path), baudrate=115200, ring_size=ring_size) as capture:
+        for time_ns, direction, data in records:
+            capture.record(data, direction, capture.start_ns + time_ns)
+    return capture
+
+
+@pytest.mark.parametrize("ring_size", [RECORD_HEADER + 80, 101, 257])
+@pytest.mark.parametrize("chunk_size", [1, 7, RECORD_HEADER + 1, 1 << 20])
+def test_round_trip_small_ring(tmp_path, ring_size, chunk_size):
+    """Halka buffer her kayitta sarar; okuma bloklari kayitlari ortadan boler"""
+    records = sample_records()
+    path = tmp_path / "small.ispcap"
+    capture = write_capture(path, records, ring_size)
+    assert capture.records == len(records)
+    assert capture.ring.head == capture.ring.tail > ring_size
+    assert capture.ring.peak <= ring_size
+
+    header, items = iter_capture(str(path), chunk_size)
+    assert header.baudrate == 115200
+    assert [tuple(item) for item in items] == records
+
+
+class BlockedFile(io.BytesIO):
+    """release edilene kadar write() bekleyen dosya"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.release.wait(5)
+        return super().write(data)
+
+
+def test_full_ring_stalls_without_loss():
+    ring = CaptureRing(64)
+    f = BlockedFile()
+    writer = threading.Thread(target=ring.drain_into, args=(f,))
+    writer.start()
+    chunks = [bytes([index]) * 20 for index in range(6)]
+    producer = threading.Thread(target=lambda: [ring.put(i, DIR_RX, c)
+                                                for i, c in enumerate(chunks)])
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive()  # Yazici bosaltmadikca yer yok
+    assert ring.stalls >= 1
+    f.release.set()
+    producer.join(5)
+    ring.close()
+    writer.join(5)
+    assert not producer.is_alive() and not writer.is_alive()
+    expected = b"".join(i.to_bytes(8, "little") + bytes([DIR_RX, 0]) + (20).to_bytes(2, "little")
+                        + chunk for i, chunk in enumerate(chunks))
+    assert f.getvalue() == expected
+
+
+def test_long_record_is_split(tmp_path):
+    data = random_image(MAX_RECORD_DATA + 10)
+    path = tmp_path / "long.ispcap"
+    write_capture(path, [(5, DIR_RX, data)], 1 << 17)
+    _, records = read_capture(str(path))
+    assert [len(r.data) for r in records] == [MAX_RECORD_DATA, 10]
+    assert b"".join(r.data for r in records) == data
+    with pytest.raises(ValueError):
+        CaptureRing(32).put(0, DIR_RX, bytes(32))
+
+
+def test_truncated_last_record_is_dropped(tmp_path):
+    records = sample_records(10)
+    path = tmp_path / "cut.ispcap"
+    write_capture(path, records, 4096)
+    blob = path.read_bytes()
+    path.write_bytes(blob[:-5])
+    _, read = read_capture(str(path))
+    assert [tuple(r) for r in read] == records[:-1]
+
+
+def test_not_a_capture(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"\x00" * 64)
+    with pytest.raises(CaptureError):
+        read_capture(str(path))
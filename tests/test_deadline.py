@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""isp_deadline.DeadlineEstimator: olculen gecikmelerden zaman asimi"""
+
+import pytest
+
+from isp_deadline import (DEADLINE_FIRST, DEADLINE_NEXT, MARGIN, MIN_SAMPLES, MIN_TIMEOUT,
+                          DeadlineEstimator, erase_pages)
+from isp_image import FLASH_PAGE_SIZE
+
+PDID = 0x00D26300
+
+
+def estimator(**kwargs):
+    kwargs.setdefault("deadline_dir", None)
+    return DeadlineEstimator(defaults={DEADLINE_NEXT: 1.0, DEADLINE_FIRST: 10.0}, **kwargs)
+
+
+def feed(deadlines, latencies, command_class=DEADLINE_NEXT, units=1):
+    for latency in latencies:
+        deadlines.observe(command_class, latency, units)
+
+
+def test_default_until_min_samples():
+    deadlines = estimator()
+    feed(deadlines, [0.01] * (MIN_SAMPLES - 1))
+    assert deadlines.learned(DEADLINE_NEXT) is None
+    assert deadlines.timeout(DEADLINE_NEXT) == 1.0
+    feed(deadlines, [0.01])
+    assert deadlines.timeout(DEADLINE_NEXT) < 1.0
+
+
+def test_variance_term_wins_while_rttvar_is_high():
+    deadlines = estimator()
+    feed(deadlines, [0.1] * MIN_SAMPLES)
+    # rttvar ilk olcumde latency/2, sabit gecikmede her olcumde 3/4'une iner
+    srtt, rttvar = 0.1, 0.05 * 0.75 ** (MIN_SAMPLES - 1)
+    assert srtt + 4 * rttvar > 0.1 * MARGIN
+    assert deadlines.timeout(DEADLINE_NEXT) == pytest.approx(srtt + 4 * rttvar)
+
+
+def test_quantile_term_wins_when_stable():
+    deadlines = estimator()
+    feed(deadlines, [0.1] * 50)
+    assert deadlines.timeout(DEADLINE_NEXT) == pytest.approx(0.1 * MARGIN)
+    # 100 olcumde 2 yavas yanit: %99 yuzdeligi onlari kapsar (1 tanesi kapsanmaz)
+    feed(deadlines, [0.1] * 47 + [0.4, 0.4, 0.1])
+    assert deadlines.timeout(DEADLINE_NEXT) == pytest.approx(0.4 * MARGIN)
+
+
+def test_quantile_setting():
+    samples = [0.01 * i for i in range(1, 101)]
+    low = estimator(quantile=0.5)
+    high = estimator(quantile=0.99)
+    feed(low, samples)
+    feed(high, samples)
+    assert high.timeout(DEADLINE_NEXT) == pytest.approx(0.99 * MARGIN)
+    assert low.timeout(DEADLINE_NEXT) < high.timeout(DEADLINE_NEXT)
+    with pytest.raises(ValueError):
+        DeadlineEstimator(quantile=0)
+
+
+def test_min_timeout_floor():
+    deadlines = estimator()
+    feed(deadlines, [0.0001] * 50)
+    assert deadlines.timeout(DEADLINE_NEXT) == MIN_TIMEOUT
+
+
+def test_expired_backoff_is_capped_at_default():
+    deadlines = estimator()
+    feed(deadlines, [0.1] * 50)
+    learned = deadlines.timeout(DEADLINE_NEXT)
+    deadlines.expired(DEADLINE_NEXT)
+    assert deadlines.timeout(DEADLINE_NEXT) == pytest.approx(2 * learned)
+    deadlines.expired(DEADLINE_NEXT)
+    assert deadlines.timeout(DEADLINE_NEXT) == pytest.approx(4 * learned)
+    for _ in range(10):
+        deadlines.expired(DEADLINE_NEXT)
+    assert deadlines.timeout(DEADLINE_NEXT) == 1.0
+    assert deadlines.hard_timeout(DEADLINE_NEXT) == 1.0
+    # Yeni olcum geri cekilmeyi sifirlar
+    feed(deadlines, [0.1])
+    assert deadlines.timeout(DEADLINE_NEXT) == pytest.approx(learned, rel=0.1)
+
+
+def test_backoff_never_shrinks_a_learned_value_above_default():
+    deadlines = DeadlineEstimator(defaults={DEADLINE_NEXT: 0.05}, deadline_dir=None)
+    feed(deadlines, [0.1] * 50)
+    learned = deadlines.timeout(DEADLINE_NEXT)
+    deadlines.expired(DEADLINE_NEXT)
+    assert deadlines.timeout(DEADLINE_NEXT) == learned
+    assert deadlines.hard_timeout(DEADLINE_NEXT) == learned
+
+
+def test_first_scales_per_page():
+    deadlines = estimator()
+    feed(deadlines, [0.2] * 50, DEADLINE_FIRST, units=4)  # 50 ms / sayfa
+    per_page = deadlines.timeout(DEADLINE_FIRST)
+    assert per_page == pytest.approx(0.05 * MARGIN)
+    assert deadlines.timeout(DEADLINE_FIRST, 10) == pytest.approx(10 * per_page)
+
+
+@pytest.mark.parametrize("address, size, pages", [
+    (0, 0, 1),
+    (0, 1, 1),
+    (0, FLASH_PAGE_SIZE, 1),
+    (0, FLASH_PAGE_SIZE + 1, 2),
+    (FLASH_PAGE_SIZE - 1, 2, 2),
+    (FLASH_PAGE_SIZE + 48, 3 * FLASH_PAGE_SIZE - 48, 3),
+])
+def test_erase_pages(address, size, pages):
+    assert erase_pages(address, size) == pages
+
+
+def test_attach_save_round_trip(tmp_path):
+    first = estimator(deadline_dir=str(tmp_path))
+    first.attach(PDID)
+    feed(first, [0.1] * 50)
+    first.save()
+    assert (tmp_path / f"{PDID:08X}.json").exists()
+
+    second = estimator(deadline_dir=str(tmp_path))
+    assert second.learned(DEADLINE_NEXT) is None
+    second.attach(PDID)
+    assert second.timeout(DEADLINE_NEXT) == pytest.approx(first.timeout(DEADLINE_NEXT))
+
+    other = estimator(deadline_dir=str(tmp_path))
+    other.attach(PDID + 1)  # Baska cihaz tipi: kayit yok
+    assert other.learned(DEADLINE_NEXT) is None
+
+
+def test_no_deadline_dir_does_not_save():
+    deadlines = estimator()
+    deadlines.attach(PDID)
+    feed(deadlines, [0.1] * 50)
+    deadlines.save()
+    assert deadlines.path is None
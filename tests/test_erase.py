@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""isp_erase.plan_erase: ilk paket boyutunun sayfa katina yuvarlanmasi"""
+
+import pytest
+
+from conftest import random_image
+from isp_erase import ERASE_FULL, ERASE_RANGE, ERASE_SEGMENT, erase_ops, plan_erase
+from isp_image import FLASH_PAGE_SIZE
+from isp_recovery import SegmentProgrammer
+
+APROM_SIZE = 0x10000
+
+
+@pytest.mark.parametrize("size, erase_size", [
+    (1, FLASH_PAGE_SIZE),
+    (1000, FLASH_PAGE_SIZE),
+    (FLASH_PAGE_SIZE, FLASH_PAGE_SIZE),
+    (FLASH_PAGE_SIZE + 1, 2 * FLASH_PAGE_SIZE),
+    (5000, 3 * FLASH_PAGE_SIZE),
+])
+def test_range_rounds_to_page(size, erase_size):
+    plan = plan_erase([(0, bytes(size))], APROM_SIZE)
+    assert plan.strategy == ERASE_RANGE
+    assert not plan.erase_all
+    assert plan.segments[0][2] == erase_size
+    assert plan.erased == erase_size
+
+
+def test_rounding_is_clamped_to_aprom():
+    address = APROM_SIZE - FLASH_PAGE_SIZE
+    plan = plan_erase([(address, bytes(100))], APROM_SIZE)
+    assert plan.segments[0][2] == FLASH_PAGE_SIZE
+    plan = plan_erase([(address, bytes(100))], APROM_SIZE - 1000)
+    assert plan.segments[0][2] == FLASH_PAGE_SIZE - 1000  # APROM sonu sayfa ortasinda
+
+
+def test_sparse_segment_erases_gap():
+    segments = [(0, bytes(100)), (4 * FLASH_PAGE_SIZE, bytes(FLASH_PAGE_SIZE + 10))]
+    plan = plan_erase(segments, APROM_SIZE, fill_gaps=True)
+    assert plan.strategy == ERASE_SEGMENT
+    assert [erase_size for _, _, erase_size in plan.segments] == [4 * FLASH_PAGE_SIZE,
+                                                                   2 * FLASH_PAGE_SIZE]
+    plan = plan_erase(segments, APROM_SIZE)  # Delta: aradaki sayfalar silinmez
+    assert plan.segments[0][2] == FLASH_PAGE_SIZE
+
+
+def test_full_erase():
+    plan = plan_erase([(0, bytes(1000))], APROM_SIZE, full=True)
+    assert plan.strategy == ERASE_FULL
+    assert plan.erase_all
+    assert plan.ops == erase_ops(0, APROM_SIZE, APROM_SIZE)[0] + 1
+
+
+def test_unrounded_size_overflows_to_aprom_end():
+    """Sayfa kati olmayan boyutta EraseAP tasar ve APROM sonuna kadar siler"""
+    ops, erased = erase_ops(0, 1000, APROM_SIZE)
+    assert erased == APROM_SIZE
+    plan = plan_erase([(0, bytes(1000))], APROM_SIZE, baseline_full=False)
+    assert plan.baseline_erased == APROM_SIZE
+    assert plan.erased == FLASH_PAGE_SIZE
+    assert plan.saved_ops > 0
+
+
+@pytest.mark.parametrize("rounded", [True, False])
+def test_rounded_first_packet_keeps_rest_of_aprom(connected, rounded):
+    """Simulatorde: yuvarlanmis boyut sadece imajin sayfasini siler"""
+    sim, ser = connected(aprom_size=APROM_SIZE)
+    sim.aprom[:] = b'\x00' * APROM_SIZE
+    data = random_image(1000)
+    erase_size = plan_erase([(0, data)], APROM_SIZE).segments[0][2] if rounded else None
+    SegmentProgrammer(ser, timeout=0.2, first_timeout=0.5).program(0, data,
+                                                                   erase_size=erase_size)
+    assert sim.aprom[:len(data)] == data
+    assert sim.aprom[len(data):FLASH_PAGE_SIZE] == b'\xff' * (FLASH_PAGE_SIZE - len(data))
+    rest = bytes(sim.aprom[FLASH_PAGE_SIZE:])
+    assert rest == (b'\x00' if rounded else b'\xff') * (APROM_SIZE - FLASH_PAGE_SIZE)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""isp_frames.FrameStream: NumPy ve saf Python derleyicilerinin esitligi"""
+
+import pytest
+
+from conftest import random_image
+from isp_erase import page_ceil
+from isp_frames import FrameStream
+from isp_protocol import calculate_checksum, pkt_update_first, pkt_update_next
+
+SIZES = [0, 1, 47, 48, 49, 104, 105, 1000, 4097]
+STARTS = [0, 48, 104]
+
+
+def compile_both(data, start, sequence=7, erase_size=None):
+    pytest.importorskip("numpy")
+    address = 0x1000
+    python = FrameStream(address, data, erase_size, start, sequence, vectorized=False)
+    vector = FrameStream(address, data, erase_size, start, sequence, vectorized=True)
+    return python, vector
+
+
+# Yeniden baslatma ofseti segmentin icinde kalir (program_steps: start < size)
+CASES = [(size, start) for size in SIZES for start in STARTS if start == 0 or start < size]
+
+
+@pytest.mark.parametrize("size, start", CASES)
+def test_numpy_matches_python(size, start):
+    data = random_image(size)
+    for erase_size in (None, page_ceil(size)):
+        python, vector = compile_both(data, start, erase_size=erase_size)
+        assert len(python) == len(vector)
+        assert python.buffer == vector.buffer
+        assert python.checksums == vector.checksums
+        assert python.sequence == vector.sequence
+
+
+@pytest.mark.parametrize("size", [49, 1000])
+def test_frames_match_packet_helpers(size):
+    """Derlenen frame'ler pkt_update_first/pkt_update_next ile birebir ayni"""
+    data = random_image(size)
+    for stream in compile_both(data, 0, sequence=0):
+        frames = [bytes(stream.frame(i)) for i in range(len(stream))]
+        assert frames[0] == bytes(pkt_update_first(0x1000, size, data[:48], 1))
+        for index, frame in enumerate(frames[1:], 1):
+            chunk = data[48 + (index - 1) * 56:48 + index * 56]
+            assert frame == bytes(pkt_update_next(chunk, index + 1))
+        assert stream.checksums == [calculate_checksum(frame) for frame in frames]
+
+
+@pytest.mark.parametrize("index", [0, 1, -1])
+def test_restamp(index):
+    data = random_image(1000)
+    python, vector = compile_both(data, 48)
+    index %= len(python)
+    for stream in (python, vector):
+        stream.restamp(index, 0x12345678)
+        assert stream.checksums[index] == calculate_checksum(stream.frame(index))
+    assert python.buffer == vector.buffer
+    assert python.checksums == vector.checksums
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""isp_journal: yarida kalan yazmaya sadece istenirse ve ayni imaj/cihaz icin devam"""
+
+import pytest
+
+from conftest import random_image
+from isp_cache import device_cache_key
+from isp_deadline import DeadlineEstimator
+from isp_journal import FlashJournal
+from isp_session import SESSION_TIMEOUTS, flash_port
+from isp_simulator import DEFAULT_PDID
+
+RESUME_AT = 0x800
+
+
+def interrupted(journal_dir, port, data, pdid=DEFAULT_PDID):
+    """RESUME_AT'e kadar yazilip kesilmis bir yazmanin gunlugu"""
+    journal = FlashJournal(device_cache_key(pdid, port), str(journal_dir))
+    journal.begin(data, pdid, RESUME_AT)
+    return journal
+
+
+def flash(sim, data, journal_dir, **kwargs):
+    result = flash_port(sim.port, data, connect_timeout=2.0, backend="termios",
+                        journal_dir=str(journal_dir),
+                        deadlines=DeadlineEstimator(defaults=SESSION_TIMEOUTS, deadline_dir=None),
+                        **kwargs)
+    assert result["ok"], result["error"]
+    return result
+
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_resume_is_opt_in(simulator, tmp_path, resume):
+    data = random_image(0x1000)
+    sim = simulator()
+    journal = interrupted(tmp_path, sim.port, data)
+    result = flash(sim, data, tmp_path, journal=True, resume=resume)
+    assert result["resumed_from"] == (RESUME_AT if resume else None)
+    # Devam edilmediyse imajin tamami yazilir
+    written = data if not resume else b"\xff" * RESUME_AT + data[RESUME_AT:]
+    assert bytes(sim.aprom[:len(data)]) == written
+    assert journal.load() is None
+
+
+@pytest.mark.parametrize("stale", ["image", "device"])
+def test_stale_journal_is_not_resumed(simulator, tmp_path, stale):
+    data = random_image(0x1000)
+    sim = simulator()
+    journal = FlashJournal(device_cache_key(DEFAULT_PDID, sim.port), str(tmp_path))
+    if stale == "image":
+        journal.begin(random_image(0x1000, seed=1), DEFAULT_PDID, RESUME_AT)
+    else:
+        journal.begin(data, DEFAULT_PDID + 1, RESUME_AT)
+    result = flash(sim, data, tmp_path, resume=True)
+    assert result["resumed_from"] is None
+    assert bytes(sim.aprom[:len(data)]) == data
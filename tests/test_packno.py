@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""isp_packno.PacketTracker: bootloader u32PackNo modeli"""
+
+import struct
+
+import pytest
+
+from isp_packno import (PACKNO_AHEAD, PACKNO_LOST, PACKNO_OK, PACKNO_STALE, PacketTracker,
+                        response_packno)
+from isp_protocol import (CMD_CONNECT, CMD_GET_DEVICEID, CMD_RUN_APROM, CMD_SYNC_PACKNO,
+                          calculate_checksum, create_packet)
+
+
+def response(packet, packno, checksum=None):
+    """Bootloader yaniti: byte 0-1 checksum, byte 4-7 paket numarasi"""
+    checksum = calculate_checksum(packet) if checksum is None else checksum
+    frame = bytearray(64)
+    struct.pack_into('<HxxI', frame, 0, checksum, packno)
+    return bytes(frame)
+
+
+def test_connect_answers_two():
+    tracker = PacketTracker()
+    assert tracker.sent(create_packet(CMD_CONNECT)) == 2
+    assert tracker.sent(create_packet(CMD_GET_DEVICEID)) == 4
+    tracker.connected()
+    assert tracker.sent(create_packet(CMD_GET_DEVICEID)) == 4
+
+
+@pytest.mark.parametrize("value", [1, 100, 0xFFFFFFFE])
+def test_sync_packno_answers_value_plus_one(value):
+    tracker = PacketTracker()
+    tracker.connected()
+    assert tracker.sent(create_packet(CMD_SYNC_PACKNO, value)) == (value + 1) & 0xFFFFFFFF
+    assert tracker.sent(create_packet(CMD_GET_DEVICEID)) == (value + 3) & 0xFFFFFFFF
+
+
+def test_unknown_counter_is_learned_from_first_response():
+    tracker = PacketTracker()
+    packet = create_packet(CMD_GET_DEVICEID)
+    assert tracker.sent(packet) is None
+    assert tracker.check(packet, response(packet, 10), None) == (PACKNO_OK, 0)
+    assert tracker.sent(packet) == 12
+
+
+def test_run_aprom_forgets_counter():
+    tracker = PacketTracker()
+    tracker.connected()
+    assert tracker.sent(create_packet(CMD_RUN_APROM)) is None
+    assert tracker.sent(create_packet(CMD_GET_DEVICEID)) is None
+
+
+def test_classification():
+    tracker = PacketTracker()
+    tracker.connected()
+    packet = create_packet(CMD_GET_DEVICEID)
+    expected = tracker.sent(packet)
+    assert tracker.check(packet, response(packet, expected), expected) == (PACKNO_OK, 0)
+
+    # Onceki komutun gec yaniti: kucuk numara, baska paketin checksum'i
+    expected = tracker.sent(packet)
+    late = response(create_packet(CMD_SYNC_PACKNO, 1), expected - 2)
+    assert tracker.check(packet, late, expected) == (PACKNO_STALE, 1)
+    assert tracker.stale == 1
+
+    # Bu paketin yaniti ama iki paket eksik: aradakiler ulasmadi
+    expected = tracker.sent(packet)
+    assert tracker.check(packet, response(packet, expected - 4), expected) == (PACKNO_LOST, 2)
+    assert tracker.lost == 2
+    assert tracker.sent(packet) == expected - 2  # Sayac yanita gore duzeltildi
+
+    # Bootloader hostun bilmedigi bir paketi isledi
+    expected = tracker.sent(packet)
+    assert tracker.check(packet, response(packet, expected + 2), expected) == (PACKNO_AHEAD, 1)
+    assert tracker.extra == 1
+    assert tracker.sent(packet) == expected + 4
+
+
+def test_unsent_rolls_back():
+    tracker = PacketTracker()
+    tracker.connected()
+    packet = create_packet(CMD_GET_DEVICEID)
+    expected = tracker.sent(packet)
+    tracker.unsent()
+    assert tracker.sent(packet) == expected
+    PacketTracker().unsent()  # Sayac bilinmiyorsa etkisiz
+
+
+def test_32bit_wrap():
+    tracker = PacketTracker()
+    tracker.connected()
+    tracker.sent(create_packet(CMD_SYNC_PACKNO, 0xFFFFFFFD))  # Yanit 0xFFFFFFFE
+    packet = create_packet(CMD_GET_DEVICEID)
+    expected = tracker.sent(packet)
+    assert expected == 0
+    assert tracker.check(packet, response(packet, 0), expected) == (PACKNO_OK, 0)
+    # Sarma sinirinda kucuk/buyuk karsilastirma 32 bit isaretli farktan
+    expected = tracker.sent(packet)
+    assert expected == 2
+    assert tracker.check(packet, response(packet, 0xFFFFFFFE), expected) == (PACKNO_LOST, 2)
+    assert response_packno(response(packet, 0xFFFFFFFE)) == 0xFFFFFFFE
+    tracker.counter = 1
+    tracker.unsent()  # Geri alma da 32 bit sarar
+    assert tracker.counter == 0xFFFFFFFF
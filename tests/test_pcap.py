@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""isp_pcap: pcapng blok yerlesimi, zaman cozunurlugu ve yon bayraklari"""
+
+import struct
+
+from conftest import random_image
+from isp_capture import DIR_RX, DIR_TX
+from isp_decoder import IspPacket, decode_capture
+from isp_pcap import LINKTYPE_USER0, PcapngSink, export_capture
+from isp_protocol import CMD_GET_DEVICEID, create_packet
+
+BLOCK_SHB = 0x0A0D0D0A
+BLOCK_IDB = 1
+BLOCK_EPB = 6
+
+
+def read_blocks(path):
+    """(tip, govde) listesi; bas ve son uzunluk alanlarini dogrular"""
+    blob = open(path, "rb").read()
+    blocks = []
+    offset = 0
+    while offset < len(blob):
+        block_type, length = struct.unpack_from('<II', blob, offset)
+        assert length % 4 == 0 and length >= 12
+        assert struct.unpack_from('<I', blob, offset + length - 4)[0] == length
+        blocks.append((block_type, blob[offset + 8:offset + length - 4]))
+        offset += length
+    assert offset == len(blob)
+    return blocks
+
+
+def read_options(body):
+    options = {}
+    offset = 0
+    while offset < len(body):
+        code, length = struct.unpack_from('<HH', body, offset)
+        if code == 0:
+            break
+        options[code] = body[offset + 4:offset + 4 + length]
+        offset += 4 + length + (-length % 4)
+    return options
+
+
+def parse_epb(body):
+    """(zaman ns, veri, secenekler)"""
+    _, high, low, caplen, length = struct.unpack_from('<IIIII', body)
+    assert caplen == length
+    data = body[20:20 + caplen]
+    return (high << 32) | low, data, read_options(body[20 + caplen + (-caplen % 4):])
+
+
+def check_header(blocks):
+    (shb_type, shb), (idb_type, idb) = blocks[:2]
+    assert shb_type == BLOCK_SHB
+    assert struct.unpack_from('<IHH', shb) == (0x1A2B3C4D, 1, 0)
+    assert idb_type == BLOCK_IDB
+    assert struct.unpack_from('<H', idb)[0] == LINKTYPE_USER0
+    assert read_options(idb[8:])[9] == b"\x09"  # if_tsresol: 10^-9 s
+    assert all(block_type == BLOCK_EPB for block_type, _ in blocks[2:])
+    return [parse_epb(body) for _, body in blocks[2:]]
+
+
+def test_export_recorded_session(recording, tmp_path):
+    data = random_image(500)
+    _, path = recording(data)
+    out = str(tmp_path / "session.pcapng")
+    sink = export_capture(path, out)
+
+    header, _, items = decode_capture(path)
+    packets = [item for item in items if isinstance(item, IspPacket)]
+    epbs = check_header(read_blocks(out))
+    assert len(epbs) == sink.writer.packets == len(packets)
+    for (time_ns, frame, options), packet in zip(epbs, packets):
+        assert frame == packet.data and len(frame) == 64
+        assert time_ns == header.start_ns + packet.time_ns
+        flags = struct.unpack('<I', options[2])[0]  # epb_flags
+        assert flags == (0x2 if packet.direction == DIR_TX else 0x1)
+        assert options[1]  # opt_comment: cozucu aciklamasi
+    times = [time_ns for time_ns, _, _ in epbs]
+    assert times == sorted(times)
+    assert sum(1 for _, _, options in epbs if options[2] == b"\x02\0\0\0") == len(epbs) // 2
+
+
+def test_live_sink_frames_split_reads(tmp_path):
+    """record() ile parca parca gelen byte'lar 64 byte paketlere cercevelenir"""
+    out = str(tmp_path / "live.pcapng")
+    request = bytes(create_packet(CMD_GET_DEVICEID))
+    with PcapngSink(out, "pty0", start_ns=10 ** 18) as sink:
+        base = sink.start_monotonic_ns
+        sink.record(request, DIR_TX, base + 1000)
+        sink.record(request[:5], DIR_RX, base + 2000)
+        sink.record(request[5:], DIR_RX, base + 2100)
+        assert sink.writer.packets == 2  # 64. byte ile yanit cercevesi tamamlanir
+    epbs = check_header(read_blocks(out))
+    assert [data for _, data, _ in epbs] == [request, request]
+    assert [options[2][0] for _, _, options in epbs] == [0x2, 0x1]
+    assert epbs[0][0] == 10 ** 18 + 1000
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""isp_record: kaydedilen oturumun tekrar oynatilmasi (regresyon kapisi)"""
+
+import pytest
+
+import get_device_id
+import uart_receiver_nuvoton as nuvoton
+from conftest import fast_deadlines, random_image, run_session
+from isp_packno import PacketTracker
+from isp_protocol import CMD_CONNECT, create_packet
+from isp_record import RecordingSerial, ReplaySerial
+from isp_simulator import DEFAULT_PDID
+from isp_transport import open_transport
+
+
+def test_replay_matches(recording):
+    data = random_image(1000)
+    _, path = recording(data)
+    replay = ReplaySerial(path, scale=0, timeout=1)
+    assert run_session(replay, data) == DEFAULT_PDID
+    assert replay.mismatches == 0
+    assert replay.ok(), replay.summary()
+
+
+def test_replay_detects_changed_image(recording):
+    data = random_image(1000)
+    _, path = recording(data)
+    changed = bytearray(data)
+    changed[500] ^= 0xFF
+    replay = ReplaySerial(path, scale=0, timeout=1)
+    run_session(replay, bytes(changed))
+    assert replay.mismatches == 1
+    assert replay.first_mismatch[0] == 3 + 1 + (500 - 48) // 56 + 1
+    assert not replay.ok()
+
+
+@pytest.fixture
+def nuvoton_flash(monkeypatch):
+    """nuvoton_flash(ser, data): uart_receiver_nuvoton ile baglanip APROM yazar
+
+    Her cagri modulun paket sayacini ve zaman asimi tahmincisini sifirlar
+    (kayit ve oynatma ayni baslangic durumunu gorur, diske yazilmaz).
+    """
+    def flash(ser, data):
+        monkeypatch.setattr(nuvoton, "packet_tracker", PacketTracker())
+        monkeypatch.setattr(nuvoton, "deadlines", fast_deadlines())
+        connect = create_packet(CMD_CONNECT)
+        assert nuvoton.send_packet(ser, connect)
+        response = nuvoton.receive_response(ser, 1.0)
+        assert response is not None
+        assert nuvoton.connect_handshake(ser, response) == DEFAULT_PDID
+        return nuvoton.send_update_aprom(ser, data)
+    return flash
+
+
+def record_port(sim, path):
+    return RecordingSerial(open_transport(sim.port, sim.baudrate, "termios", timeout=1,
+                                          write_timeout=1), path)
+
+
+def test_replay_send_update_aprom(simulator, tmp_path, nuvoton_flash):
+    data = random_image(3000)
+    sim = simulator()
+    path = str(tmp_path / "aprom.ispcap")
+    ser = record_port(sim, path)
+    try:
+        assert nuvoton_flash(ser, data)
+    finally:
+        ser.close()
+    assert bytes(sim.aprom[:len(data)]) == data
+
+    replay = ReplaySerial(path, scale=0, timeout=1)
+    assert nuvoton_flash(replay, data)
+    assert replay.ok(), replay.summary()
+
+    changed = bytearray(data)
+    changed[-1] ^= 0xFF
+    replay = ReplaySerial(path, scale=0, timeout=1)
+    nuvoton_flash(replay, bytes(changed))
+    assert not replay.ok()
+
+
+def test_replay_get_device_id(simulator, tmp_path):
+    sim = simulator()
+    path = str(tmp_path / "device_id.ispcap")
+    ser = record_port(sim, path)
+    try:
+        assert get_device_id.get_device_id(ser) == DEFAULT_PDID
+    finally:
+        ser.close()
+    replay = ReplaySerial(path, scale=0, timeout=1)
+    assert get_device_id.get_device_id(replay) == DEFAULT_PDID
+    assert replay.ok(), replay.summary()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""isp_recovery.SegmentProgrammer: simulatorde hata enjeksiyonu ile kurtarma yollari
+
+Simulatorun paket sirasi 1'den baslar; 1 CMD_CONNECT, 2 ilk veri paketi
+(CMD_UPDATE_APROM), 3 ikinci veri paketi (ilk devam paketi).
+"""
+
+import pytest
+
+from conftest import random_image
+from isp_recovery import SegmentProgrammer
+
+FIRST_DATA_FRAME = 2
+SECOND_DATA_FRAME = 3
+
+
+def program(ser, data, address=0, **kwargs):
+    programmer = SegmentProgrammer(ser, timeout=0.2, first_timeout=0.5, **kwargs)
+    programmer.program(address, data)
+    return programmer
+
+
+@pytest.mark.parametrize("size", [49, 100, 220, 1000])
+@pytest.mark.parametrize("lost", [FIRST_DATA_FRAME, SECOND_DATA_FRAME])
+def test_lost_data_frame(connected, size, lost):
+    """Kaybolan ilk/ikinci veri paketinden sonra segmentin tamami yazilir"""
+    data = random_image(size)
+    sim, ser = connected(lose_frames=(lost,))
+    programmer = program(ser, data)
+    assert sim.aprom[:size] == data
+    assert sim.aprom[size:size + 64] == b'\xff' * 64
+    assert programmer.recoveries == 1
+
+
+def test_lost_response(connected):
+    """Paket islendi, yaniti kayboldu: RESEND ayni paketi onaylar, tekrar yazilmaz"""
+    data = random_image(500)
+    sim, ser = connected(drop_frames=(SECOND_DATA_FRAME + 2,))
+    programmer = program(ser, data)
+    assert sim.aprom[:len(data)] == data
+    assert programmer.recoveries == 1
+    assert programmer.resends == 1
+    assert programmer.resyncs == 0
+
+
+def test_late_response_is_skipped(connected):
+    """Zaman asimindan sonra gelen eski yanit sonraki paketin yaniti sanilmaz"""
+    data = random_image(500)
+    sim, ser = connected(delay_frames={SECOND_DATA_FRAME + 1: 0.4})
+    programmer = program(ser, data)
+    assert sim.aprom[:len(data)] == data
+    assert programmer.recoveries == 1
+
+
+@pytest.mark.parametrize("corrupt", [FIRST_DATA_FRAME, SECOND_DATA_FRAME + 1])
+def test_verify_rewrites_corrupt_frame(connected, corrupt):
+    """Dogrulama acikken checksum'i tutmayan paket yeniden yazilir"""
+    data = random_image(500)
+    sim, ser = connected(corrupt_frames=(corrupt,))
+    program(ser, data, verify=True)
+    assert sim.aprom[:len(data)] == data
+
+
+def test_corrupt_frame_without_verify_is_reported(connected):
+    """Dogrulama kapaliyken uyusmazlik sadece acknowledge(..., False) ile bildirilir"""
+    data = random_image(500)
+    sim, ser = connected(corrupt_frames=(SECOND_DATA_FRAME,))
+    acks = []
+    programmer = SegmentProgrammer(ser, timeout=0.2, first_timeout=0.5)
+    programmer.program(0, data, acknowledge=lambda address, ok: acks.append(ok))
+    assert acks.count(False) == 1
+    assert programmer.recoveries == 0
+    assert sim.aprom[:len(data)] != data
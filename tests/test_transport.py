@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""isp_transport.FrameWriter: port basina yazici ve bosluk metrikleri"""
+
+import time
+
+from isp_protocol import CMD_GET_FWVER, create_packet
+from isp_transport import port_frame_writer, read_frame, write_frame
+
+
+def test_writer_per_port(connected):
+    """Her portun kendi yazicisi var, metrikler karismaz"""
+    _, first = connected()
+    _, second = connected()
+    assert port_frame_writer(first) is port_frame_writer(first)
+    assert port_frame_writer(first) is not port_frame_writer(second)
+
+    frames = port_frame_writer(first).frames
+    write_frame(first, create_packet(CMD_GET_FWVER))
+    assert read_frame(first, 1.0) is not None
+    assert port_frame_writer(first).frames == frames + 1
+    assert port_frame_writer(second).frames == 1  # Sadece CMD_CONNECT
+
+
+def test_idle_between_frames(connected):
+    """Paketten once bekleme paket ici boslukta degil, paketler arasi surede gorulur"""
+    _, ser = connected()
+    writer = port_frame_writer(ser)
+    for _ in range(3):
+        time.sleep(0.1)
+        write_frame(ser, create_packet(CMD_GET_FWVER))
+        assert read_frame(ser, 1.0) is not None
+    stats = writer.stats()
+    assert stats["worst_gap_s"] < stats["rx_timeout_s"]
+    assert stats["mean_idle_s"] >= 0.05
@@ -3,6 +3,15 @@
 """
 UART Dinleme Scripti - Sadece gelen verileri yazdırır, paket göndermez
 Reset sonrası bootloader'dan gelen verileri dinlemek için
+
+Kullanım:
+    python uart_listener.py [port]                        # Okunabilir döküm
+    python uart_listener.py [port] --capture=boot.ispcap  # Kayıpsız ikili kayıt
+
+--capture modunda ekrana veri yazdırılmaz: byte'lar monotonik nanosaniye
+zaman damgasıyla isp_capture biçiminde dosyaya yazılır (halka buffer + ayrı
+yazıcı thread'i). Ekranda saniyede ~2 kez güncellenen tek bir özet satırı
+görünür. Dosya isp_capture.read_capture() ile okunur.
 """
 
 import serial
@@ -13,6 +22,8 @@ import time
 # UART ayarları
 BAUD_RATE = 115200  # İhtiyaca göre değiştirilebilir
 TIMEOUT = 1  # Okuma timeout'u (saniye)
+CAPTURE_READ_TIMEOUT = 0.1  # Yakalama modunda bloklayan okuma timeout'u
+SUMMARY_INTERVAL = 0.5  # Özet satırı güncelleme aralığı (saniye)
 
 def find_serial_ports():
     """Mevcut serial portları listeler"""
@@ -114,6 +125,62 @@ def listen_uart(ser):
         ser.close()
         print("\nPort kapatıldı.")
 
+def capture_uart(ser, path):
+    """UART'tan gelen byte'ları kayıpsız olarak ikili dosyaya yazar
+
+    Okuma döngüsü sadece okur ve zaman damgası ekler; dosyaya yazma
+    isp_capture.CaptureWriter'ın thread'inde yapılır. Terminal çıktısı
+    SUMMARY_INTERVAL ile sınırlıdır (paket başına print yok).
+    """
+    from isp_capture import CaptureWriter
+
+    print("\n" + "=" * 60)
+    print(f"UART Yakalama Başlatıldı -> {path}")
+    print("=" * 60)
+    print("\nKartı resetleyin (NRESET butonuna basın)")
+    print("Çıkmak için Ctrl+C tuşlarına basın\n")
+
+    ser.reset_input_buffer()
+    ser.timeout = CAPTURE_READ_TIMEOUT
+    capture = CaptureWriter(path, baudrate=ser.baudrate)
+    start_time = time.monotonic()
+    next_summary = start_time
+
+    def summary():
+        elapsed = max(time.monotonic() - start_time, 1e-9)
+        ring = capture.ring
+        return (f"[{elapsed:7.1f}s] {capture.bytes} byte, {capture.bytes / elapsed:8.0f} B/s, "
+                f"{capture.records} kayıt, buffer %{ring.fill * 100:4.1f} "
+                f"(tepe %{ring.peak * 100 / ring.size:4.1f}), bekleme {ring.stalls}")
+
+    try:
+        while True:
+            # Bloklayan okuma: veri gelince hemen döner, gelmezse timeout
+            data = ser.read(ser.in_waiting or 1)
+            if data:
+                capture.record(data, time_ns=time.monotonic_ns())
+            now = time.monotonic()
+            if now >= next_summary:
+                sys.stdout.write("\r" + summary())
+                sys.stdout.flush()
+                next_summary = now + SUMMARY_INTERVAL
+
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"\nHata oluştu: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        capture.close()
+        ser.close()
+        print("\n\n" + "=" * 60)
+        print("Yakalama durduruldu")
+        print("=" * 60)
+        print(summary())
+        print(f"Dosya: {path}")
+        print("\nPort kapatıldı.")
+
 def main():
     """Ana fonksiyon"""
     print("=" * 60)
@@ -126,10 +193,15 @@ def main():
     find_serial_ports()
     print()
     
-    # Port adını komut satırından al (opsiyonel)
+    # Port adını ve seçenekleri komut satırından al (opsiyonel)
     port_name = None
-    if len(sys.argv) > 1:
-        port_name = sys.argv[1]
+    capture_path = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--capture='):
+            capture_path = arg.split('=', 1)[1]
+        elif not arg.startswith('--'):
+            port_name = arg
+    if port_name is not None:
         print(f"Belirtilen port: {port_name}")
     else:
         print("Port belirtilmedi, otomatik tespit edilecek...")
@@ -147,8 +219,11 @@ def main():
     print(f"Port açık: {ser.is_open}")
     print()
     
-    # UART'ı dinlemeye başla
-    listen_uart(ser)
+    # UART'ı dinlemeye / yakalamaya başla
+    if capture_path:
+        capture_uart(ser, capture_path)
+    else:
+        listen_uart(ser)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nuvoton ISP Bootloader - Coklu Port (Paralel) Flash'lama
+Ayni imaji birden fazla karta ayni anda yukler: her port icin bagimsiz
+bir ISP oturumu (connect, sync, erase, program, run) ayri thread'de calisir.
+Istasyon suresi = en yavas kartin suresi.
+"""
+
+import glob
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from isp_deadline import DEFAULT_QUANTILE, DeadlineEstimator
+from isp_pipeline import ImagePipeline
+from isp_reset import strategy_from_spec
+from isp_session import PHASES, SESSION_TIMEOUTS, flash_port
+
+PROGRESS_STEP = 10  # Yuzde kac ilerlemede bir yazdirilsin
+
+
+def find_all_ports():
+    """Tum ACM/USB seri portlarini bulur"""
+    return sorted(glob.glob('/dev/ttyACM*') + glob.glob('/dev/ttyUSB*'))
+
+
+class ProgressPrinter:
+    """Thread'lerden gelen ilerlemeyi port onekiyle, satir satir yazdirir"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_step = {}
+
+    def __call__(self, port, phase, done, total):
+        name = os.path.basename(port)
+        with self.lock:
+            if phase == "program" and total:
+                step = (done * 100 // total) // PROGRESS_STEP
+                if self.last_step.get(port) == step:
+                    return
+                self.last_step[port] = step
+                print(f"  [{name}] program: {done * 100 // total:3d}% ({done}/{total} byte)")
+            elif phase == "done":
+                print(f"  [{name}] [OK] tamamlandi")
+            elif phase == "failed":
+                print(f"  [{name}] [X] basarisiz")
+            else:
+                print(f"  [{name}] {phase}...")
+
+
+def print_summary(results, wall_time):
+    """Sonuc tablosunu yazdirir"""
+    print(f"\n{'='*100}")
+    print("OZET")
+    print(f"{'='*100}")
+    header = f"{'Port':<14} {'Sonuc':<6} {'Cihaz ID':<10} {'Byte':>8} {'Frame':>6}"
+    for phase in PHASES:
+        header += f" {phase:>8}"
+    header += f" {'Toplam':>8}"
+    print(header)
+    print("-" * len(header))
+
+    for r in results:
+        device_id = f"{r['device_id']:08X}" if r['device_id'] is not None else "-"
+        line = (f"{os.path.basename(r['port']):<14} {'OK' if r['ok'] else 'HATA':<6} {device_id:<10} "
+                f"{r['bytes']:>8} {r['frames']:>6}")
+        for phase in PHASES:
+            if phase in r['phases']:
+                line += f" {r['phases'][phase]:>7.2f}s"
+            else:
+                line += f" {'-':>8}"
+        line += f" {r['total']:>7.2f}s"
+        print(line)
+        if r.get('erase_plan'):
+            print(f"{'':<14} → silme: {r['erase_plan']}")
+        if r.get('resumed_from'):
+            print(f"{'':<14} → 0x{r['resumed_from']:08X} adresinden devam edildi")
+        if r['error']:
+            print(f"{'':<14} → {r['error']}")
+
+    ok_count = sum(1 for r in results if r['ok'])
+    serial_time = sum(r['total'] for r in results)
+    print("-" * len(header))
+    print(f"Basarili: {ok_count}/{len(results)}")
+    print(f"Istasyon suresi: {wall_time:.2f} s (sirali olsaydi: {serial_time:.2f} s)")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    options = [a for a in sys.argv[1:] if a.startswith('--')]
+
+    if not args:
+        print("Kullanim: python3 uart_receiver_multi.py <bin_file> <port1> [port2 ...]")
+        print("          python3 uart_receiver_multi.py <bin_file> --all")
+        print()
+        print("Secenekler: --all (tum ACM/USB portlari), --sparse, --verify,")
+        print("            --full-erase (CMD_ERASE_ALL; varsayilan sadece imajin sayfalari silinir)")
+        print("            --termios, --timeout=<saniye> (bootloader yakalama suresi, varsayilan 30)")
+        print("            --reset=dtr[:ms] | rts | dtr+rts | !dtr (DTR/RTS ile otomatik reset)")
+        print("            --reset=switch[:0x42[:ms]] (calisan uygulamaya gecis komutu)")
+        print("            --no-journal (yazma gunlugu tutma)")
+        print("            --resume (yarida kalan yazmaya ayni imaj/cihaz icin kaldigi yerden devam et)")
+        print("            --quantile=<0-1> (zaman asimi icin olculen gecikme yuzdeligi, varsayilan 0.99)")
+        sys.exit(1)
+
+    bin_file = args[0]
+    ports = args[1:]
+    if '--all' in options:
+        ports = find_all_ports()
+
+    connect_timeout = 30.0
+    reset = None
+    quantile = DEFAULT_QUANTILE
+    for opt in options:
+        if opt.startswith('--timeout='):
+            connect_timeout = float(opt.split('=', 1)[1])
+        elif opt.startswith('--reset='):
+            reset = strategy_from_spec(opt.split('=', 1)[1])
+        elif opt.startswith('--quantile='):
+            quantile = float(opt.split('=', 1)[1])
+
+    if not ports:
+        print("[X] Port bulunamadi")
+        sys.exit(1)
+
+    if not os.path.exists(bin_file):
+        print(f"[X] HATA: Dosya bulunamadi: {bin_file}")
+        sys.exit(1)
+
+    # Imaj bir kez, bootloader'lar yakalanirken arka planda hazirlanir;
+    # tum portlar ayni hazirlanmis imaji kullanir (isp_pipeline)
+    pipeline = ImagePipeline(bin_file, sparse='--sparse' in options)
+
+    print("=" * 60)
+    print("Nuvoton ISP Bootloader - Coklu Port")
+    print("=" * 60)
+    print(f"Binary dosya: {bin_file} ({os.path.getsize(bin_file)} byte)")
+    print(f"Portlar ({len(ports)}): {', '.join(ports)}")
+    if reset is not None:
+        print(f"Otomatik reset: {reset}\n")
+    else:
+        print(f"\nKartlari RESET yapin ({connect_timeout:.0f} s icinde)...\n")
+
+    progress = ProgressPrinter()
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        futures = [
+            pool.submit(flash_port, port, pipeline,
+                        connect_timeout=connect_timeout,
+                        erase='--full-erase' in options,
+                        sparse='--sparse' in options,
+                        verify='--verify' in options,
+                        backend='termios' if '--termios' in options else 'pyserial',
+                        progress=progress,
+                        reset=reset,
+                        journal='--no-journal' not in options,
+                        resume='--resume' in options,
+                        deadlines=DeadlineEstimator(quantile, SESSION_TIMEOUTS))
+            for port in ports
+        ]
+        results = [f.result() for f in futures]
+
+    print_summary(results, time.monotonic() - start)
+    sys.exit(0 if all(r['ok'] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
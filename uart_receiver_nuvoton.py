@@ -11,27 +11,33 @@ import sys
 import time
 import os
 
-# UART ayarlari
-BAUD_RATE = 115200
+from isp_cache import ImageCache, device_cache_key
+from isp_catcher import ConnectCatcher
+from isp_deadline import (DEADLINE_CONNECT, DEADLINE_ERASE_ALL, DEADLINE_NEXT, DEADLINE_RESEND,
+                          DeadlineEstimator)
+from isp_erase import plan_erase
+from isp_journal import FlashJournal
+from isp_image import changed_segments, clip_segments, split_segments
+from isp_packno import PACKNO_OK, PACKNO_STALE, PacketTracker, response_packno
+from isp_protocol import (BAUD_RATE, CMD_CONNECT, CMD_ERASE_ALL, CMD_GET_DEVICEID,
+                          CMD_RUN_APROM, CMD_SYNC_PACKNO, MAX_PKT_SIZE, bytes_to_uint32,
+                          create_packet)
+from isp_reset import enter_bootloader, strategy_from_spec
+from isp_transport import open_transport, port_frame_writer, read_frame, write_frame
+
+# UART ayarlari (BAUD_RATE, MAX_PKT_SIZE ve CMD_* sabitleri: isp_protocol)
 TIMEOUT = 2
 WRITE_TIMEOUT = 5
-MAX_PKT_SIZE = 64
-
-# Nuvoton ISP Komutlari (isp_user.h'den)
-CMD_UPDATE_APROM = 0x000000A0
-CMD_UPDATE_CONFIG = 0x000000A1
-CMD_READ_CONFIG = 0x000000A2
-CMD_ERASE_ALL = 0x000000A3
-CMD_SYNC_PACKNO = 0x000000A4
-CMD_GET_FWVER = 0x000000A6
-CMD_RUN_APROM = 0x000000AB
-CMD_RUN_LDROM = 0x000000AC
-CMD_RESET = 0x000000AD
-CMD_CONNECT = 0x000000AE
-CMD_DISCONNECT = 0x000000AF
-CMD_GET_DEVICEID = 0x000000B1
-CMD_UPDATE_DATAFLASH = 0x000000C3
-CMD_RESEND_PACKET = 0x000000FF
+CATCH_TIMEOUT = 60.0  # Manuel reset bekleme suresi (saniye)
+CATCH_STATUS_INTERVAL = 5.0  # Bekleme sirasinda durum yazdirma araligi
+
+# Bootloader u32PackNo sayacinin modeli (tum komutlar ayni oturumda paylasir)
+packet_tracker = PacketTracker()
+
+# Komut bazli yanit sureleri: olcum birikene kadar TIMEOUT / 10 s (silme),
+# sonra olculen gecikmelerden (isp_deadline, cihaz tipine gore saklanir)
+deadlines = DeadlineEstimator(defaults={DEADLINE_CONNECT: TIMEOUT, DEADLINE_NEXT: TIMEOUT,
+                                        DEADLINE_RESEND: TIMEOUT})
 
 def find_serial_ports():
     """Mevcut serial portlari listeler"""
@@ -41,8 +47,11 @@ def find_serial_ports():
         print(f"  - {port.device}: {port.description}")
     return ports
 
-def open_serial_port(port_name=None, baud_rate=BAUD_RATE):
-    """Serial port'u acar"""
+def open_serial_port(port_name=None, baud_rate=BAUD_RATE, backend="pyserial"):
+    """Serial port'u acar
+
+    backend: "pyserial" veya "termios" (Linux ham tty, VMIN=64 - isp_transport)
+    """
     try:
         if port_name is None:
             # Once PySerial ile portlari bul
@@ -59,8 +68,8 @@ def open_serial_port(port_name=None, baud_rate=BAUD_RATE):
                 common_ports = ['/dev/ttyACM0', '/dev/ttyACM1', '/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyAMA0', '/dev/ttyS0']
                 for port in common_ports:
                     try:
-                        ser = serial.Serial(port, baud_rate, timeout=TIMEOUT, write_timeout=WRITE_TIMEOUT,
-                                          rtscts=False, dsrdtr=False, xonxoff=False)
+                        ser = open_transport(port, baud_rate, backend, timeout=TIMEOUT,
+                                             write_timeout=WRITE_TIMEOUT)
                         
                         # DTR ve RTS'yi LOW yap (bazı USB-UART çiplerinde reset tetikler)
                         try:
@@ -76,8 +85,8 @@ def open_serial_port(port_name=None, baud_rate=BAUD_RATE):
                 raise serial.SerialException("Uygun port bulunamadi")
 
         # Belirtilen portu ac
-        ser = serial.Serial(port_name, baud_rate, timeout=TIMEOUT, write_timeout=WRITE_TIMEOUT,
-                          rtscts=False, dsrdtr=False, xonxoff=False)
+        ser = open_transport(port_name, baud_rate, backend, timeout=TIMEOUT,
+                             write_timeout=WRITE_TIMEOUT)
         
         # DTR ve RTS'yi LOW yap (bazı USB-UART çiplerinde reset tetikler)
         try:
@@ -148,99 +157,6 @@ def open_serial_port(port_name=None, baud_rate=BAUD_RATE):
                 print(f"  - {p.device}: {p.description}")
         sys.exit(1)
 
-def uint32_to_bytes(value):
-    """uint32_t degerini little-endian byte array'e cevirir"""
-    return bytes([
-        (value >> 0) & 0xFF,
-        (value >> 8) & 0xFF,
-        (value >> 16) & 0xFF,
-        (value >> 24) & 0xFF
-    ])
-
-def bytes_to_uint32(data, offset=0):
-    """Byte array'den little-endian uint32_t okur"""
-    return (data[offset + 0] << 0) | \
-           (data[offset + 1] << 8) | \
-           (data[offset + 2] << 16) | \
-           (data[offset + 3] << 24)
-
-def calculate_checksum(data):
-    """16-bit checksum hesaplama (Nuvoton protokolu)"""
-    checksum = 0
-    for byte in data:
-        checksum += byte
-    return checksum & 0xFFFF  # 16-bit
-
-def pkt_update_first(addr, size, data, packno):
-    """İlk CMD_UPDATE_APROM paketi (Kullanıcı önerisi - packno ile)
-    
-    NOT: ISP_UART kodunda Byte 4-7 atlanıyor (pu8Src += 8)
-    Ama bazı bootloader versiyonları packno'yu okuyor olabilir
-    
-    Format:
-    - Byte 0-3: CMD_UPDATE_APROM
-    - Byte 4-7: packno (bazı bootloader'lar için)
-    - Byte 8-11: addr
-    - Byte 12-15: size
-    - Byte 16-63: data (48 byte)
-    """
-    p = bytearray(64)
-    p[0:4] = uint32_to_bytes(CMD_UPDATE_APROM)
-    p[4:8] = uint32_to_bytes(packno)  # Kullanıcı önerisi
-    p[8:12] = uint32_to_bytes(addr)
-    p[12:16] = uint32_to_bytes(size)
-    if data:
-        data_len = min(len(data), 48)
-        p[16:16+data_len] = data[:data_len]
-    return p
-
-def pkt_update_next(data, packno):
-    """Devam CMD_UPDATE_APROM paketleri (Kullanıcı önerisi - packno ile)
-    
-    NOT: ISP_UART kodunda Byte 4-7 atlanıyor (pu8Src += 8)
-    Ama bazı bootloader versiyonları packno'yu okuyor olabilir
-    
-    Format:
-    - Byte 0-3: CMD_UPDATE_APROM
-    - Byte 4-7: packno (bazı bootloader'lar için)
-    - Byte 8-63: data (56 byte)
-    """
-    p = bytearray(64)
-    p[0:4] = uint32_to_bytes(CMD_UPDATE_APROM)
-    p[4:8] = uint32_to_bytes(packno)  # Kullanıcı önerisi
-    if data:
-        data_len = min(len(data), 56)
-        p[8:8+data_len] = data[:data_len]
-    return p
-
-def create_packet(cmd, param1=0, param2=0, data=None, is_first_packet=False):
-    """
-    64 byte Nuvoton paketi olusturur (geriye uyumluluk icin)
-    
-    YENI: pkt_update_first() ve pkt_update_next() kullanin!
-    """
-    packet = bytearray(MAX_PKT_SIZE)
-    packet[0:4] = uint32_to_bytes(cmd)
-
-    # CMD_SYNC_PACKNO icin ozel format: Byte 8-11'de paket numarasi
-    if cmd == CMD_SYNC_PACKNO:
-        packet[8:12] = uint32_to_bytes(param1)
-        return packet
-
-    # Ilk paket icin ozel format (CMD_UPDATE_APROM):
-    if is_first_packet and param2 != 0:
-        packet[8:12] = uint32_to_bytes(param1)
-        packet[12:16] = uint32_to_bytes(param2)
-        if data:
-            data_len = min(len(data), 48)
-            packet[16:16+data_len] = data[:data_len]
-    else:
-        if data:
-            data_len = min(len(data), 56)
-            packet[8:8+data_len] = data[:data_len]
-
-    return packet
-
 def send_packet(ser, packet, retry=False):
     """64 byte paketi gonderir"""
     if len(packet) != MAX_PKT_SIZE:
@@ -253,77 +169,13 @@ def send_packet(ser, packet, retry=False):
             print(f"[X] Port yazilabilir degil!")
             return False
 
-        # Output buffer kontrolu
-        if ser.out_waiting > 100:
-            print(f"  Output buffer dolu ({ser.out_waiting} byte), temizleniyor...")
-            ser.reset_output_buffer()
-            time.sleep(0.1)
-
-        # Buffer temizle
-        ser.reset_output_buffer()
-        time.sleep(0.05)
-
-        # Paketi byte-byte gonder (timeout'u onlemek icin)
-        total_written = 0
-
-        # Once test byte gonder
-        try:
-            test_byte = bytes([packet[0]])
-            test_written = ser.write(test_byte)
-            if test_written == 0:
-                raise serial.SerialTimeoutException("Test byte yazilamadi")
-            ser.flush()
-            time.sleep(0.01)
-        except serial.SerialTimeoutException:
-            print(f"  Test byte timeout, port yeniden aciliyor...")
-            ser.close()
-            time.sleep(1.0)
-            ser.open()
-            time.sleep(0.5)
-
-        # Paketi chunk'lar halinde gonder (daha hizli ve guvenilir)
-        chunk_size = 16  # 16 byte chunk'lar
-        try:
-            for i in range(0, len(packet), chunk_size):
-                chunk = packet[i:i+chunk_size]
-                bytes_written = ser.write(chunk)
-                if bytes_written > 0:
-                    total_written += bytes_written
-                ser.flush()  # Her chunk'tan sonra flush
-                time.sleep(0.001)  # Kisa bekleme
-        except (serial.SerialTimeoutException, serial.SerialException, OSError) as e:
-            # I/O hatasi - port donmus olabilir
-            print(f"  Chunk gonderme hatasi: {e}")
-            # Port'u yeniden acmayi dene
-            try:
-                ser.close()
-                time.sleep(0.5)
-                ser.open()
-                time.sleep(0.3)
-            except:
-                pass
-            # Kalan byte'lari gondermeyi dene
-            remaining = packet[total_written:]
-            if remaining:
-                try:
-                    ser.write(remaining)
-                    total_written += len(remaining)
-                except:
-                    pass
+        # Paketi tek yazma ile gonder (test byte / chunk / sleep yok)
+        # Bootloader RX timeout'u (0x40 bit ~ 0.56 ms) paket icinde bosluk
+        # olursa g_u8bufhead'i sifirlar ve paket sessizce kaybolur
+        total_written = write_frame(ser, packet)
 
         if total_written != MAX_PKT_SIZE:
             print(f"  Uyari: {total_written}/{MAX_PKT_SIZE} byte yazildi")
-            # Yine de devam et
-
-        # Flush islemi (timeout ile)
-        start_time = time.time()
-        while ser.out_waiting > 0:
-            if time.time() - start_time > 1.0:  # 1 saniye timeout
-                print(f"  Flush timeout, kalan: {ser.out_waiting} byte")
-                break
-            time.sleep(0.01)
-
-        ser.flush()
 
         return True
 
@@ -349,35 +201,55 @@ def send_packet(ser, packet, retry=False):
         print(f"[X] Paket gonderme hatasi: {e}")
         return False
 
-def receive_response(ser, timeout=None):
-    """64 byte yanit paketi alir (timeout yok - yanit gelene kadar bekliyor)
+def receive_response(ser, timeout=TIMEOUT):
+    """64 byte yanit paketi alir
     
     Args:
         ser: Serial port nesnesi
-        timeout: None (timeout yok - yanit gelene kadar bekliyor)
+        timeout: Yanit bekleme suresi (saniye)
     
     Returns:
-        bytes: 64 byte yanit paketi
+        bytes: 64 byte yanit paketi (sure dolarsa None)
     
-    NOT: Flash yazma islemi zaman alabilir, ama bootloader mutlaka yanit gonderir
+    NOT: Polling yok - read_frame() kernel'de bekler, 64. byte gelince doner
     """
-    response = bytearray()
-    last_data_time = time.time()
-    
-    while len(response) < MAX_PKT_SIZE:
-        if ser.in_waiting > 0:
-            data = ser.read(min(ser.in_waiting, MAX_PKT_SIZE - len(response)))
-            response.extend(data)
-            last_data_time = time.time()
-        else:
-            # Veri yok, kisa bekle
-            # Eger uzun sure veri gelmiyorsa (30 saniye) uyari ver ama devam et
-            if time.time() - last_data_time > 30.0 and len(response) > 0:
-                print(f"  [!] Uzun sure veri gelmiyor ({len(response)}/{MAX_PKT_SIZE} byte), bekleniyor...")
-                last_data_time = time.time()  # Uyarıyı tekrar vermemek için
-            time.sleep(0.01)
-    
-    return bytes(response)
+    return read_frame(ser, timeout, MAX_PKT_SIZE)
+
+def receive_tracked(ser, packet, expected, command_class=DEADLINE_CONNECT):
+    """`packet`in yanitini alir ve paket numarasini packet_tracker ile kontrol eder
+
+    Zaman asimi komut sinifinin olculen gecikmelerinden gelir (deadlines),
+    gecikme send_packet() dondugu andan olculur; sure dolarsa uyari
+    yazdirilir ve varsayilan sureye kadar beklenir. Onceki komutlarin gec
+    gelen yanitlari atlanir; kayip veya fazladan islenen paket varsa uyari
+    yazdirilir (sayac yanita gore duzeltilir).
+
+    Returns:
+        bytes: 64 byte yanit (sure dolarsa None)
+    """
+    sent_at = time.monotonic()
+    deadline = sent_at + deadlines.timeout(command_class)
+    hard_deadline = sent_at + deadlines.hard_timeout(command_class)
+    while True:
+        response = receive_response(ser, max(0.0, deadline - time.monotonic()))
+        if response is None:
+            if deadline < hard_deadline:
+                deadlines.expired(command_class)
+                print(f"  [!] Yanit {(deadline - sent_at) * 1000:.0f} ms icinde gelmedi "
+                      f"({command_class}), bekleniyor...")
+                deadline = hard_deadline
+                continue
+            return None
+        state, frames = packet_tracker.check(packet, response, expected)
+        if state == PACKNO_STALE:
+            print(f"  [!] Eski yanit atlandi (Paket No: {response_packno(response)}, "
+                  f"beklenen: {expected})")
+            continue
+        deadlines.observe(command_class, time.monotonic() - sent_at)
+        if state != PACKNO_OK:
+            print(f"  [!] Paket numarasi kaymasi: {response_packno(response)}, beklenen: "
+                  f"{expected} ({frames} paket {state})")
+        return response
 
 def send_connect(ser):
     """CMD_CONNECT gonderir ve yanit alir"""
@@ -408,13 +280,13 @@ def send_connect(ser):
         return False
 
     print(f"[OK] CMD_CONNECT gonderildi")
+    sent_at = time.monotonic()
 
-    # Cok kisa bekleme (bootloader'in islemesi icin)
-    time.sleep(0.05)
-
-    # Yanit bekle (bootloader hizli yanit verir)
+    # Yanit bekle (bootloader hizli yanit verir; read_frame 64. byte'ta doner)
     print("Yanit bekleniyor...")
-    response = receive_response(ser)  # Timeout yok - yanit gelene kadar bekliyor
+    response = receive_response(ser, deadlines.timeout(DEADLINE_CONNECT))
+    if response:
+        deadlines.observe(DEADLINE_CONNECT, time.monotonic() - sent_at)
 
     if response:
         # Yanitin bootloader'dan mi yoksa application'dan mi geldigini kontrol et
@@ -436,16 +308,15 @@ def send_connect(ser):
 
         # Bootloader yaniti
         checksum = (response[1] << 8) | response[0]  # 16-bit little-endian
+        packet_tracker.connected()
         
         # DEBUG: Tam yaniti goster (parse etmeden once)
         print(f"  [DEBUG] Tam Yanit (ilk 16 byte): {response[:16].hex()}")
         
-        # Paket numarasi: Byte 4-5'i oku (16-bit little-endian)
-        # ISP_UART: outpw(pu8Response + 4, u32PackNo) -> Byte 4-7'ye yaziyor
-        # Ama byte 4-5'te gercek deger var (little-endian)
-        packet_no_raw = bytes_to_uint32(response, 4)
-        packet_no = response[4] | (response[5] << 8)  # 16-bit little-endian
-        print(f"  [DEBUG] Byte 4-7 (Paket No): {response[4:8].hex()} -> Raw: {packet_no_raw}, Normalized: {packet_no}")
+        # Paket numarasi: Byte 4-7 (32-bit little-endian)
+        # ISP_UART: outpw(pu8Response + 4, u32PackNo); CMD_CONNECT yaniti 2
+        packet_no = response_packno(response)
+        print(f"  [DEBUG] Byte 4-7 (Paket No): {response[4:8].hex()} -> {packet_no}")
         
         # APROM boyutu: Byte 8-11'i oku (32-bit little-endian)
         aprom_size = bytes_to_uint32(response, 8)
@@ -469,11 +340,8 @@ def send_connect(ser):
         print(f"\n  [KRITIK] Paket numarasi senkronize ediliyor...")
         sync_packet = create_packet(CMD_SYNC_PACKNO, 1)  # Byte 8-11'de paket numarasi = 1
         if send_packet(ser, sync_packet):
-            time.sleep(0.2)  # Daha uzun bekleme
-            # Input buffer'da veri var mi kontrol et
-            if ser.in_waiting > 0:
-                print(f"  Input buffer: {ser.in_waiting} byte bekliyor")
-            sync_response = receive_response(ser)  # Timeout yok - yanit gelene kadar bekliyor
+            expected = packet_tracker.sent(sync_packet)
+            sync_response = receive_tracked(ser, sync_packet, expected)
             if sync_response:
                 sync_packet_no = bytes_to_uint32(sync_response, 4)
                 print(f"  [OK] Paket numarasi senkronize edildi: {sync_packet_no}")
@@ -489,13 +357,11 @@ def send_connect(ser):
         print(f"\n  Cihaz ID'si aliniyor...")
         device_id_packet = create_packet(CMD_GET_DEVICEID)
         if send_packet(ser, device_id_packet):
-            time.sleep(0.3)  # Daha uzun bekleme
-            # Input buffer'da veri var mi kontrol et
-            if ser.in_waiting > 0:
-                print(f"  Input buffer: {ser.in_waiting} byte bekliyor")
-            device_response = receive_response(ser)  # Timeout yok - yanit gelene kadar bekliyor
+            expected = packet_tracker.sent(device_id_packet)
+            device_response = receive_tracked(ser, device_id_packet, expected)
             if device_response and len(device_response) >= 64:
                 device_id = bytes_to_uint32(device_response, 8)
+                deadlines.attach(device_id)
                 checksum_dev = (device_response[1] << 8) | device_response[0]
                 print(f"  [OK][OK][OK] CIHAZ ID YAKALANDI! [OK][OK][OK]")
                 print(f"  Cihaz ID: 0x{device_id:08X}")
@@ -525,8 +391,80 @@ def send_connect(ser):
             print(f"  Kismi yanit (Hex): {partial.hex()[:50]}")
         return False
 
-def send_update_aprom(ser, bin_data, erase_before_update=True):
-    """APROM guncellemesi yapar"""
+def send_update_segment(ser, seg_address, seg_data, verify=False, acknowledge=None,
+                        erase_size=None, frames=None):
+    """Tek bir segmenti yazar (ilk paket + devam paketleri)
+
+    Ilk paket adres ve boyut tasir; bootloader EraseAP(adres, boyut)
+    cagirip sadece bu araligi siler. erase_size: ilk paketteki boyut
+    (isp_erase plani, sayfa kati), None ise veri uzunlugu. frames: onceden
+    derlenmis paket akisi (isp_pipeline), None ise gonderimden once derlenir.
+
+    Zaman asimi, yarim paket, paket numarasi kaymasi ve (verify=True ise)
+    checksum uyusmazligi isp_recovery.SegmentProgrammer ile ParseCmd'nin
+    CMD_RESEND_PACKET davranisina birebir uygun sekilde, tek RESEND tur
+    suresiyle kurtarilir.
+
+    acknowledge(address, ok): her paketten sonra bitis adresi ve yanit
+    checksum'inin tutup tutmadigi bildirilir (isp_journal.FlashJournal).
+    """
+    from isp_recovery import RecoveryError, SegmentProgrammer
+
+    seg_size = len(seg_data)
+
+    def on_event(kind, address, detail):
+        where = f" 0x{address:08X}" if address is not None else ""
+        print(f"  [!] {kind}{where}: {detail}")
+
+    next_report = [0]
+
+    def progress(offset):
+        if offset >= next_report[0] or offset >= seg_size:
+            print(f"  Ilerleme: {offset * 100.0 / seg_size:.1f}% ({offset}/{seg_size} byte)")
+            next_report[0] = offset + max(seg_size // 20, 1)
+
+    print(f"\n[1/3] CMD_UPDATE_APROM (baslangic) gonderiliyor... "
+          f"(0x{seg_address:08X}, {seg_size} byte"
+          f"{f', {erase_size} byte silinecek' if erase_size not in (None, seg_size) else ''})")
+    programmer = SegmentProgrammer(ser, send=lambda packet: send_packet(ser, packet),
+                                   verify=verify, tracker=packet_tracker,
+                                   deadlines=deadlines,
+                                   on_event=on_event)
+    try:
+        programmer.program(seg_address, seg_data, progress, acknowledge, erase_size, frames)
+    except RecoveryError as e:
+        print(f"[X] {e}")
+        return False
+
+    print(f"[OK] Segment yazildi: {programmer.frames} paket, {programmer.recoveries} kurtarma "
+          f"({programmer.resends} RESEND, {programmer.resyncs} yeni ilk paket)")
+    return True
+
+def send_update_aprom(ser, bin_data, erase_before_update=False, sparse=False, previous=None,
+                      verify=False, journal=None, resume_address=0, aprom_size=None,
+                      image=None):
+    """APROM guncellemesi yapar
+
+    Args:
+        ser: Serial port nesnesi
+        bin_data: Firmware imaji
+        erase_before_update: Once CMD_ERASE_ALL gonderilsin mi (tum APROM).
+                             False ise sadece imajin sayfalari ilk paketlerin
+                             EraseAP'i ile silinir (isp_erase)
+        sparse: True ise bos (0xFF) sayfalar atlanir, her dolu segment
+                icin yeni bir ilk paket (adres + boyut) gonderilir; atlanan
+                sayfalar onceki segmentin ilk paketinde silinir
+        previous: Cihazda oldugu bilinen onceki imaj (delta mod). Verilirse
+                  sadece degisen sayfalar yeniden yazilir
+        verify: Her yanitin checksum'i ile geri okunan veriyi dogrula
+        journal: isp_journal.FlashJournal - dogrulanan adres diske kaydedilir
+        resume_address: Yarida kalan yazmanin devam adresi (sayfa siniri).
+                        Verilirse CMD_ERASE_ALL atlanir ve bu adresten itibaren
+                        yeni bir ilk paket gonderilir (EraseAP sadece kalani siler)
+        aprom_size: CMD_CONNECT yanitindaki APROM boyutu (silme plani icin)
+        image: isp_pipeline.PreparedImage - derlenmis paket akislari (yoksa
+               her segment gonderimden once derlenir)
+    """
     total_size = len(bin_data)
     start_address = 0x00000000  # APROM baslangic adresi
 
@@ -536,26 +474,49 @@ def send_update_aprom(ser, bin_data, erase_before_update=True):
     print(f"Dosya boyutu: {total_size} byte")
     print(f"Baslangic adresi: 0x{start_address:08X}")
 
-    # ONEMLI: Guncelleme oncesi tam silme (opsiyonel ama onerilen)
-    if erase_before_update:
+    if previous is not None:
+        segments = changed_segments(previous, bin_data, start_address)
+        data_size = sum(len(seg_data) for _, seg_data in segments)
+        print(f"Delta mod: {len(segments)} segment, {data_size} byte degisti "
+              f"({total_size - min(data_size, total_size)} byte ayni, atlaniyor)")
+    elif sparse:
+        segments = split_segments(bin_data, start_address)
+        data_size = sum(len(seg_data) for _, seg_data in segments)
+        print(f"Sparse mod: {len(segments)} segment, {data_size} byte veri "
+              f"({total_size - data_size} byte bos alan atlaniyor)")
+    else:
+        segments = [(start_address, bin_data)]
+
+    if resume_address:
+        segments = clip_segments(segments, resume_address)
+        data_size = sum(len(seg_data) for _, seg_data in segments)
+        print(f"Devam: 0x{resume_address:08X} adresinden, {data_size} byte kaldi "
+              f"(CMD_ERASE_ALL atlaniyor)")
+        erase_before_update = False
+
+    # Silme plani: ilk paketlerin EraseAP'i imajin sayfalarini zaten siler,
+    # CMD_ERASE_ALL sadece istenirse (isp_erase)
+    plan = plan_erase(segments, aprom_size, full=erase_before_update,
+                      fill_gaps=sparse and previous is None,
+                      baseline_full=previous is None and not resume_address)
+    print(f"Silme plani: {plan.summary()}")
+
+    if plan.erase_all:
         print(f"\n[0/3] CMD_ERASE_ALL gonderiliyor (tum APROM silinecek)...")
         erase_packet = create_packet(CMD_ERASE_ALL)
         if send_packet(ser, erase_packet):
+            expected = packet_tracker.sent(erase_packet)
             print(f"[OK] CMD_ERASE_ALL gonderildi")
-            # Silme islemi zaman alir
-            time.sleep(2.0)  # Flash silme icin yeterli sure
-            # Input buffer'da veri var mi kontrol et
-            if ser.in_waiting > 0:
-                print(f"  Input buffer: {ser.in_waiting} byte bekliyor")
-            erase_response = receive_response(ser)  # Timeout yok - flash silme zaman alabilir, yanit gelene kadar bekliyor
+            # Sabit bekleme yok: yanit silme bitince gelir, zaman asimi bu cihaz
+            # tipinde olculen silme suresinden (ilk calistirmada 10 s)
+            erase_response = receive_tracked(ser, erase_packet, expected, DEADLINE_ERASE_ALL)
             if erase_response:
                 # DEBUG
                 print(f"  [DEBUG] CMD_ERASE_ALL yaniti (ilk 16 byte): {erase_response[:16].hex()}")
                 
-                # Paket numarasi: Byte 4-5'i oku (16-bit little-endian)
-                erase_packet_no_raw = bytes_to_uint32(erase_response, 4)
-                erase_packet_no = erase_response[4] | (erase_response[5] << 8)  # 16-bit little-endian
-                print(f"  [DEBUG] Byte 4-7 (Paket No): {erase_response[4:8].hex()} -> Raw: {erase_packet_no_raw}, Normalized: {erase_packet_no}")
+                # Paket numarasi: Byte 4-7 (32-bit little-endian)
+                erase_packet_no = response_packno(erase_response)
+                print(f"  [DEBUG] Byte 4-7 (Paket No): {erase_response[4:8].hex()} -> {erase_packet_no}")
                 
                 print(f"[OK] Silme tamamlandi, Paket No: {erase_packet_no}")
             else:
@@ -566,135 +527,29 @@ def send_update_aprom(ser, bin_data, erase_before_update=True):
         else:
             print(f"[!] CMD_ERASE_ALL gonderilemedi (devam ediliyor)")
 
-    # Ilk paket: CMD_UPDATE_APROM + adres + boyut
-    print(f"\n[1/3] CMD_UPDATE_APROM (baslangic) gonderiliyor...")
-    first_data = bin_data[:48] if len(bin_data) >= 48 else bin_data  # Ilk 48 byte (byte 16-63)
-    packno = 1
-    first_packet = pkt_update_first(start_address, total_size, first_data, packno)
-
-    if not send_packet(ser, first_packet):
-        print("[X] Ilk paket gonderilemedi")
-        return False
-
-    print(f"[OK] Ilk paket gonderildi ({len(first_data)} byte veri)")
-
-    # Yanit bekle (timeout yok - flash silme ve yazma zaman alabilir)
-    # ISP_UART: Ilk paket sonrasi EraseAP() + WriteData() cagriliyor
-    # EraseAP() ~500ms-2s, WriteData() ~140-280ms
-    # Toplam: ~640ms-2.3s - yanit gelene kadar bekliyor
-    response = receive_response(ser)  # Timeout yok - yanit gelene kadar bekliyor
-    if response:
-        # DEBUG
-        print(f"  [DEBUG] Ilk CMD_UPDATE_APROM yaniti (ilk 16 byte): {response[:16].hex()}")
-        
-        # Paket numarasi: Byte 4-5'i oku (16-bit little-endian)
-        packet_no_raw = bytes_to_uint32(response, 4)
-        packet_no = response[4] | (response[5] << 8)  # 16-bit little-endian
-        print(f"  [DEBUG] Byte 4-7 (Paket No): {response[4:8].hex()} -> Raw: {packet_no_raw}, Normalized: {packet_no}")
-        
-        print(f"[OK] Yanit alindi, Paket No: {packet_no}")
-        # NOT: Bootloader paket numarasini her yanitta 2 artiriyor
-        # CMD_ERASE_ALL sonrasi: 6
-        # Ilk CMD_UPDATE_APROM sonrasi: 8 (beklenen)
-        # Ilk yanit paket numarasini kullanarak devam paketleri icin beklenen degeri hesapla
-        first_response_packet_no = packet_no
-        # Sonraki paket icin beklenen deger: ilk yanit + 2
-        expected_packet_no = first_response_packet_no + 2
-        print(f"  Sonraki paket icin beklenen: {expected_packet_no}")
-    else:
-        print(f"[!] Ilk paket yaniti alinamadi (devam ediliyor)")
-        # Ilk yanit alinamadi, varsayilan deger kullan
-        expected_packet_no = 10  # CMD_ERASE_ALL=6, ilk UPDATE=8, ilk devam=10
-        first_response_packet_no = None
-
-    # Devam paketleri (56 byte veri her pakette)
-    data_offset = 48  # Ilk pakette 48 byte gonderildi
-    packet_num = 2  # Paket numarasi (payload'a yaziliyor)
-
-    while data_offset < total_size:
-        # 56 byte veri al
-        chunk_data = bin_data[data_offset:data_offset+56]
-        chunk_len = len(chunk_data)
-
-        # Paketi 64 byte'a tamamla (packno ile)
-        packet = pkt_update_next(chunk_data, packet_num)
-
-        print(f"[{packet_num}] Paket gonderiliyor... ({chunk_len} byte veri, offset: {data_offset})")
-
-        if not send_packet(ser, packet):
-            print(f"[X] Paket {packet_num} gonderilemedi")
+    for seg_index, (seg_address, seg_data, erase_size) in enumerate(plan.segments):
+        if len(segments) > 1:
+            print(f"\n--- Segment {seg_index + 1}/{len(segments)}: "
+                  f"0x{seg_address:08X}, {len(seg_data)} byte ---")
+        frames = image.stream(seg_address, seg_data, erase_size) if image else None
+        if not send_update_segment(ser, seg_address, seg_data, verify=verify,
+                                   acknowledge=journal.acknowledge if journal else None,
+                                   erase_size=erase_size, frames=frames):
             return False
 
-        # Yanit bekle (timeout yok - flash yazma zaman alabilir)
-        # ISP_UART: Her paket sonrasi WriteData() cagriliyor (~140-280ms)
-        # Her paket sonrasi mutlaka yanit geliyor - yanit gelene kadar bekliyor
-        response = receive_response(ser)  # Timeout yok - yanit gelene kadar bekliyor
-        if response:
-            # Paket numarasi: Byte 4-5'i oku (16-bit little-endian)
-            resp_packet_no_raw = bytes_to_uint32(response, 4)
-            resp_packet_no = response[4] | (response[5] << 8)  # 16-bit little-endian
-            checksum_resp = (response[1] << 8) | response[0]
-
-            # Paket numarasi kontrolu
-            if expected_packet_no is not None:
-                if resp_packet_no == expected_packet_no:
-                    print(f"  [OK] Yanit: Paket No {resp_packet_no} (Checksum: 0x{checksum_resp:04X})")
-                else:
-                    # Paket numarasi uyumsuzlugu
-                    diff = resp_packet_no - expected_packet_no
-                    if abs(diff) <= 4:
-                        print(f"  [!] Yanit: Paket No {resp_packet_no} (Beklenen: {expected_packet_no}, Fark: {diff:+d})")
-                        # Bootloader'in gercek paket numarasini kullan ve takibi buna gore ayarla
-                        expected_packet_no = resp_packet_no
-                    else:
-                        print(f"  [X] Paket numarasi uyumsuzlugu: {resp_packet_no} (Beklenen: {expected_packet_no})")
-                        print(f"  [!] CMD_RESEND_PACKET gonderiliyor...")
-                        # CMD_RESEND_PACKET gonder (bootloader son paketi tekrar yazar)
-                        resend_packet = create_packet(CMD_RESEND_PACKET)
-                        if send_packet(ser, resend_packet):
-                            time.sleep(0.2)
-                            resend_response = receive_response(ser)  # Timeout yok - yanit gelene kadar bekliyor
-                            if resend_response:
-                                resend_packet_no = resend_response[4] | (resend_response[5] << 8)
-                                print(f"  [OK] CMD_RESEND_PACKET yaniti: Paket No {resend_packet_no}")
-                                expected_packet_no = resend_packet_no
-                            else:
-                                print(f"  [X] CMD_RESEND_PACKET yaniti alinamadi")
-                        else:
-                            print(f"  [X] CMD_RESEND_PACKET gonderilemedi")
-                        # Son paketi tekrar gonder
-                        data_offset -= chunk_len
-                        packet_num -= 1
-                        continue  # Döngüyü tekrarla
-                
-                # Bootloader her yanitta paket numarasini 2 artiriyor
-                expected_packet_no += 2
-            else:
-                # Paket numarasi takibi yapilmiyor, sadece goster
-                print(f"  [OK] Yanit: Paket No {resp_packet_no} (Checksum: 0x{checksum_resp:04X})")
-        else:
-            # Yanit alinamadi (timeout) - flash yazma devam ediyor olabilir
-            print(f"  [!] Yanit alinamadi (timeout) - flash yazma devam ediyor olabilir")
-            # Timeout olsa bile devam et (bootloader flash yaziyor olabilir)
-
-        data_offset += chunk_len
-        packet_num += 1
-
-        # Ilerleme goster
-        progress = (data_offset / total_size) * 100
-        print(f"  Ilerleme: {progress:.1f}% ({data_offset}/{total_size} byte)")
-
-        time.sleep(0.05)  # Kisa bekleme
-
     print(f"\n{'='*60}")
     print(f"[OK][OK][OK] Guncelleme tamamlandi! [OK][OK][OK]")
     print(f"{'='*60}")
+    print(f"Frame yazici: {port_frame_writer(ser).summary()}")
+    print(f"Yanit sureleri: {deadlines.summary()}")
+    deadlines.save()
 
     # Guncelleme sonrasi APROM'a gecis ve reset
     print(f"\n[SON] CMD_RUN_APROM gonderiliyor (reset icin)...")
     run_aprom_packet = create_packet(CMD_RUN_APROM)
 
     if send_packet(ser, run_aprom_packet):
+        packet_tracker.sent(run_aprom_packet)  # Yanit yok, sayac bilinmiyor
         print(f"[OK] CMD_RUN_APROM gonderildi")
         print(f"  → Bootloader reset atacak ve yeni firmware calisacak")
         print(f"  → Reset sonrasi LED yanip sonmeli")
@@ -726,21 +581,113 @@ def send_update_aprom(ser, bin_data, erase_before_update=True):
 
     return True
 
+def connect_handshake(ser, response):
+    """Bootloader CMD_CONNECT yanitini yazdirir, paket numarasini senkronize eder
+    ve cihaz ID'sini okur
+
+    Returns:
+        int: Cihaz ID (alinamazsa None)
+    """
+    device_id = None
+    packet_tracker.connected()
+    checksum = (response[1] << 8) | response[0]
+    packet_no = response_packno(response)
+    aprom_size = bytes_to_uint32(response, 8)
+    dataflash_addr = bytes_to_uint32(response, 12)
+
+    print(f"\n[OK][OK][OK] BOOTLOADER YAKALANDI! [OK][OK][OK]")
+    print(f"  Checksum: 0x{checksum:04X}")
+    print(f"  Paket No: {packet_no}")
+    print(f"  APROM Boyutu: {aprom_size} byte (0x{aprom_size:08X})")
+    print(f"  DataFlash Adresi: 0x{dataflash_addr:08X}")
+
+    # KRITIK: Paket numarasi senkronizasyonu
+    print(f"\n  [KRITIK] Paket numarasi senkronize ediliyor...")
+    sync_packet = create_packet(CMD_SYNC_PACKNO, 1)  # Byte 8-11'de paket numarasi = 1
+    if send_packet(ser, sync_packet):
+        expected = packet_tracker.sent(sync_packet)
+        sync_response = receive_tracked(ser, sync_packet, expected)
+        if sync_response:
+            sync_packet_no = bytes_to_uint32(sync_response, 4)
+            print(f"  [OK] Paket numarasi senkronize edildi: {sync_packet_no}")
+        else:
+            print(f"  [!] Paket numarasi senkronizasyon yaniti alinamadi (devam ediliyor)")
+    else:
+        print(f"  [!] CMD_SYNC_PACKNO gonderilemedi (devam ediliyor)")
+
+    # Cihaz ID'sini almak icin CMD_GET_DEVICEID gonder
+    print(f"\n  Cihaz ID'si aliniyor...")
+    device_id_packet = create_packet(CMD_GET_DEVICEID)
+    if send_packet(ser, device_id_packet):
+        expected = packet_tracker.sent(device_id_packet)
+        device_response = receive_tracked(ser, device_id_packet, expected)
+        if device_response and len(device_response) >= 64:
+            device_id = bytes_to_uint32(device_response, 8)
+            deadlines.attach(device_id)
+            checksum_dev = (device_response[1] << 8) | device_response[0]
+            print(f"  [OK][OK][OK] CIHAZ ID YAKALANDI! [OK][OK][OK]")
+            print(f"  Cihaz ID: 0x{device_id:08X}")
+            print(f"  Checksum: 0x{checksum_dev:04X}")
+        else:
+            print(f"  [!] Cihaz ID yaniti alinamadi")
+            if device_response:
+                print(f"  Kismi yanit: {device_response.hex()[:50]}")
+    else:
+        print(f"  [!] CMD_GET_DEVICEID gonderilemedi")
+
+    print()  # Bos satir
+    return device_id
+
 def main():
     """Ana fonksiyon"""
     print("=" * 60)
     print("Nuvoton ISP Bootloader - Resmi Protokol")
     print("=" * 60)
 
+    # Secenekler (--sparse: bos 0xFF sayfalari atla, --delta: sadece degisen sayfalari yaz,
+    #             --full-erase: CMD_ERASE_ALL ile tum APROM'u sil - isp_erase,
+    #             --verify: yanit checksum'i ile yazilan veriyi dogrula,
+    #             --termios: pyserial yerine ham termios aktarimi - sadece Linux,
+    #             --reset=dtr[:ms]: DTR/RTS ile otomatik reset - isp_reset,
+    #             --reset=switch: calisan uygulamaya 0x42 gecis komutu - isp_reset,
+    #             --no-journal: yazma gunlugu tutma - isp_journal,
+    #             --resume: yarida kalan yazmaya (ayni imaj ve cihaz) kaldigi yerden devam et,
+    #             --quantile=0.99: zaman asimi icin olculen gecikme yuzdeligi - isp_deadline,
+    #             --record=oturum.ispcap: port trafigini zamaniyla kaydet - isp_record,
+    #             --replay=oturum.ispcap: kart yerine kayittan oynat (port acilmaz),
+    #             --replay-scale=1.0: oynatma zamanlama carpani, 0 = beklemesiz)
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    sparse = '--sparse' in sys.argv
+    delta = '--delta' in sys.argv
+    verify = '--verify' in sys.argv
+    backend = 'termios' if '--termios' in sys.argv else 'pyserial'
+    use_journal = '--no-journal' not in sys.argv
+    resume = '--resume' in sys.argv
+    reset = None
+    record_path = None
+    replay_path = None
+    replay_scale = 1.0
+    for a in sys.argv[1:]:
+        if a.startswith('--reset='):
+            reset = strategy_from_spec(a.split('=', 1)[1])
+        elif a.startswith('--quantile='):
+            deadlines.quantile = float(a.split('=', 1)[1])
+        elif a.startswith('--record='):
+            record_path = a.split('=', 1)[1]
+        elif a.startswith('--replay='):
+            replay_path = a.split('=', 1)[1]
+        elif a.startswith('--replay-scale='):
+            replay_scale = float(a.split('=', 1)[1])
+
     # Binary dosya yolunu belirle
     bin_file = "NuvotonM26x-Bootloader-Test.bin"
-    if len(sys.argv) > 1:
-        if os.path.exists(sys.argv[1]) and sys.argv[1].endswith('.bin'):
-            bin_file = sys.argv[1]
-            port_name = sys.argv[2] if len(sys.argv) > 2 else None
+    if len(args) > 0:
+        if os.path.exists(args[0]) and args[0].endswith('.bin'):
+            bin_file = args[0]
+            port_name = args[1] if len(args) > 1 else None
         else:
-            port_name = sys.argv[1]
-            bin_file = sys.argv[2] if len(sys.argv) > 2 else bin_file
+            port_name = args[0]
+            bin_file = args[1] if len(args) > 1 else bin_file
     else:
         port_name = None
 
@@ -756,19 +703,32 @@ def main():
     print(f"Binary dosya: {bin_file}")
     print()
 
-    # Binary dosyayi oku
+    # Binary dosya: okuma, ozet, segmentler ve paket derleme bootloader
+    # yakalanirken arka planda yapilir (isp_pipeline)
     if not os.path.exists(bin_file):
         print(f"[X] HATA: Dosya bulunamadi: {bin_file}")
         sys.exit(1)
 
-    with open(bin_file, 'rb') as f:
-        bin_data = f.read()
-
-    print(f"[OK] Binary dosya okundu: {len(bin_data)} byte")
+    from isp_pipeline import ImagePipeline
+    pipeline = ImagePipeline(bin_file, sparse=sparse)
+    print(f"[OK] Binary dosya arka planda hazirlaniyor: {os.path.getsize(bin_file)} byte")
     print()
 
-    # Serial port'u ac
-    ser = open_serial_port(port_name, BAUD_RATE)
+    # Serial port'u ac (tekrar oynatmada kayittan; gunluk ve ogrenilen sureler yazilmaz)
+    replay = None
+    if replay_path:
+        from isp_record import ReplaySerial
+        ser = replay = ReplaySerial(replay_path, replay_scale, timeout=TIMEOUT,
+                                    write_timeout=WRITE_TIMEOUT)
+        use_journal = resume = False
+        deadlines.deadline_dir = None
+        print(f"Tekrar oynatma: {replay_path} (zamanlama x{replay_scale:g})")
+    else:
+        ser = open_serial_port(port_name, BAUD_RATE, backend)
+    if record_path:
+        from isp_record import RecordingSerial
+        ser = RecordingSerial(ser, record_path)
+        print(f"Kayit: {record_path}")
 
     # Port durumunu kontrol et
     print(f"Baud Rate: {ser.baudrate}")
@@ -791,125 +751,59 @@ def main():
     print()
 
     try:
-        print("  ONEMLI: Bootloader sadece reset sonrasi 300ms icinde aktif!")
-        print("  Script surekli CMD_CONNECT gonderecek, reset yapinca yakalayacak...")
-        print()
-        print("Karti RESET yapin (istediginiz zaman)")
-        print("Script otomatik olarak bootloader'i yakalayacak...")
-        print()
-        print("Cikmak icin Ctrl+C tuslarina basin\n")
-
-        # Surekli CMD_CONNECT gonder (reset sonrasi yakalamak icin)
-        max_attempts = 1000  # Maksimum deneme sayisi
-        attempt = 0
         connected = False
+        device_id = None
 
-        # CMD_CONNECT paketi hazirla
-        connect_packet = create_packet(CMD_CONNECT)
+        # Otomatik reset: DTR/RTS darbesi veya gecis byte'i + 300 ms penceresinde
+        # zamanli CMD_CONNECT
+        if reset is not None:
+            print(f"[>] Otomatik reset ({reset})...")
+            try:
+                catch = enter_bootloader(ser, reset)
+            except (serial.SerialException, OSError) as e:
+                print(f"  [X] Reset hatti kullanilamadi: {e}")
+                catch = None
+            if catch is not None:
+                print(f"[OK] Yakalandi: {catch}")
+                device_id = connect_handshake(ser, catch.response)
+                connected = True
+            else:
+                print("[!] Otomatik reset ile bootloader yakalanamadi, manuel reset bekleniyor\n")
 
-        print("[>] Surekli CMD_CONNECT gonderiliyor...")
-        print("   (Reset yapinca bootloader yakalanacak)\n")
+        if not connected:
+            print("  ONEMLI: Bootloader sadece reset sonrasi 300ms icinde aktif!")
+            print("  Script surekli CMD_CONNECT gonderecek, reset yapinca yakalayacak...")
+            print()
+            print("Karti RESET yapin (istediginiz zaman)")
+            print("Script otomatik olarak bootloader'i yakalayacak...")
+            print()
+            print("Cikmak icin Ctrl+C tuslarina basin\n")
+
+        # Hat hizinda CMD_CONNECT gonder (reset sonrasi yakalamak icin - isp_catcher)
+        catcher = ConnectCatcher(ser)
+
+        if not connected:
+            print(f"[>] CMD_CONNECT her {catcher.interval * 1000:.1f} ms'de gonderiliyor...")
+            print("   (Reset yapinca bootloader yakalanacak)\n")
 
-        while attempt < max_attempts and not connected:
+        waited = 0.0
+        while waited < CATCH_TIMEOUT and not connected:
             try:
                 # Port durumunu kontrol et
                 if not ser.is_open:
                     print(f"  Port kapali, yeniden aciliyor...")
-                    try:
-                        ser.open()
-                        time.sleep(0.3)
-                    except Exception as e:
-                        print(f"  [X] Port acilamadi: {e}")
-                        time.sleep(1.0)
-                        continue
+                    ser.open()
 
-                # Buffer temizle
-                try:
-                    ser.reset_input_buffer()
-                    ser.reset_output_buffer()
-                except:
-                    # Buffer temizleme hatasi, port'u yeniden ac
-                    try:
-                        ser.close()
-                        time.sleep(0.5)
-                        ser.open()
-                        time.sleep(0.3)
-                    except:
-                        pass
-
-                # CMD_CONNECT gonder
-                if send_packet(ser, connect_packet):
-                    # Kisa bekleme (bootloader yaniti icin)
-                    time.sleep(0.01)
-
-                    # Yanit var mi kontrol et
-                    if ser.in_waiting >= 4:  # En az 4 byte yanit bekliyoruz
-                        response = receive_response(ser)  # Timeout yok - yanit gelene kadar bekliyor
-
-                        if response and len(response) >= 64:
-                            # Yanitin bootloader'dan mi geldigini kontrol et
-                            first_bytes = response[:4]
-                            is_ascii = all(32 <= b <= 126 for b in first_bytes[:4])
-
-                        if not is_ascii:
-                            # Bootloader yaniti!
-                            checksum = (response[1] << 8) | response[0]
-                            packet_no = bytes_to_uint32(response, 4)
-                            aprom_size = bytes_to_uint32(response, 8)
-                            dataflash_addr = bytes_to_uint32(response, 12)
-
-                            print(f"\n[OK][OK][OK] BOOTLOADER YAKALANDI! [OK][OK][OK]")
-                            print(f"  Checksum: 0x{checksum:04X}")
-                            print(f"  Paket No: {packet_no}")
-                            print(f"  APROM Boyutu: {aprom_size} byte (0x{aprom_size:08X})")
-                            print(f"  DataFlash Adresi: 0x{dataflash_addr:08X}")
-
-                            # KRITIK: Paket numarasi senkronizasyonu
-                            print(f"\n  [KRITIK] Paket numarasi senkronize ediliyor...")
-                            sync_packet = create_packet(CMD_SYNC_PACKNO, 1)  # Byte 8-11'de paket numarasi = 1
-                            if send_packet(ser, sync_packet):
-                                time.sleep(0.1)
-                                sync_response = receive_response(ser)  # Timeout yok - yanit gelene kadar bekliyor
-                                if sync_response:
-                                    sync_packet_no = bytes_to_uint32(sync_response, 4)
-                                    print(f"  [OK] Paket numarasi senkronize edildi: {sync_packet_no}")
-                                else:
-                                    print(f"  [!] Paket numarasi senkronizasyon yaniti alinamadi (devam ediliyor)")
-                            else:
-                                print(f"  [!] CMD_SYNC_PACKNO gonderilemedi (devam ediliyor)")
-
-                            # Cihaz ID'sini almak icin CMD_GET_DEVICEID gonder
-                            print(f"\n  Cihaz ID'si aliniyor...")
-                            device_id_packet = create_packet(CMD_GET_DEVICEID)
-                            if send_packet(ser, device_id_packet):
-                                time.sleep(0.15)
-                                device_response = receive_response(ser)  # Timeout yok - yanit gelene kadar bekliyor
-                                if device_response and len(device_response) >= 64:
-                                    device_id = bytes_to_uint32(device_response, 8)
-                                    checksum_dev = (device_response[1] << 8) | device_response[0]
-                                    print(f"  [OK][OK][OK] CIHAZ ID YAKALANDI! [OK][OK][OK]")
-                                    print(f"  Cihaz ID: 0x{device_id:08X}")
-                                    print(f"  Checksum: 0x{checksum_dev:04X}")
-                                else:
-                                    print(f"  [!] Cihaz ID yaniti alinamadi")
-                                    if device_response:
-                                        print(f"  Kismi yanit: {device_response.hex()[:50]}")
-                            else:
-                                print(f"  [!] CMD_GET_DEVICEID gonderilemedi")
-
-                            print()  # Bos satir
-
-                            connected = True
-                            break
-
-                attempt += 1
-
-                # Her 100 denemede bir durum goster
-                if attempt % 100 == 0:
-                    print(f"  Deneme: {attempt}... (Reset yapin)")
-
-                # Kisa bekleme (CPU kullanimini azaltmak icin)
-                time.sleep(0.01)
+                catch = catcher.catch(CATCH_STATUS_INTERVAL)
+                waited += CATCH_STATUS_INTERVAL
+                if catch is None:
+                    print(f"  {waited:.0f} s... (Reset yapin)")
+                    continue
+
+                # Bootloader yaniti (paket hizasi ile dogrulandi)
+                print(f"[OK] Yakalandi: {catch}")
+                device_id = connect_handshake(ser, catch.response)
+                connected = True
 
             except (serial.SerialException, OSError) as e:
                 # Port I/O hatasi - port'u yeniden ac
@@ -918,30 +812,68 @@ def main():
                     ser.close()
                     time.sleep(0.5)
                     ser.open()
-                    time.sleep(0.3)
                     print(f"  [OK] Port yeniden acildi")
                 except Exception as e2:
                     print(f"  [X] Port acilamadi: {e2}")
                     time.sleep(1.0)
-                attempt += 1
-                continue
-
-            except KeyboardInterrupt:
-                print("\n\nProgram sonlandiriliyor...")
-                return
-            except Exception as e:
-                # Hatalari gormezden gel, devam et
-                pass
+                waited += 1.0
 
         if not connected:
-            print(f"\n[X] Bootloader yakalanamadi ({max_attempts} deneme)")
+            print(f"\n[X] Bootloader yakalanamadi ({CATCH_TIMEOUT:.0f} s)")
             print("  → Reset yapildi mi kontrol edin")
             return
 
-        time.sleep(0.1)
+        image = pipeline.result()
+        bin_data = image.data
+        print(f"[OK] Binary dosya hazir: {len(bin_data)} byte, {len(image.streams)} segment "
+              f"derlendi ({image.prepare_time * 1000:.0f} ms, yakalama sirasinda)")
+
+        # Delta mod: cihaza en son yazilan imaji onbellekten al
+        previous = None
+        cache = None
+        if delta:
+            if device_id is None:
+                print("[!] Cihaz ID alinamadi, delta mod kullanilamiyor (tam yazma)")
+            else:
+                cache = ImageCache()
+                cache_key = device_cache_key(device_id, ser.port)
+                previous = cache.load(cache_key)
+                if previous is None:
+                    print(f"[!] Onbellekte imaj yok ({cache_key}), tam yazma yapiliyor")
+                else:
+                    print(f"[OK] Onbellekteki imaj bulundu ({cache_key}, {len(previous)} byte)")
+                # Yazma yarida kalirsa flash icerigi bilinmez
+                cache.invalidate(cache_key)
+
+        # Yazma gunlugu: yarida kalan yazmaya devam sadece --resume ile ve
+        # kayit ayni imaj/cihaza aitse (arada baska aracla yazilmis olabilir)
+        journal = None
+        resume_address = 0
+        if (use_journal or resume) and device_id is not None:
+            journal = FlashJournal(device_cache_key(device_id, ser.port))
+            pending = journal.resume_address(bin_data, device_id, image.digest)
+            if pending and resume:
+                resume_address = pending
+                print(f"[OK] Yarida kalan yazma bulundu ({journal.key}), "
+                      f"0x{resume_address:08X} adresinden devam ediliyor")
+            elif pending:
+                print(f"[!] Yarida kalan yazma var ({journal.key}, 0x{pending:08X}); "
+                      f"devam icin --resume, simdi bastan yaziliyor")
+            elif resume and journal.load() is not None:
+                print(f"[!] Gunluk ({journal.key}) baska imaj veya cihaza ait, "
+                      f"devam edilmiyor - bastan yaziliyor")
+            journal.begin(bin_data, device_id, resume_address, image.digest)
 
         # APROM guncellemesi
-        if send_update_aprom(ser, bin_data):
+        if send_update_aprom(ser, bin_data,
+                             erase_before_update=previous is None and '--full-erase' in sys.argv,
+                             sparse=sparse, previous=previous, verify=verify,
+                             journal=journal, resume_address=resume_address,
+                             aprom_size=catch.aprom_size, image=image):
+            if cache is not None:
+                cache.store(cache_key, bin_data)
+            if journal is not None:
+                journal.clear()
             print("\n[OK][OK][OK] Guncelleme basarili! [OK][OK][OK]")
         else:
             print("\n[X] Guncelleme basarisiz")
@@ -955,6 +887,10 @@ def main():
     finally:
         ser.close()
         print("Port kapatildi.")
+        if replay is not None:
+            print(replay.summary())
+            if not replay.ok():
+                sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -11,6 +11,13 @@ import sys
 import time
 import os
 
+from isp_catcher import ConnectCatcher
+from isp_deadline import DEADLINE_CONNECT, DeadlineEstimator
+from isp_erase import plan_erase
+from isp_packno import PACKNO_OK, PacketTracker, response_packno
+from isp_recovery import RecoveryError, SegmentProgrammer
+from isp_transport import read_frame, write_frame
+
 # UART ayarları
 BAUD_RATE = 115200
 TIMEOUT = 2
@@ -26,6 +33,12 @@ CMD_GET_DEVICEID = 0x000000B1
 CMD_RUN_APROM = 0x000000AB
 CMD_RESEND_PACKET = 0x000000FF
 
+# Bootloader u32PackNo sayacının modeli (isp_packno)
+packet_tracker = PacketTracker()
+
+# Komut bazlı yanıt süreleri: ölçülen gecikmelerden öğrenilir (isp_deadline)
+deadlines = DeadlineEstimator()
+
 def uint32_to_bytes(value):
     """uint32_t değerini little-endian byte array'e çevirir"""
     return bytes([
@@ -46,10 +59,8 @@ def calculate_checksum(data, start_offset=0, end_offset=None):
     """16-bit checksum hesaplama (Nuvoton protokolü)"""
     if end_offset is None:
         end_offset = len(data)
-    checksum = 0
-    for i in range(start_offset, end_offset):
-        checksum += data[i]
-    return checksum & 0xFFFF  # 16-bit
+    # Tum imajin frame checksum'lari icin isp_frames.FrameStream (NumPy)
+    return sum(memoryview(data)[start_offset:end_offset]) & 0xFFFF  # 16-bit
 
 def create_packet(cmd, param1=0, param2=0, data=None, is_first_packet=False, seq_no=0):
     """
@@ -89,7 +100,7 @@ def send_packet_fast(ser, packet, retry_count=0):
     """
     Paketi hızlı ve güvenilir şekilde gönderir
     - Minimum loglama
-    - Chunk'lar halinde gönderim
+    - Tek yazma ile gönderim (isp_transport.write_frame)
     - Retry limiti ile güvenli
     """
     if len(packet) != MAX_PKT_SIZE:
@@ -108,13 +119,9 @@ def send_packet_fast(ser, packet, retry_count=0):
         except:
             pass
         
-        # Paketi chunk'lar halinde gönder (16 byte)
-        chunk_size = 16
+        # Paketi tek yazma ile gönder (chunk yok - RX timeout paketi bölmesin)
         try:
-            for i in range(0, len(packet), chunk_size):
-                chunk = packet[i:i+chunk_size]
-                ser.write(chunk)
-            ser.flush()
+            write_frame(ser, packet)
             return True
         except (serial.SerialTimeoutException, serial.SerialException, OSError):
             # Port hatası - yeniden aç ve tekrar dene
@@ -133,71 +140,45 @@ def send_packet_fast(ser, packet, retry_count=0):
         return False
 
 def receive_response(ser, timeout=1.0):
-    """64 byte yanıt paketi alır"""
-    start_time = time.time()
-    response = bytearray()
-    
-    while len(response) < MAX_PKT_SIZE:
-        if time.time() - start_time > timeout:
-            return None
-        if ser.in_waiting > 0:
-            data = ser.read(min(ser.in_waiting, MAX_PKT_SIZE - len(response)))
-            response.extend(data)
-        time.sleep(0.001)  # Minimum bekleme
-    
-    return bytes(response)
+    """64 byte yanıt paketi alır (polling yok - 64. byte gelince döner)"""
+    return read_frame(ser, timeout, MAX_PKT_SIZE)
 
 def send_connect_fast(ser):
     """
-    CMD_CONNECT'i hızlı ve sürekli gönderir
+    CMD_CONNECT'i hat hızında gönderir (isp_catcher)
     - Minimum loglama (sadece başarıda)
-    - 300ms penceresini yakalamak için optimize edilmiş
+    - 300ms penceresini yakalamak için paket aralığı ~6.7 ms (115200)
+    - Yanıt paket hizası ile tespit edilir (ASCII tahmini yok)
+
+    Returns:
+        isp_catcher yakalama sonucu (APROM boyutu dahil), yakalanamazsa None
     """
-    connect_packet = create_packet(CMD_CONNECT)
-    
-    # Sürekli gönder (300ms penceresini yakalamak için)
-    start_time = time.time()
-    max_duration = 5.0  # Maksimum 5 saniye dene
-    
-    while (time.time() - start_time) < max_duration:
-        # Paketi gönder
-        if send_packet_fast(ser, connect_packet):
-            # Kısa bekleme (minimum)
-            time.sleep(0.005)  # 5ms
-            
-            # Yanıt var mı kontrol et
-            if ser.in_waiting >= 4:
-                response = receive_response(ser, timeout=0.1)
-                if response and len(response) >= 64:
-                    # ASCII kontrolü (application mesajı mı?)
-                    first_bytes = response[:4]
-                    is_ascii = all(32 <= b <= 126 for b in first_bytes)
-                    
-                    if not is_ascii:
-                        # Bootloader yanıtı!
-                        checksum = (response[1] << 8) | response[0]
-                        packet_no = bytes_to_uint32(response, 4)
-                        aprom_size = bytes_to_uint32(response, 8)
-                        dataflash_addr = bytes_to_uint32(response, 12)
-                        
-                        print(f"\n✓✓✓ BOOTLOADER YAKALANDI! ✓✓✓")
-                        print(f"  Checksum: 0x{checksum:04X}")
-                        print(f"  Paket No: {packet_no}")
-                        print(f"  APROM Boyutu: {aprom_size} byte (0x{aprom_size:08X})")
-                        print(f"  DataFlash Adresi: 0x{dataflash_addr:08X}")
-                        return True
-        else:
-            # Port hatası - kısa bekleme
-            time.sleep(0.01)
-    
-    return False
+    catch = ConnectCatcher(ser).catch(timeout=5.0)  # Maksimum 5 saniye dene
+    if catch is None:
+        return None
+
+    response = catch.response
+    packet_tracker.connected()
+    checksum = (response[1] << 8) | response[0]
+    packet_no = response_packno(response)
 
-def send_update_aprom_improved(ser, bin_data, start_address=0x00000000):
+    print(f"\n✓✓✓ BOOTLOADER YAKALANDI! ✓✓✓")
+    print(f"  Checksum: 0x{checksum:04X}")
+    print(f"  Paket No: {packet_no}")
+    print(f"  APROM Boyutu: {catch.aprom_size} byte (0x{catch.aprom_size:08X})")
+    print(f"  DataFlash Adresi: 0x{catch.dataflash_addr:08X}")
+    print(f"  Yakalama: {catch}")
+    return catch
+
+def send_update_aprom_improved(ser, bin_data, start_address=0x00000000, verify=False,
+                               aprom_size=None):
     """
     APROM güncelleme - iyileştirilmiş versiyon
-    - CMD_RESEND_PACKET desteği
-    - Paket numarası kontrolü
-    - Retry mekanizması
+    - CMD_RESEND_PACKET kurtarma (isp_recovery: zaman aşımı, kayıp paket,
+      paket numarası kayması, checksum uyuşmazlığı)
+    - Paket numarası isp_packno.PacketTracker ile takip edilir (her yanıtta +2)
+    - İlk paketteki boyut sayfa katına yuvarlanır (isp_erase): EraseAP sadece
+      imajın sayfalarını siler, APROM'un geri kalanı silinmez
     """
     total_size = len(bin_data)
     
@@ -206,84 +187,34 @@ def send_update_aprom_improved(ser, bin_data, start_address=0x00000000):
     print(f"{'='*60}")
     print(f"Dosya boyutu: {total_size} byte")
     print(f"Başlangıç adresi: 0x{start_address:08X}\n")
-    
-    # İlk paket: CMD_UPDATE_APROM + adres + boyut
-    first_data = bin_data[:48] if len(bin_data) >= 48 else bin_data
-    first_packet = create_packet(CMD_UPDATE_APROM, start_address, total_size, first_data, is_first_packet=True)
-    
-    if not send_packet_fast(ser, first_packet):
-        print("✗ İlk paket gönderilemedi")
-        return False
-    
-    # Yanıt bekle
-    response = receive_response(ser, timeout=1.0)
-    if not response:
-        print("✗ İlk paket yanıtı alınamadı")
-        return False
-    
-    resp_packet_no = bytes_to_uint32(response, 4)
-    print(f"✓ İlk paket gönderildi, Yanıt Paket No: {resp_packet_no}")
-    
-    # Devam paketleri
-    data_offset = 48
-    packet_num = 2
-    expected_packet_no = 2
-    
-    while data_offset < total_size:
-        chunk_data = bin_data[data_offset:data_offset+56]
-        chunk_len = len(chunk_data)
-        
-        packet = create_packet(CMD_UPDATE_APROM, 0, 0, chunk_data)
-        
-        # Paketi gönder (retry ile)
-        success = False
-        for retry in range(MAX_RETRY_COUNT):
-            if send_packet_fast(ser, packet):
-                # Yanıt bekle
-                response = receive_response(ser, timeout=1.0)
-                if response:
-                    resp_packet_no = bytes_to_uint32(response, 4)
-                    resp_cmd = bytes_to_uint32(response, 0)  # İlk 4 byte komut olabilir
-                    
-                    # CMD_RESEND_PACKET kontrolü
-                    if resp_cmd == CMD_RESEND_PACKET:
-                        print(f"  ⚠ Paket {packet_num} yeniden gönderiliyor...")
-                        time.sleep(0.1)
-                        continue  # Aynı paketi tekrar gönder
-                    
-                    # Paket numarası kontrolü
-                    if resp_packet_no == expected_packet_no:
-                        success = True
-                        break
-                    else:
-                        print(f"  ⚠ Paket No uyumsuz: {resp_packet_no} (Beklenen: {expected_packet_no})")
-                        time.sleep(0.1)
-                        continue
-                else:
-                    time.sleep(0.1)
-                    continue
-            else:
-                time.sleep(0.1)
-                continue
-        
-        if not success:
-            print(f"✗ Paket {packet_num} gönderilemedi (max retry)")
-            return False
-        
-        data_offset += chunk_len
-        packet_num += 1
-        expected_packet_no += 1
-        
+
+    def on_event(kind, address, detail):
+        where = f" 0x{address:08X}" if address is not None else ""
+        print(f"  ⚠ {kind}{where}: {detail}")
+
+    def progress(offset):
         # İlerleme göster (her 10 pakette bir)
-        if packet_num % 10 == 0:
-            progress = (data_offset / total_size) * 100
-            print(f"  İlerleme: {progress:.1f}% ({data_offset}/{total_size} byte)")
-        
-        time.sleep(0.02)  # Minimum bekleme
+        if (offset - 48) // 56 % 10 == 0 or offset >= total_size:
+            print(f"  İlerleme: {offset * 100.0 / total_size:.1f}% ({offset}/{total_size} byte)")
+
+    programmer = SegmentProgrammer(ser, send=lambda packet: send_packet_fast(ser, packet),
+                                   verify=verify, tracker=packet_tracker, deadlines=deadlines,
+                                   on_event=on_event)
+    plan = plan_erase([(start_address, bin_data)], aprom_size, baseline_full=False)
+    _, _, erase_size = plan.segments[0]
+    print(f"  Silme planı: {plan.summary()}")
+    try:
+        programmer.program(start_address, bin_data, progress, erase_size=erase_size)
+    except RecoveryError as e:
+        print(f"✗ {e}")
+        return False
     
     print(f"\n{'='*60}")
     print(f"✓✓✓ Güncelleme tamamlandı! ✓✓✓")
     print(f"{'='*60}")
+    print(f"  {programmer.frames} paket, {programmer.recoveries} kurtarma")
+    print(f"  Yanıt süreleri: {deadlines.summary()}")
+    deadlines.save()
     return True
 
 def main():
@@ -336,7 +267,8 @@ def main():
         input()
         
         # Hızlı CMD_CONNECT gönder
-        if not send_connect_fast(ser):
+        catch = send_connect_fast(ser)
+        if catch is None:
             print("\n✗ Bootloader yakalanamadı!")
             print("   - Reset yaptınız mı?")
             print("   - 300ms içinde gönderildi mi?")
@@ -346,14 +278,21 @@ def main():
         print("\nCihaz ID alınıyor...")
         device_id_packet = create_packet(CMD_GET_DEVICEID)
         if send_packet_fast(ser, device_id_packet):
-            time.sleep(0.1)
-            device_response = receive_response(ser, timeout=0.5)
+            expected = packet_tracker.sent(device_id_packet)
+            sent_at = time.monotonic()
+            device_response = receive_response(ser, deadlines.timeout(DEADLINE_CONNECT))
             if device_response and len(device_response) >= 64:
+                deadlines.observe(DEADLINE_CONNECT, time.monotonic() - sent_at)
+                state, frames = packet_tracker.check(device_id_packet, device_response, expected)
+                if state != PACKNO_OK:
+                    print(f"⚠ Paket numarası kayması: {response_packno(device_response)}, "
+                          f"beklenen: {expected} ({frames} paket {state})")
                 device_id = bytes_to_uint32(device_response, 8)
+                deadlines.attach(device_id)
                 print(f"✓ Cihaz ID: 0x{device_id:08X}")
         
         # APROM güncelle
-        if not send_update_aprom_improved(ser, bin_data):
+        if not send_update_aprom_improved(ser, bin_data, aprom_size=catch.aprom_size):
             print("\n✗ Güncelleme başarısız!")
             return
         
@@ -361,6 +300,7 @@ def main():
         print("\n[SON] CMD_RUN_APROM gönderiliyor (reset için)...")
         run_packet = create_packet(CMD_RUN_APROM)
         if send_packet_fast(ser, run_packet):
+            packet_tracker.sent(run_packet)
             print("✓ CMD_RUN_APROM gönderildi")
             print("  → Bootloader reset atacak ve yeni firmware çalışacak")
             time.sleep(1.0)
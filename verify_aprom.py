@@ -11,6 +11,8 @@ import sys
 import time
 import os
 
+from isp_transport import read_frame
+
 BAUD_RATE = 115200
 TIMEOUT = 2
 WRITE_TIMEOUT = 5
@@ -81,19 +83,8 @@ def send_packet(ser, packet):
         return False
 
 def receive_response(ser, timeout=1.0):
-    """64 byte yanıt paketi alır"""
-    start_time = time.time()
-    response = bytearray()
-    
-    while len(response) < MAX_PKT_SIZE:
-        if time.time() - start_time > timeout:
-            return None
-        if ser.in_waiting > 0:
-            data = ser.read(min(ser.in_waiting, MAX_PKT_SIZE - len(response)))
-            response.extend(data)
-        time.sleep(0.01)
-    
-    return bytes(response)
+    """64 byte yanıt paketi alır (polling yok - 64. byte gelince döner)"""
+    return read_frame(ser, timeout, MAX_PKT_SIZE)
 
 def read_aprom_verify(ser, bin_file, start_addr=0x00000000, size=None):
     """APROM'u okuyup firmware ile karşılaştırır"""